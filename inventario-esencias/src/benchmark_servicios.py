@@ -0,0 +1,210 @@
+"""
+Benchmarks de la capa de servicios sobre una base de datos sintética
+
+Genera inventario.db e historial_ventas.db en un directorio temporal (nunca
+toca la base real), mide los caminos principales de los servicios y guarda
+los resultados en JSON para comparar antes y después de cada optimización.
+
+Uso:
+    python benchmark_servicios.py --escala pequena
+    python benchmark_servicios.py --productos 10000 --salidas 1000000 -o despues.json
+    python benchmark_servicios.py --escala mediana --comparar antes.json
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import sqlalchemy
+
+from utils.database import dispose_engines, set_sqlite_profile, usar_base_de_datos
+from utils.historial_database import set_historial_sqlite_profile
+
+# (productos, frascos, salidas) de cada escala
+ESCALAS = {
+    'pequena': (1000, 50, 10000),
+    'mediana': (10000, 100, 100000),
+    'grande': (100000, 200, 1000000),
+}
+
+
+def _medir(funcion, repeticiones, preparar=None):
+    """Ejecuta funcion repeticiones veces; preparar() corre antes de cada una sin medirse"""
+    tiempos = []
+    resultado = None
+    for repeticion in range(repeticiones):
+        if preparar:
+            preparar(repeticion)
+        inicio = time.perf_counter()
+        resultado = funcion(repeticion)
+        tiempos.append(time.perf_counter() - inicio)
+    ordenados = sorted(tiempos)
+    return {
+        'repeticiones': repeticiones,
+        'min_ms': round(ordenados[0] * 1000, 3),
+        'mediana_ms': round(statistics.median(ordenados) * 1000, 3),
+        'media_ms': round(statistics.fmean(ordenados) * 1000, 3),
+        'p95_ms': round(ordenados[max(0, -(-95 * len(ordenados) // 100) - 1)] * 1000, 3),
+        'max_ms': round(ordenados[-1] * 1000, 3),
+        'filas': len(resultado) if isinstance(resultado, (list, tuple)) else None,
+    }
+
+
+def _commit_actual():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def ejecutar_benchmarks(repeticiones: int, omitir=()) -> dict:
+    """Mide los servicios sobre la base configurada (ya generada)"""
+    # Se importan aquí para que usen la base sintética
+    from services.producto_service import ProductoService
+    from services.frasco_service import FrascoService
+    from services.salida_service import SalidaService
+    from utils.cache_catalogo import cache_productos
+
+    producto_service = ProductoService()
+    frasco_service = FrascoService()
+    salida_service = SalidaService()
+
+    esencias = producto_service.obtener_todos_los_productos()
+    frascos = sorted(frasco_service.obtener_todos_los_frascos(), key=lambda frasco: frasco['id_frasco'])
+    if not esencias or not frascos:
+        raise ValueError("La base sintética necesita al menos una esencia y un frasco")
+
+    def vender(repeticion):
+        esencia = esencias[(repeticion * 7919) % len(esencias)]
+        frasco = frascos[repeticion % len(frascos)]
+        return salida_service.registrar_venta_combinada(
+            esencia['id_producto'], frasco['id_frasco'], frasco['capacidad_ml'],
+            round(frasco['capacidad_ml'] * 80, 2), 'Benchmark'
+        )
+
+    casos = {
+        'obtener_todos_los_productos': dict(
+            funcion=lambda r: producto_service.obtener_todos_los_productos(),
+            preparar=lambda r: cache_productos.invalidar_todo()),
+        'obtener_todos_los_productos_cache': dict(
+            funcion=lambda r: producto_service.obtener_todos_los_productos()),
+        'buscar_productos': dict(
+            funcion=lambda r: producto_service.buscar_productos('Vainilla')),
+        'buscar_productos_sin_resultados': dict(
+            funcion=lambda r: producto_service.buscar_productos('zzz-no-existe')),
+        'registrar_venta_combinada': dict(funcion=vender),
+        'obtener_historial_ventas': dict(
+            funcion=lambda r: salida_service.obtener_historial_ventas()),
+        'obtener_historial_ventas_pagina': dict(
+            funcion=lambda r: salida_service.obtener_historial_ventas_pagina(limite=50)['ventas']),
+        'obtener_estadisticas_ventas': dict(
+            funcion=lambda r: salida_service.obtener_estadisticas_ventas()),
+    }
+
+    resultados = {}
+    for nombre, caso in casos.items():
+        if nombre in omitir:
+            continue
+        print(f"  • {nombre}...", end=' ', flush=True)
+        resultados[nombre] = _medir(caso['funcion'], repeticiones, caso.get('preparar'))
+        print(f"mediana {resultados[nombre]['mediana_ms']:.2f} ms")
+    return resultados
+
+
+def comparar(actual: dict, anterior: dict):
+    """Imprime la variación de la mediana de cada caso respecto de otra corrida"""
+    print(f"\n📊 Comparación con {anterior.get('fecha', '?')} (commit {anterior.get('commit') or '?'})")
+    if anterior.get('parametros') != actual['parametros']:
+        print(f"  ⚠️  Parámetros distintos: {anterior.get('parametros')} vs {actual['parametros']}")
+    for nombre, resultado in actual['resultados'].items():
+        previo = anterior.get('resultados', {}).get(nombre)
+        if not previo:
+            print(f"  {nombre:<36} {resultado['mediana_ms']:10.2f} ms   (nuevo)")
+            continue
+        antes, ahora = previo['mediana_ms'], resultado['mediana_ms']
+        variacion = (ahora - antes) / antes * 100 if antes else 0.0
+        print(f"  {nombre:<36} {antes:10.2f} → {ahora:10.2f} ms  ({variacion:+.1f} %)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks de los servicios sobre datos sintéticos")
+    parser.add_argument('--escala', choices=tuple(ESCALAS), default='pequena',
+                        help="Tamaño predefinido: pequena (1k/10k), mediana (10k/100k), grande (100k/1M)")
+    parser.add_argument('--productos', type=int, help="Esencias (reemplaza la escala)")
+    parser.add_argument('--frascos', type=int, help="Frascos (reemplaza la escala)")
+    parser.add_argument('--salidas', type=int, help="Ventas (reemplaza la escala)")
+    parser.add_argument('--eliminados', type=float, default=0.05,
+                        help="Proporción extra de esencias eliminadas con ventas (por defecto 0.05)")
+    parser.add_argument('--semilla', type=int, default=42)
+    parser.add_argument('--repeticiones', type=int, default=5)
+    parser.add_argument('--omitir', nargs='*', default=[], help="Casos que no se miden")
+    parser.add_argument('--directorio', help="Dónde generar la base (por defecto un directorio temporal)")
+    parser.add_argument('--conservar', action='store_true', help="No borrar la base generada al terminar")
+    parser.add_argument('-o', '--salida', default='benchmark_servicios.json', help="Archivo JSON de resultados")
+    parser.add_argument('--comparar', help="JSON de una corrida anterior para comparar")
+    args = parser.parse_args()
+
+    productos, frascos, salidas = ESCALAS[args.escala]
+    productos = args.productos if args.productos is not None else productos
+    frascos = args.frascos if args.frascos is not None else frascos
+    salidas = args.salidas if args.salidas is not None else salidas
+
+    directorio = args.directorio or tempfile.mkdtemp(prefix='benchmark_inventario_')
+    os.makedirs(directorio, exist_ok=True)
+    usar_base_de_datos(os.path.join(directorio, 'inventario.db'))
+
+    try:
+        # Generar con el perfil de importación masiva y medir con el de uso normal
+        from utils.datos_sinteticos import generar_base_de_datos
+        set_sqlite_profile('bulk-import')
+        set_historial_sqlite_profile('bulk-import')
+        print(f"🧪 Generando {productos} esencias, {frascos} frascos y {salidas} ventas en {directorio}")
+        inicio = time.perf_counter()
+        generados = generar_base_de_datos(productos, frascos, salidas, args.eliminados, semilla=args.semilla)
+        generacion = time.perf_counter() - inicio
+        print(f"  Generado en {generacion:.1f} s: {generados}")
+
+        set_sqlite_profile('fast')
+        set_historial_sqlite_profile('fast')
+        print(f"⏱️  Midiendo ({args.repeticiones} repeticiones)")
+        resultados = ejecutar_benchmarks(args.repeticiones, set(args.omitir))
+    finally:
+        dispose_engines()
+        if not args.conservar and not args.directorio:
+            shutil.rmtree(directorio, ignore_errors=True)
+
+    reporte = {
+        'fecha': datetime.now().isoformat(timespec='seconds'),
+        'commit': _commit_actual(),
+        'python': platform.python_version(),
+        'sqlalchemy': sqlalchemy.__version__,
+        'plataforma': platform.platform(),
+        'parametros': {
+            'productos': productos, 'frascos': frascos, 'salidas': salidas,
+            'eliminados': args.eliminados, 'semilla': args.semilla, 'repeticiones': args.repeticiones,
+        },
+        'generados': generados,
+        'generacion_s': round(generacion, 3),
+        'resultados': resultados,
+    }
+    with open(args.salida, 'w', encoding='utf-8') as archivo:
+        json.dump(reporte, archivo, ensure_ascii=False, indent=2)
+    print(f"💾 Resultados guardados en {args.salida}")
+
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as archivo:
+            comparar(reporte, json.load(archivo))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,62 @@
+"""
+Script para importar esencias o frascos desde un archivo CSV, JSON o JSON Lines
+
+Uso:
+    python importar_catalogo.py esencias.csv
+    python importar_catalogo.py frascos.jsonl --tipo frascos --no-actualizar
+    python importar_catalogo.py esencias.csv --simular
+"""
+import argparse
+import os
+import sys
+import time
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy.exc import SQLAlchemyError
+
+from services.importacion_service import ImportacionService
+from utils.database import SQLITE_PROFILES, dispose_engines, set_sqlite_profile
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Importa esencias o frascos al inventario")
+    parser.add_argument('archivo', help="Archivo .csv, .json o .jsonl")
+    parser.add_argument('--tipo', choices=('productos', 'frascos'),
+                        help="Qué se importa (por defecto se deduce de las columnas)")
+    parser.add_argument('--no-actualizar', action='store_true',
+                        help="Omitir los IDs que ya existen en lugar de actualizarlos")
+    parser.add_argument('--simular', action='store_true',
+                        help="Solo validar el archivo, sin guardar nada")
+    parser.add_argument('--perfil', choices=tuple(SQLITE_PROFILES), default='bulk-import',
+                        help="Perfil de SQLite para la importación (por defecto bulk-import)")
+    args = parser.parse_args()
+
+    set_sqlite_profile(args.perfil)
+    inicio = time.perf_counter()
+    try:
+        reporte = ImportacionService().importar_archivo(
+            args.archivo, args.tipo,
+            actualizar_existentes=not args.no_actualizar, simular=args.simular
+        )
+    except (OSError, ValueError, SQLAlchemyError) as e:
+        print(f"❌ Error al importar: {e}")
+        return 1
+    finally:
+        dispose_engines()
+    duracion = time.perf_counter() - inicio
+
+    titulo = "Simulación" if reporte['simulado'] else "Importación"
+    print(f"📦 {titulo} de {reporte['tipo']} en {duracion:.2f} s")
+    print(f"  • Filas leídas: {reporte['total']}")
+    print(f"  • Agregados: {reporte['agregados']}")
+    print(f"  • Actualizados: {reporte['actualizados']}")
+    print(f"  • Omitidos: {reporte['omitidos']}")
+    print(f"  • Con errores: {len(reporte['errores'])}")
+    for error in reporte['errores']:
+        id_fila = f" ({error['id']})" if error['id'] else ""
+        print(f"    - Fila {error['fila']}{id_fila}: {error['error']}")
+    return 0 if not reporte['errores'] else 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
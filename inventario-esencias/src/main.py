@@ -1,16 +1,41 @@
 import sys
 import os
+import atexit
+import logging
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
+# Primero: el reloj del reporte de arranque empieza al importarlo
+from utils.arranque import marcar, reporte_arranque
+
 import flet as ft
 from views.main_window import MainWindow
-from views.salidas_form_window import SalidasFormWindow
-from views.historial_ventas_window import HistorialVentasWindow
 from services.producto_service import ProductoService
-from services.salida_service import SalidaService
 from services.frasco_service import FrascoService
+from services.inventario_memoria import InventarioEnMemoria
+from utils.database import dispose_engines
+from utils.tareas_fondo import EjecutorFondo
+from utils.cache_catalogo import cache_frascos, cache_productos, estadisticas_cache
+from utils.carga_diferida import clase_diferida, instancia_diferida, precargar
+from utils.instrumentacion import activar_instrumentacion, reporte_consultas
+
+# INVENTARIO_LOG=DEBUG muestra los mensajes de diagnóstico (rutas, esquema...)
+logging.basicConfig(
+    level=os.environ.get('INVENTARIO_LOG', 'INFO').upper(),
+    format='%(levelname)s %(name)s: %(message)s'
+)
+logger = logging.getLogger('inventario')
+
+# INVENTARIO_PERFIL_SQL=1 registra cada consulta SQL (panel en la ventana
+# principal y reporte al cerrar); apagado no tiene costo
+if os.environ.get('INVENTARIO_PERFIL_SQL', '') not in ('', '0'):
+    activar_instrumentacion()
+    atexit.register(lambda: logger.info(reporte_consultas()))
+
+marcar('importaciones')
 
 def main(page: ft.Page):
+    marcar('inicio de Flet')
+    
     # Configuración de la página
     page.title = "Inventario de Esencias 🧪"
     page.window_width = 1200
@@ -30,19 +55,36 @@ def main(page: ft.Page):
     import os
     current_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
     icon_path = os.path.join(current_dir, "assets", "icono.ico")
-    print(f"DEBUG: Buscando icono ICO en: {icon_path}")
-    print(f"DEBUG: ¿Existe el archivo ICO? {os.path.exists(icon_path)}")
-    
     if os.path.exists(icon_path):
         page.window_icon = icon_path
-        print(f"DEBUG: Icono ICO configurado: {icon_path}")
+        logger.debug("Icono ICO configurado: %s", icon_path)
     else:
-        print("DEBUG: No se encontró el icono ICO, usando icono por defecto")
+        logger.debug("No se encontró el icono ICO en %s, usando icono por defecto", icon_path)
     
-    # Crear los servicios
-    producto_service = ProductoService()
-    salida_service = SalidaService()
-    frasco_service = FrascoService()
+    # Liberar las conexiones de la base de datos al cerrar la aplicación
+    atexit.register(dispose_engines)
+    
+    # Las consultas largas corren fuera de los eventos de Flet
+    ejecutor = EjecutorFondo(page)
+    atexit.register(ejecutor.cerrar)
+    atexit.register(lambda: logger.debug("Caché del catálogo: %s", estadisticas_cache()))
+    
+    # Inventario en memoria: los servicios le pasan cada registro que cambian
+    inventario = InventarioEnMemoria()
+    
+    # Crear los servicios que necesita la tabla principal
+    producto_service = ProductoService(inventario)
+    frasco_service = FrascoService(inventario)
+    marcar('servicios y esquema')
+    
+    # Ventanas y servicios secundarios: se importan y construyen al usarlos por
+    # primera vez, o en segundo plano una vez que la tabla está en pantalla
+    ventana_salidas = clase_diferida('views.salidas_form_window', 'SalidasFormWindow')
+    ventana_historial = clase_diferida('views.historial_ventas_window', 'HistorialVentasWindow')
+    formulario_producto = clase_diferida('views.producto_form_window', 'ProductoFormWindow')
+    salida_service = instancia_diferida('services.salida_service', 'SalidaService', inventario)
+    importacion_service = instancia_diferida('services.importacion_service', 'ImportacionService', inventario)
+    secundarios = (formulario_producto, ventana_salidas, salida_service, ventana_historial, importacion_service)
     
     # Agregar datos de ejemplo si la base de datos está vacía
     # if not producto_service.obtener_todos_los_productos():
@@ -50,6 +92,8 @@ def main(page: ft.Page):
     
     # Crear la ventana principal
     main_window = MainWindow(page)
+    main_window.conectar_inventario(inventario)
+    marcar('ventana principal')
     
     # Funciones que conectan la UI con la base de datos
     def agregar_producto(id_prod, nombre, genero, stock_actual, costo_entrada, proveedor, fecha_cad, costo_ml):
@@ -57,9 +101,7 @@ def main(page: ft.Page):
             id_prod, nombre, stock_actual, costo_entrada, 
             proveedor, fecha_cad, costo_ml, genero
         )
-        if success:
-            cargar_productos()  # Usar cargar_productos para incluir frascos
-        else:
+        if not success:
             raise Exception("No se pudo agregar el producto")
     
     def actualizar_producto(id_prod, nombre, genero, stock_actual, costo_entrada, proveedor, fecha_cad, costo_ml):
@@ -67,9 +109,7 @@ def main(page: ft.Page):
             id_prod, nombre, genero, stock_actual, costo_entrada, 
             proveedor, fecha_cad, costo_ml
         )
-        if success:
-            cargar_productos()  # Usar cargar_productos para incluir frascos
-        else:
+        if not success:
             raise Exception("No se pudo actualizar el producto")
     
     def eliminar_producto(id_prod):
@@ -93,7 +133,7 @@ def main(page: ft.Page):
                     tipo_producto = "esencia"
             
             if success:
-                cargar_productos()  # Usar cargar_productos para incluir frascos
+                # El servicio ya quitó el producto del inventario en memoria
                 return True
             else:
                 # Crear un mensaje más específico
@@ -102,52 +142,75 @@ def main(page: ft.Page):
             # Propagar la excepción con el mensaje específico del servicio
             raise e
     
-    def cargar_productos():
-        # Obtener esencias
+    def leer_catalogo():
         esencias = producto_service.obtener_todos_los_productos()
-        print(f"DEBUG: Esencias cargadas: {len(esencias)}")
+        logger.debug("%s esencias cargadas", len(esencias))
         
-        # Obtener frascos y convertirlos al formato de productos
         frascos = frasco_service.obtener_todos_los_frascos()
-        print(f"DEBUG: Frascos cargados: {len(frascos)}")
-        frascos_formateados = []
-        
-        for frasco in frascos:
-            frasco_formateado = {
-                'id_producto': frasco.get('id_frasco'),
-                'nombre': frasco.get('nombre'),
-                'tipo_producto': 'frasco',
-                'genero': 'N/A',  # Los frascos no tienen género
-                'stock_actual': frasco.get('stock_actual', 0),
-                'costo_entrada': frasco.get('costo', 0),  # Usar costo como costo_entrada
-                'proveedor': 'N/A',  # Los frascos no tienen proveedor específico
-                'fecha_caducidad': 'N/A',  # Los frascos no caducan
-                'costo_por_ml': round(frasco.get('costo', 0) / max(frasco.get('capacidad_ml', 1), 1), 4) if frasco.get('capacidad_ml') else 0,
-                'capacidad_ml': frasco.get('capacidad_ml', 0),  # Información adicional para frascos
-                'costo_frasco': frasco.get('costo', 0)  # Costo por frasco
-            }
-            frascos_formateados.append(frasco_formateado)
-        
-        # Combinar esencias y frascos
-        todos_productos = esencias + frascos_formateados
-        print(f"DEBUG: Total productos combinados: {len(todos_productos)}")
-        main_window.mostrar_productos(todos_productos)
+        logger.debug("%s frascos cargados", len(frascos))
+        return esencias, frascos
+    
+    def recargar_catalogo():
+        # La caché solo se invalida con las escrituras de este proceso: el
+        # botón "Actualizar" la vacía para ver lo que vendieron otras cajas
+        cache_productos.invalidar_todo()
+        cache_frascos.invalidar_todo()
+        return leer_catalogo()
+    
+    def catalogo_cargado(catalogo):
+        esencias, frascos = catalogo
+        inventario.cargar(esencias, frascos)
+        main_window.mostrar_cargando(False)
+        if not arranque_reportado:
+            arranque_reportado.append(True)
+            marcar('catálogo en pantalla')
+            logger.info(reporte_arranque())
+            ejecutor.enviar(precargar, *secundarios, al_terminar=precarga_terminada,
+                            al_fallar=error_precarga, grupo='precarga')
+    
+    def precarga_terminada(construidos):
+        if construidos:
+            logger.debug("Precargados en segundo plano: %s", ", ".join(construidos))
+    
+    def error_precarga(error):
+        # Se vuelve a intentar al abrir la ventana; ahí se muestra el error
+        logger.warning("No se pudo precargar: %s", error)
+    
+    def error_catalogo(error):
+        main_window.mostrar_cargando(False)
+        main_window.alert_manager.show_error(f"Error al cargar productos: {str(error)}")
+    
+    def cargar_productos():
+        # Carga completa (inicio y botón "Actualizar"); los cambios puntuales
+        # llegan por el inventario en memoria. Solo cuenta la última carga pedida.
+        ejecutor.cancelar_grupo('catalogo')
+        main_window.mostrar_cargando(True)
+        ejecutor.enviar(recargar_catalogo, al_terminar=catalogo_cargado, al_fallar=error_catalogo, grupo='catalogo')
     
     def mostrar_form_salidas():
-        # Obtener productos disponibles (solo esencias)
-        productos = producto_service.obtener_todos_los_productos()
-        
-        # Obtener frascos disponibles
-        frascos = frasco_service.obtener_todos_los_frascos()
+        # Leer esencias y frascos disponibles sin bloquear la ventana
+        ejecutor.cancelar_grupo('navegacion')
+        main_window.mostrar_cargando(True)
+        ejecutor.enviar(leer_catalogo_ventas, al_terminar=abrir_form_salidas, al_fallar=error_catalogo, grupo='navegacion')
+    
+    def leer_catalogo_ventas():
+        # Si la precarga todavía no terminó, la ventana y el servicio se cargan aquí
+        precargar(ventana_salidas, salida_service)
+        return leer_catalogo()
+    
+    def abrir_form_salidas(catalogo):
+        productos, frascos = catalogo
+        main_window.mostrar_cargando(False)
         
         # Crear ventana de salidas
-        salidas_window = SalidasFormWindow(page, productos, frascos)
+        SalidasFormWindow = ventana_salidas.obtener()
+        salidas_window = SalidasFormWindow(page, productos, frascos, ejecutor)
         
         # Configurar el callback de guardado
         def on_save_salida(data):
             try:
                 # Registrar la venta combinada usando el nuevo servicio
-                salida_service.registrar_venta_combinada(
+                salida_service.obtener().registrar_venta_combinada(
                     data['producto_id'],
                     data['frasco_id'],
                     data['cantidad'],
@@ -155,8 +218,7 @@ def main(page: ft.Page):
                     data.get('cliente')
                 )
                 
-                # Actualizar la lista de productos en la ventana principal
-                cargar_productos()  # Usar cargar_productos para incluir frascos
+                # El servicio ya pasó el stock nuevo al inventario en memoria
                 
                 # Mostrar alerta de éxito
                 main_window.alert_manager.show_success("¡Venta combinada registrada exitosamente!")
@@ -168,33 +230,85 @@ def main(page: ft.Page):
                 print(f"Error al registrar salida: {e}")
                 return False
         
-        salidas_window.set_callbacks(on_save=on_save_salida, on_cancel=None)
+        def on_save_carrito(lineas):
+            try:
+                # Registrar todo el carrito en una sola transacción
+                ids = salida_service.obtener().registrar_ventas_lote([
+                    (l['producto_id'], l['frasco_id'], l['cantidad'], l['precio_venta'], l.get('cliente'))
+                    for l in lineas
+                ])
+                
+                main_window.alert_manager.show_success(f"¡{len(ids)} ventas registradas exitosamente!")
+                
+                return True
+            except Exception as e:
+                main_window.alert_manager.show_error(f"Error al registrar el carrito: {str(e)}")
+                print(f"Error al registrar carrito: {e}")
+                return False
+        
+        salidas_window.set_callbacks(on_save=on_save_salida, on_cancel=None, on_save_lote=on_save_carrito)
         salidas_window.show()
     
     def mostrar_historial_ventas():
-        # Crear ventana de historial
-        historial_window = HistorialVentasWindow(page, salida_service, producto_service)
+        ejecutor.cancelar_grupo('navegacion')
+        if ventana_historial.listo and salida_service.listo:
+            abrir_historial_ventas()
+        else:
+            # Primer uso antes de que termine la precarga
+            main_window.mostrar_cargando(True)
+            ejecutor.enviar(precargar, ventana_historial, salida_service,
+                            al_terminar=abrir_historial_ventas, al_fallar=error_navegacion, grupo='navegacion')
+    
+    def abrir_historial_ventas(_=None):
+        # Crear ventana de historial (carga sus datos en segundo plano)
+        main_window.mostrar_cargando(False)
+        HistorialVentasWindow = ventana_historial.obtener()
+        historial_window = HistorialVentasWindow(page, salida_service.obtener(), producto_service, ejecutor)
         historial_window.show()
     
+    def error_navegacion(error):
+        main_window.mostrar_cargando(False)
+        main_window.alert_manager.show_error(f"Error al abrir la ventana: {str(error)}")
+    
     # Funciones para manejar frascos
     def agregar_frasco(id_frasco, nombre, capacidad_ml, stock_actual, costo):
         success = frasco_service.agregar_frasco(
             id_frasco, nombre, capacidad_ml, stock_actual, costo
         )
-        if success:
-            cargar_productos()  # Usar cargar_productos para incluir frascos
-        else:
+        if not success:
             raise Exception("No se pudo agregar el frasco")
     
     def actualizar_frasco(id_frasco, nombre, capacidad_ml, stock_actual, costo):
         success = frasco_service.actualizar_frasco(
             id_frasco, nombre, costo, capacidad_ml, stock_actual
         )
-        if success:
-            cargar_productos()  # Usar cargar_productos para incluir frascos
-        else:
+        if not success:
             raise Exception("No se pudo actualizar el frasco")
     
+    # Importación masiva de esencias o frascos
+    def importar_catalogo(ruta):
+        main_window.mostrar_cargando(True)
+        ejecutor.enviar(lambda: importacion_service.obtener().importar_archivo(ruta),
+                        al_terminar=importacion_terminada, al_fallar=error_importacion, grupo='importacion')
+    
+    def importacion_terminada(reporte):
+        # El servicio ya pasó los registros importados al inventario en memoria
+        main_window.mostrar_cargando(False)
+        tipo = "esencias" if reporte['tipo'] == 'productos' else "frascos"
+        mensaje = (f"Importación de {tipo}: {reporte['agregados']} agregados, "
+                   f"{reporte['actualizados']} actualizados, {len(reporte['errores'])} con errores")
+        if reporte['errores']:
+            detalle = "\n".join(f"Fila {e['fila']}: {e['error']}" for e in reporte['errores'][:5])
+            if len(reporte['errores']) > 5:
+                detalle += f"\n... y {len(reporte['errores']) - 5} más"
+            main_window.alert_manager.show_warning(f"{mensaje}\n\n{detalle}")
+        else:
+            main_window.alert_manager.show_success(mensaje)
+    
+    def error_importacion(error):
+        main_window.mostrar_cargando(False)
+        main_window.alert_manager.show_error(f"Error al importar: {str(error)}")
+    
     # Configurar callbacks
     main_window.set_callbacks(
         agregar_producto, 
@@ -204,10 +318,13 @@ def main(page: ft.Page):
         mostrar_form_salidas, 
         mostrar_historial_ventas,
         agregar_frasco,
-        actualizar_frasco
+        actualizar_frasco,
+        importar_catalogo
     )
     
     # Cargar productos iniciales (esencias + frascos)
+    marcar('primer cuadro')
+    arranque_reportado = []
     cargar_productos()
 
 ft.app(target=main)
\ No newline at end of file
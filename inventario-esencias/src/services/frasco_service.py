@@ -1,15 +1,21 @@
 from typing import List, Optional
 from datetime import datetime
-from utils.database import Frasco, create_tables, get_session
+from utils.database import UMBRAL_STOCK_BAJO_FRASCO, Frasco, create_tables, get_session
+from utils.cache_catalogo import TODOS, cache_frascos
+from utils.registros import RegistroFrasco, leer_frascos
 from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy import case, func, select
 
 class FrascoService:
     """Servicio para manejar todas las operaciones CRUD de frascos"""
     
-    def __init__(self):
+    def __init__(self, inventario=None):
         # Crear las tablas si no existen
         create_tables()
         self.get_session = get_session
+        
+        # Inventario en memoria al que se le avisan los cambios (opcional)
+        self.inventario = inventario
     
     def agregar_frasco(self, id_frasco: str, nombre: str, costo: float, capacidad_ml: float, stock_actual: int = 0) -> bool:
         """
@@ -41,6 +47,8 @@ class FrascoService:
             
             session.add(nuevo_frasco)
             session.commit()
+            cache_frascos.invalidar(id_frasco, TODOS)
+            self._publicar(id_frasco)
             return True
             
         except (ValueError, SQLAlchemyError) as e:
@@ -52,66 +60,48 @@ class FrascoService:
     
     def obtener_todos_los_frascos(self) -> List[dict]:
         """
-        Obtiene todos los frascos de la base de datos
+        Obtiene todos los frascos (desde la caché del catálogo si está al día)
         
         Returns:
-            List[dict]: Lista de frascos como diccionarios
+            List[RegistroFrasco]: Frascos (se leen como diccionarios)
         """
-        session = get_session()
         try:
-            frascos = session.query(Frasco).all()
-            resultado = []
-            
-            for frasco in frascos:
-                resultado.append({
-                    'id_frasco': frasco.id,
-                    'nombre': frasco.nombre,
-                    'costo': frasco.costo,
-                    'capacidad_ml': frasco.capacidad_ml,
-                    'stock_actual': frasco.stock_actual,
-                    'valor_total': frasco.valor_total_stock(),
-                    'stock_bajo': frasco.stock_bajo(),
-                    'tipo_producto': 'frasco'
-                })
-            
-            return resultado
-            
+            frascos = cache_frascos.obtener(TODOS, self._leer_todos)
         except SQLAlchemyError as e:
             print(f"Error al obtener frascos: {e}")
             return []
+        # Los registros son inmutables: basta copiar la lista
+        return list(frascos)
+    
+    def _leer_todos(self) -> List[RegistroFrasco]:
+        session = get_session()
+        try:
+            return leer_frascos(session)
         finally:
             session.close()
     
     def buscar_por_id(self, id_frasco: str) -> Optional[dict]:
         """
-        Busca un frasco por su ID
+        Busca un frasco por su ID (desde la caché del catálogo si está al día)
         
         Args:
             id_frasco: ID del frasco a buscar
             
         Returns:
-            dict o None: Datos del frasco si existe, None si no existe
+            RegistroFrasco o None: Datos del frasco si existe, None si no existe
         """
-        session = get_session()
         try:
-            frasco = session.query(Frasco).filter(Frasco.id == id_frasco).first()
-            
-            if frasco:
-                return {
-                    'id_frasco': frasco.id,
-                    'nombre': frasco.nombre,
-                    'costo': frasco.costo,
-                    'capacidad_ml': frasco.capacidad_ml,
-                    'stock_actual': frasco.stock_actual,
-                    'valor_total': frasco.valor_total_stock(),
-                    'stock_bajo': frasco.stock_bajo(),
-                    'tipo_producto': 'frasco'
-                }
-            return None
-            
+            frasco = cache_frascos.obtener(id_frasco, lambda: self._leer_por_id(id_frasco))
         except SQLAlchemyError as e:
             print(f"Error al buscar frasco: {e}")
             return None
+        return frasco
+    
+    def _leer_por_id(self, id_frasco: str) -> Optional[RegistroFrasco]:
+        session = get_session()
+        try:
+            frascos = leer_frascos(session, Frasco.id == id_frasco)
+            return frascos[0] if frascos else None
         finally:
             session.close()
     
@@ -144,6 +134,8 @@ class FrascoService:
             frasco.stock_actual = int(stock_actual)
             
             session.commit()
+            cache_frascos.invalidar(id_frasco, TODOS)
+            self._publicar(id_frasco)
             return True
             
         except SQLAlchemyError as e:
@@ -173,6 +165,9 @@ class FrascoService:
             
             session.delete(frasco)
             session.commit()
+            cache_frascos.invalidar(id_frasco, TODOS)
+            if self.inventario:
+                self.inventario.quitar('frasco', id_frasco)
             return True
             
         except SQLAlchemyError as e:
@@ -182,20 +177,29 @@ class FrascoService:
         finally:
             session.close()
     
+    def _publicar(self, id_frasco: str):
+        """Pasa al inventario en memoria la versión guardada del frasco"""
+        if self.inventario:
+            frasco = self.buscar_por_id(id_frasco)
+            if frasco:
+                self.inventario.poner_frasco(frasco)
+    
     def obtener_estadisticas(self) -> dict:
         """
-        Obtiene estadísticas de los frascos
+        Obtiene estadísticas de los frascos calculadas en SQL
         
         Returns:
             dict: Estadísticas de frascos
         """
         session = get_session()
         try:
-            frascos = session.query(Frasco).all()
-            
-            total_frascos = len(frascos)
-            frascos_stock_bajo = sum(1 for f in frascos if f.stock_bajo())
-            valor_total_inventario = sum(f.valor_total_stock() for f in frascos)
+            total_frascos, frascos_stock_bajo, valor_total_inventario = session.execute(
+                select(
+                    func.count(Frasco.id),
+                    func.coalesce(func.sum(case((Frasco.stock_actual < UMBRAL_STOCK_BAJO_FRASCO, 1), else_=0)), 0),
+                    func.coalesce(func.sum(Frasco.stock_actual * Frasco.costo), 0.0)
+                )
+            ).one()
             
             return {
                 'total_frascos': total_frascos,
@@ -0,0 +1,306 @@
+import math
+from datetime import date, datetime
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import SQLAlchemyError
+
+from utils.database import Frasco, Producto, create_tables, get_session
+from utils.historial_database import create_historial_tables, marcar_productos_en_historial
+from utils.cache_catalogo import TODOS, cache_frascos, cache_productos
+from utils.importacion import leer_archivo
+from utils.registros import leer_frascos, leer_productos
+
+GENEROS = {'masculino': 'Masculino', 'femenino': 'Femenino', 'unisex': 'Unisex'}
+
+# Filas por sentencia IN (...) para no pasar el límite de parámetros de SQLite
+TAMANO_BLOQUE = 500
+
+
+class ImportacionService:
+    """
+    Importación masiva de esencias y frascos desde CSV, JSON o JSON Lines
+
+    Valida y normaliza todas las filas primero, luego inserta (o actualiza las
+    que ya existen) con un solo executemany por tabla en una transacción, y
+    devuelve un reporte con el resultado y los errores de cada fila.
+    """
+
+    def __init__(self, inventario=None):
+        # Crear las tablas si no existen
+        create_tables()
+        create_historial_tables()
+
+        # Inventario en memoria al que se le avisan los cambios (opcional)
+        self.inventario = inventario
+
+    def importar_archivo(self, ruta: str, tipo: Optional[str] = None,
+                         actualizar_existentes: bool = True, simular: bool = False) -> dict:
+        """
+        Importa un archivo de esencias o de frascos
+
+        Args:
+            ruta: Archivo CSV, JSON o JSON Lines
+            tipo: 'productos' o 'frascos'; si es None se deduce de las columnas
+                (los frascos tienen capacidad_ml)
+            actualizar_existentes: Si es False, los IDs que ya existen se omiten
+            simular: Solo valida y clasifica las filas, sin escribir
+
+        Returns:
+            dict: Reporte (ver _importar)
+        """
+        filas = list(leer_archivo(ruta))
+        if tipo is None:
+            primera = next((fila for _, fila, _ in filas if fila), {})
+            tipo = 'frascos' if 'capacidad_ml' in primera else 'productos'
+
+        if tipo == 'productos':
+            return self.importar_productos(filas, actualizar_existentes, simular)
+        if tipo == 'frascos':
+            return self.importar_frascos(filas, actualizar_existentes, simular)
+        raise ValueError(f"Tipo de importación no válido: {tipo}. Debe ser 'productos' o 'frascos'")
+
+    def importar_productos(self, filas: Iterable, actualizar_existentes: bool = True,
+                           simular: bool = False) -> dict:
+        """
+        Importa esencias
+
+        Args:
+            filas: Salida de leer_archivo o una lista de diccionarios
+        """
+        return self._importar('productos', Producto, self._validar_producto, filas,
+                              actualizar_existentes, simular)
+
+    def importar_frascos(self, filas: Iterable, actualizar_existentes: bool = True,
+                         simular: bool = False) -> dict:
+        """
+        Importa frascos
+
+        Args:
+            filas: Salida de leer_archivo o una lista de diccionarios
+        """
+        return self._importar('frascos', Frasco, self._validar_frasco, filas,
+                              actualizar_existentes, simular)
+
+    def _importar(self, tipo: str, modelo, validar: Callable[[dict], dict], filas: Iterable,
+                  actualizar_existentes: bool, simular: bool) -> dict:
+        """
+        Valida, clasifica e inserta las filas en una sola transacción
+
+        Returns:
+            dict: {'tipo', 'total', 'agregados', 'actualizados', 'omitidos',
+            'errores': [{'fila', 'id', 'error'}], 'simulado'}
+        """
+        reporte = {
+            'tipo': tipo, 'total': 0, 'agregados': 0, 'actualizados': 0, 'omitidos': 0,
+            'errores': [], 'simulado': simular
+        }
+
+        # 1. Validar y normalizar todas las filas
+        validas: Dict[str, Tuple[int, dict]] = {}
+        for numero, fila, error in self._numerar(filas):
+            reporte['total'] += 1
+            id_fila = _valor(fila, 'id_producto', 'id_frasco', 'id') if fila else None
+            if error is None:
+                try:
+                    valores = validar(fila)
+                except ValueError as e:
+                    error = str(e)
+                else:
+                    id_fila = valores['id']
+                    if id_fila in validas:
+                        error = f"ID repetido en el archivo (fila {validas[id_fila][0]})"
+                    else:
+                        validas[id_fila] = (numero, valores)
+            if error is not None:
+                reporte['errores'].append({'fila': numero, 'id': id_fila, 'error': error})
+
+        if not validas:
+            return reporte
+
+        session = get_session()
+        try:
+            # 2. Separar nuevas y existentes con consultas por bloque
+            ids = list(validas)
+            existentes = set()
+            for inicio in range(0, len(ids), TAMANO_BLOQUE):
+                existentes.update(session.execute(
+                    select(modelo.id).where(modelo.id.in_(ids[inicio:inicio + TAMANO_BLOQUE]))
+                ).scalars())
+
+            if not actualizar_existentes:
+                for id_fila in existentes:
+                    del validas[id_fila]
+                reporte['omitidos'] = len(existentes)
+                existentes = set()
+
+            reporte['actualizados'] = len(existentes)
+            reporte['agregados'] = len(validas) - len(existentes)
+            if simular or not validas:
+                return reporte
+
+            # 3. Un executemany con UPSERT para todas las filas válidas
+            tabla = modelo.__table__
+            columnas = list(next(iter(validas.values()))[1])
+            sentencia = sqlite_insert(tabla)
+            sentencia = sentencia.on_conflict_do_update(
+                index_elements=[tabla.c.id],
+                set_={columna: sentencia.excluded[columna] for columna in columnas
+                      if columna not in ('id', 'tipo_producto')}
+            )
+            session.execute(sentencia, [valores for _, valores in validas.values()])
+            session.commit()
+
+        except SQLAlchemyError as e:
+            session.rollback()
+            print(f"Error al importar {tipo}: {e}")
+            raise e
+        finally:
+            session.close()
+
+        self._despues_de_importar(tipo, list(validas), existentes)
+        return reporte
+
+    def _despues_de_importar(self, tipo: str, ids: List[str], existentes: set):
+        """Invalida la caché del catálogo y avisa los cambios al inventario en memoria"""
+        if tipo == 'productos':
+            cache_productos.invalidar(*ids, TODOS)
+            # Un ID que tuvo ventas y se vuelve a agregar ya no figura como eliminado
+            marcar_productos_en_historial([i for i in ids if i not in existentes], eliminado=False)
+        else:
+            cache_frascos.invalidar(*ids, TODOS)
+
+        if not self.inventario:
+            return
+        session = get_session()
+        try:
+            registros = []
+            for inicio in range(0, len(ids), TAMANO_BLOQUE):
+                bloque = ids[inicio:inicio + TAMANO_BLOQUE]
+                if tipo == 'productos':
+                    registros.extend(leer_productos(session, Producto.id.in_(bloque)))
+                else:
+                    registros.extend(leer_frascos(session, Frasco.id.in_(bloque)))
+        except SQLAlchemyError as e:
+            print(f"Error al leer los registros importados: {e}")
+            return
+        finally:
+            session.close()
+
+        if tipo == 'productos':
+            self.inventario.poner_varios(esencias=registros)
+        else:
+            self.inventario.poner_varios(frascos=registros)
+
+    @staticmethod
+    def _numerar(filas: Iterable):
+        """Acepta la salida de leer_archivo o simples diccionarios (numerados desde 1)"""
+        for posicion, fila in enumerate(filas, start=1):
+            if isinstance(fila, tuple):
+                yield fila
+            else:
+                yield posicion, {str(llave).strip().lower(): valor for llave, valor in fila.items()}, None
+
+    # --- Validación y normalización ---
+
+    def _validar_producto(self, fila: dict) -> dict:
+        """Devuelve los valores de la tabla productos o lanza ValueError con el motivo"""
+        stock_actual = _numero(fila, 'stock_actual', 'stock')
+        costo_entrada = _numero(fila, 'costo_entrada', 'costo')
+
+        # Si falta el costo por ml se calcula del costo de entrada
+        if _vacio(_valor(fila, 'costo_por_ml')):
+            if stock_actual <= 0:
+                raise ValueError("Falta costo_por_ml (no se puede calcular con stock 0)")
+            costo_por_ml = round(costo_entrada / stock_actual, 4)
+        else:
+            costo_por_ml = _numero(fila, 'costo_por_ml')
+
+        genero = _texto(fila, 'genero', requerido=False) or 'Unisex'
+        if genero.lower() not in GENEROS:
+            raise ValueError(f"Género no válido: {genero}. Use Masculino, Femenino o Unisex")
+
+        return {
+            'id': _texto(fila, 'id_producto', 'id'),
+            'nombre': _texto(fila, 'nombre'),
+            'genero': GENEROS[genero.lower()],
+            'stock_actual': stock_actual,
+            'costo_entrada': costo_entrada,
+            'proveedor': _texto(fila, 'proveedor'),
+            'fecha_caducidad': _fecha(fila, 'fecha_caducidad', 'caducidad'),
+            'costo_por_ml': costo_por_ml,
+            'tipo_producto': 'esencia',
+        }
+
+    def _validar_frasco(self, fila: dict) -> dict:
+        """Devuelve los valores de la tabla frascos o lanza ValueError con el motivo"""
+        capacidad_ml = _numero(fila, 'capacidad_ml', 'capacidad')
+        if capacidad_ml <= 0:
+            raise ValueError("capacidad_ml debe ser mayor a 0")
+        stock_actual = _numero(fila, 'stock_actual', 'stock', requerido=False)
+        if stock_actual != int(stock_actual):
+            raise ValueError(f"stock_actual debe ser un número entero de frascos: {stock_actual}")
+
+        return {
+            'id': _texto(fila, 'id_frasco', 'id'),
+            'nombre': _texto(fila, 'nombre'),
+            'costo': _numero(fila, 'costo'),
+            'capacidad_ml': capacidad_ml,
+            'stock_actual': int(stock_actual),
+        }
+
+
+def _valor(fila: dict, *llaves):
+    """Primer valor presente entre los nombres de columna aceptados"""
+    for llave in llaves:
+        if llave in fila:
+            return fila[llave]
+    return None
+
+
+def _vacio(valor) -> bool:
+    return valor is None or (isinstance(valor, str) and not valor.strip())
+
+
+def _texto(fila: dict, *llaves, requerido: bool = True) -> str:
+    valor = _valor(fila, *llaves)
+    if _vacio(valor):
+        if requerido:
+            raise ValueError(f"Falta {llaves[0]}")
+        return ""
+    return str(valor).strip()
+
+
+def _numero(fila: dict, *llaves, requerido: bool = True) -> float:
+    """Número no negativo; acepta coma decimal ('12,5')"""
+    valor = _valor(fila, *llaves)
+    if _vacio(valor):
+        if requerido:
+            raise ValueError(f"Falta {llaves[0]}")
+        return 0.0
+    try:
+        numero = float(valor.strip().replace(',', '.')) if isinstance(valor, str) else float(valor)
+    except (TypeError, ValueError):
+        raise ValueError(f"{llaves[0]} no es un número: {valor}")
+    if not math.isfinite(numero) or numero < 0:
+        raise ValueError(f"{llaves[0]} debe ser un número mayor o igual a 0: {valor}")
+    return numero
+
+
+def _fecha(fila: dict, *llaves) -> date:
+    """Fecha AAAA-MM-DD (o DD/MM/AAAA, como la exportan las hojas de cálculo)"""
+    valor = _valor(fila, *llaves)
+    if _vacio(valor):
+        raise ValueError(f"Falta {llaves[0]}")
+    if isinstance(valor, date):
+        return valor
+    texto = str(valor).strip()
+    try:
+        return date.fromisoformat(texto[:10])
+    except ValueError:
+        pass
+    try:
+        return datetime.strptime(texto, '%d/%m/%Y').date()
+    except ValueError:
+        raise ValueError(f"{llaves[0]} no es una fecha válida (AAAA-MM-DD): {valor}")
@@ -0,0 +1,119 @@
+"""
+Inventario en memoria (esencias y frascos) con eventos de cambio
+
+Los servicios le pasan exactamente los registros que modificaron y el
+inventario avisa a los suscriptores con la lista de cambios, así la ventana
+principal actualiza solo esas filas en lugar de recargar todo el catálogo.
+"""
+import logging
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from utils.registros import Registro, como_producto
+
+logger = logging.getLogger(__name__)
+
+# Acciones de un cambio
+CARGADO = 'cargado'
+AGREGADO = 'agregado'
+ACTUALIZADO = 'actualizado'
+ELIMINADO = 'eliminado'
+
+# Un cambio es (accion, clave, producto); la clave es ('esencia' | 'frasco', id)
+Cambio = Tuple[str, Tuple[str, str], Optional[dict]]
+
+
+def clave_producto(producto: dict) -> Tuple[str, str]:
+    """Clave de un producto de la ventana principal (los frascos tienen capacidad_ml)"""
+    tipo = 'frasco' if 'capacidad_ml' in producto else 'esencia'
+    return (tipo, producto['id_producto'])
+
+
+class InventarioEnMemoria:
+    """Copia en memoria del catálogo que mantienen los servicios"""
+
+    def __init__(self):
+        self._productos: Dict[Tuple[str, str], dict] = {}
+        self._suscriptores: List[Callable[[List[Cambio]], None]] = []
+        self._lock = threading.RLock()
+
+    def suscribir(self, callback: Callable[[List[Cambio]], None]):
+        """Registra una función que recibe la lista de cambios de cada operación"""
+        self._suscriptores.append(callback)
+
+    def productos(self) -> List[dict]:
+        """Esencias y frascos en el orden en que se cargaron o agregaron"""
+        with self._lock:
+            return list(self._productos.values())
+
+    def obtener(self, tipo: str, id_producto: str) -> Optional[dict]:
+        with self._lock:
+            return self._productos.get((tipo, id_producto))
+
+    def cargar(self, esencias: Iterable[Registro], frascos: Iterable[Registro]):
+        """Reemplaza todo el inventario (carga inicial o actualización manual)"""
+        with self._lock:
+            self._productos = {}
+            for producto in esencias:
+                self._productos[('esencia', producto['id_producto'])] = producto
+            for frasco in frascos:
+                producto = como_producto(frasco)
+                self._productos[('frasco', producto['id_producto'])] = producto
+        self._emitir([(CARGADO, None, None)])
+
+    def poner_esencia(self, esencia: Registro):
+        """Agrega o reemplaza una esencia (RegistroProducto de ProductoService)"""
+        self._poner([('esencia', esencia)])
+
+    def poner_frasco(self, frasco: Registro):
+        """Agrega o reemplaza un frasco (RegistroFrasco de FrascoService)"""
+        self._poner([('frasco', como_producto(frasco))])
+
+    def poner_varios(self, esencias: Iterable[Registro] = (), frascos: Iterable[Registro] = ()):
+        """Agrega o reemplaza varias esencias y frascos con un solo aviso (importación)"""
+        self._poner([('esencia', esencia) for esencia in esencias] +
+                    [('frasco', como_producto(frasco)) for frasco in frascos])
+
+    def quitar(self, tipo: str, id_producto: str):
+        with self._lock:
+            if self._productos.pop((tipo, id_producto), None) is None:
+                return
+        self._emitir([(ELIMINADO, (tipo, id_producto), None)])
+
+    def actualizar_stock(self, esencias: Dict[str, float] = None, frascos: Dict[str, int] = None):
+        """
+        Cambia solo el stock de varias esencias y frascos (después de una venta)
+
+        Args:
+            esencias: {id_producto: stock_actual}
+            frascos: {id_frasco: stock_actual}
+        """
+        cambios = []
+        with self._lock:
+            for tipo, stocks in (('esencia', esencias or {}), ('frasco', frascos or {})):
+                for id_producto, stock_actual in stocks.items():
+                    anterior = self._productos.get((tipo, id_producto))
+                    if anterior is None:
+                        continue
+                    # Los registros recalculan solos valor_total y stock_bajo
+                    cambios.append((tipo, anterior.reemplazar(stock_actual=stock_actual)))
+        self._poner(cambios)
+
+    def _poner(self, productos: List[Tuple[str, dict]]):
+        cambios = []
+        with self._lock:
+            for tipo, producto in productos:
+                clave = (tipo, producto['id_producto'])
+                accion = ACTUALIZADO if clave in self._productos else AGREGADO
+                self._productos[clave] = producto
+                cambios.append((accion, clave, producto))
+        if cambios:
+            self._emitir(cambios)
+
+    def _emitir(self, cambios: List[Cambio]):
+        for callback in list(self._suscriptores):
+            try:
+                callback(cambios)
+            except Exception:
+                # Un suscriptor que falla no impide avisar a los demás
+                logger.exception("Error al notificar cambios del inventario")
@@ -1,14 +1,29 @@
-from typing import List, Optional
+from typing import Iterator, List, Optional
 from datetime import datetime, date
-from utils.database import Producto, create_tables, get_session
+from utils.database import UMBRAL_STOCK_BAJO_ESENCIA, Producto, create_tables, get_engine, get_session
+from utils.historial_database import create_historial_tables, marcar_producto_en_historial
+from utils.cache_catalogo import TODOS, cache_productos
+from utils.registros import COLUMNAS_PRODUCTO, RegistroProducto, leer_productos
+from utils.exportacion import exportar_filas
 from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy import case, func, select
 
 class ProductoService:
     """Servicio para manejar todas las operaciones CRUD de productos"""
     
-    def __init__(self):
+    # Columnas del inventario que se exportan, en orden
+    COLUMNAS_EXPORTACION = (
+        'id_producto', 'nombre', 'genero', 'stock_actual', 'costo_entrada',
+        'proveedor', 'fecha_caducidad', 'costo_por_ml', 'valor_total',
+    )
+    
+    def __init__(self, inventario=None):
         # Crear las tablas si no existen
         create_tables()
+        create_historial_tables()
+        
+        # Inventario en memoria al que se le avisan los cambios (opcional)
+        self.inventario = inventario
     
     def agregar_producto(self, id_producto: str, nombre: str, stock_actual: float, 
                         costo_entrada: float, proveedor: str, fecha_caducidad: str, 
@@ -59,6 +74,11 @@ class ProductoService:
             
             session.add(nuevo_producto)
             session.commit()
+            cache_productos.invalidar(id_producto, TODOS)
+            
+            # Si el ID ya tuvo ventas, el historial vuelve a mostrarlo disponible
+            marcar_producto_en_historial(id_producto, eliminado=False)
+            self._publicar(id_producto)
             return True
             
         except (ValueError, SQLAlchemyError) as e:
@@ -70,70 +90,48 @@ class ProductoService:
     
     def obtener_todos_los_productos(self) -> List[dict]:
         """
-        Obtiene todos los productos de la base de datos
+        Obtiene todos los productos (desde la caché del catálogo si está al día)
         
         Returns:
-            List[dict]: Lista de productos como diccionarios
+            List[RegistroProducto]: Productos (se leen como diccionarios)
         """
-        session = get_session()
         try:
-            productos = session.query(Producto).all()
-            resultado = []
-            
-            for producto in productos:
-                resultado.append({
-                    'id_producto': producto.id,
-                    'nombre': producto.nombre,
-                    'genero': producto.genero,
-                    'stock_actual': producto.stock_actual,
-                    'costo_entrada': producto.costo_entrada,
-                    'proveedor': producto.proveedor,
-                    'fecha_caducidad': producto.fecha_caducidad.strftime('%Y-%m-%d'),
-                    'costo_por_ml': producto.costo_por_ml,
-                    'valor_total': producto.valor_total_stock(),
-                    'stock_bajo': producto.stock_bajo()
-                })
-            
-            return resultado
-            
+            productos = cache_productos.obtener(TODOS, self._leer_todos)
         except SQLAlchemyError as e:
             print(f"Error al obtener productos: {e}")
             return []
+        # Los registros son inmutables: basta copiar la lista
+        return list(productos)
+    
+    def _leer_todos(self) -> List[RegistroProducto]:
+        session = get_session()
+        try:
+            return leer_productos(session)
         finally:
             session.close()
     
     def buscar_por_id(self, id_producto: str) -> Optional[dict]:
         """
-        Busca un producto por su ID
+        Busca un producto por su ID (desde la caché del catálogo si está al día)
         
         Args:
             id_producto: ID del producto a buscar
             
         Returns:
-            dict o None: Datos del producto si existe, None si no existe
+            RegistroProducto o None: Datos del producto si existe, None si no existe
         """
-        session = get_session()
         try:
-            producto = session.query(Producto).filter(Producto.id == id_producto).first()
-            
-            if producto:
-                return {
-                    'id_producto': producto.id,
-                    'nombre': producto.nombre,
-                    'genero': producto.genero,
-                    'stock_actual': producto.stock_actual,
-                    'costo_entrada': producto.costo_entrada,
-                    'proveedor': producto.proveedor,
-                    'fecha_caducidad': producto.fecha_caducidad.strftime('%Y-%m-%d'),
-                    'costo_por_ml': producto.costo_por_ml,
-                    'valor_total': producto.valor_total_stock(),
-                    'stock_bajo': producto.stock_bajo()
-                }
-            return None
-            
+            producto = cache_productos.obtener(id_producto, lambda: self._leer_por_id(id_producto))
         except SQLAlchemyError as e:
             print(f"Error al buscar producto: {e}")
             return None
+        return producto
+    
+    def _leer_por_id(self, id_producto: str) -> Optional[RegistroProducto]:
+        session = get_session()
+        try:
+            productos = leer_productos(session, Producto.id == id_producto)
+            return productos[0] if productos else None
         finally:
             session.close()
     
@@ -184,6 +182,8 @@ class ProductoService:
             producto.costo_por_ml = float(costo_por_ml)
             
             session.commit()
+            cache_productos.invalidar(id_producto, TODOS)
+            self._publicar(id_producto)
             return True
             
         except (ValueError, SQLAlchemyError) as e:
@@ -258,6 +258,10 @@ class ProductoService:
             # El historial de ventas se mantiene independiente
             session.delete(producto)
             session.commit()
+            cache_productos.invalidar(id_producto, TODOS)
+            marcar_producto_en_historial(id_producto, eliminado=True)
+            if self.inventario:
+                self.inventario.quitar('esencia', id_producto)
             
             print(f"Producto {id_producto} eliminado del inventario")
             print("El historial de ventas se mantiene para auditoría")
@@ -270,7 +274,42 @@ class ProductoService:
         finally:
             session.close()
     
-    def buscar_productos(self, termino: str) -> List[dict]:
+    def _publicar(self, id_producto: str):
+        """Pasa al inventario en memoria la versión guardada del producto"""
+        if self.inventario:
+            producto = self.buscar_por_id(id_producto)
+            if producto:
+                self.inventario.poner_esencia(producto)
+    
+    def iterar_inventario(self, lote: int = 1000) -> Iterator[tuple]:
+        """
+        Recorre las esencias ordenadas por ID sin cargarlas completas
+        
+        Yields:
+            tuple: Valores en el orden de COLUMNAS_EXPORTACION
+        """
+        consulta = (
+            select(*COLUMNAS_PRODUCTO, (Producto.stock_actual * Producto.costo_por_ml).label('valor_total'))
+            .order_by(Producto.id)
+        )
+        with get_engine().connect() as connection:
+            for fila in connection.execution_options(yield_per=lote).execute(consulta):
+                yield tuple(fila)
+    
+    def exportar_inventario(self, ruta: str, formato: str = 'csv') -> int:
+        """
+        Exporta el inventario de esencias a CSV o JSON Lines
+        
+        Args:
+            ruta: Archivo de destino
+            formato: 'csv' o 'jsonl'
+            
+        Returns:
+            int: Cantidad de esencias exportadas
+        """
+        return exportar_filas(ruta, self.COLUMNAS_EXPORTACION, self.iterar_inventario(), formato)
+    
+    def buscar_productos(self, termino: str) -> List[RegistroProducto]:
         """
         Busca productos por nombre o proveedor
         
@@ -278,32 +317,16 @@ class ProductoService:
             termino: Término de búsqueda
             
         Returns:
-            List[dict]: Lista de productos que coinciden con la búsqueda
+            List[RegistroProducto]: Productos que coinciden con la búsqueda
         """
         session = get_session()
         try:
-            productos = session.query(Producto).filter(
+            return leer_productos(
+                session,
                 (Producto.nombre.contains(termino)) |
                 (Producto.proveedor.contains(termino)) |
                 (Producto.id.contains(termino))
-            ).all()
-            
-            resultado = []
-            for producto in productos:
-                resultado.append({
-                    'id_producto': producto.id,
-                    'nombre': producto.nombre,
-                    'genero': producto.genero,
-                    'stock_actual': producto.stock_actual,
-                    'costo_entrada': producto.costo_entrada,
-                    'proveedor': producto.proveedor,
-                    'fecha_caducidad': producto.fecha_caducidad.strftime('%Y-%m-%d'),
-                    'costo_por_ml': producto.costo_por_ml,
-                    'valor_total': producto.valor_total_stock(),
-                    'stock_bajo': producto.stock_bajo()
-                })
-            
-            return resultado
+            )
             
         except SQLAlchemyError as e:
             print(f"Error al buscar productos: {e}")
@@ -323,22 +346,36 @@ class ProductoService:
     
     def obtener_estadisticas(self) -> dict:
         """
-        Obtiene estadísticas del inventario
+        Obtiene estadísticas del inventario calculadas en SQL
         
         Returns:
             dict: Estadísticas del inventario
         """
-        productos = self.obtener_todos_los_productos()
-        
-        total_productos = len(productos)
-        productos_stock_bajo = len([p for p in productos if p['stock_bajo']])
-        valor_total_inventario = sum(p['valor_total'] for p in productos)
-        
-        return {
-            'total_productos': total_productos,
-            'productos_stock_bajo': productos_stock_bajo,
-            'valor_total_inventario': valor_total_inventario
-        }
+        session = get_session()
+        try:
+            total_productos, productos_stock_bajo, valor_total_inventario = session.execute(
+                select(
+                    func.count(Producto.id),
+                    func.coalesce(func.sum(case((Producto.stock_actual < UMBRAL_STOCK_BAJO_ESENCIA, 1), else_=0)), 0),
+                    func.coalesce(func.sum(Producto.stock_actual * Producto.costo_por_ml), 0.0)
+                )
+            ).one()
+            
+            return {
+                'total_productos': total_productos,
+                'productos_stock_bajo': productos_stock_bajo,
+                'valor_total_inventario': valor_total_inventario
+            }
+            
+        except SQLAlchemyError as e:
+            print(f"Error al obtener estadísticas: {e}")
+            return {
+                'total_productos': 0,
+                'productos_stock_bajo': 0,
+                'valor_total_inventario': 0.0
+            }
+        finally:
+            session.close()
     
     def agregar_datos_ejemplo(self):
         """Agrega algunos datos de ejemplo para probar"""
@@ -403,47 +440,46 @@ class ProductoService:
         """Obtiene productos filtrados por género"""
         session = get_session()
         try:
-            productos = session.query(Producto).filter(Producto.genero == genero).all()
-            resultado = []
-            
-            for producto in productos:
-                resultado.append({
-                    'id_producto': producto.id,
-                    'nombre': producto.nombre,
-                    'genero': producto.genero,
-                    'stock_actual': producto.stock_actual,
-                    'costo_entrada': producto.costo_entrada,
-                    'proveedor': producto.proveedor,
-                    'fecha_caducidad': producto.fecha_caducidad.strftime('%Y-%m-%d'),
-                    'costo_por_ml': producto.costo_por_ml,
-                    'valor_total': producto.valor_total_stock(),
-                    'stock_bajo': producto.stock_bajo()
-                })
-            
-            return resultado
+            return leer_productos(session, Producto.genero == genero)
         except Exception as e:
             raise RuntimeError(f"Error al obtener productos por género: {str(e)}")
         finally:
             session.close()
-    
     def obtener_estadisticas_por_genero(self):
-        """Obtiene estadísticas de productos agrupadas por género"""
+        """
+        Obtiene estadísticas de productos agrupadas por género
+        
+        Usa un solo GROUP BY; incluye cualquier género presente en la base
+        además de los tres predeterminados.
+        
+        Returns:
+            dict: {genero: {'cantidad_productos', 'total_stock', 'valor_total'}}
+        """
+        session = get_session()
         try:
-            with self.get_session() as session:
-                estadisticas = {}
-                generos = ['Masculino', 'Femenino', 'Unisex']
-                
-                for genero in generos:
-                    productos = session.query(Producto).filter(Producto.genero == genero).all()
-                    total_stock = sum(p.stock_actual for p in productos)
-                    valor_total = sum(p.stock_actual * p.costo_por_ml for p in productos)
-                    
-                    estadisticas[genero] = {
-                        'cantidad_productos': len(productos),
-                        'total_stock': total_stock,
-                        'valor_total': valor_total
-                    }
-                
-                return estadisticas
+            estadisticas = {
+                genero: {'cantidad_productos': 0, 'total_stock': 0, 'valor_total': 0}
+                for genero in ['Masculino', 'Femenino', 'Unisex']
+            }
+            
+            filas = session.execute(
+                select(
+                    Producto.genero,
+                    func.count(Producto.id),
+                    func.sum(Producto.stock_actual),
+                    func.sum(Producto.stock_actual * Producto.costo_por_ml)
+                ).group_by(Producto.genero)
+            )
+            
+            for genero, cantidad, total_stock, valor_total in filas:
+                estadisticas[genero] = {
+                    'cantidad_productos': cantidad,
+                    'total_stock': total_stock or 0,
+                    'valor_total': valor_total or 0
+                }
+            
+            return estadisticas
         except Exception as e:
             raise RuntimeError(f"Error al obtener estadísticas por género: {str(e)}")
+        finally:
+            session.close()
@@ -1,14 +1,42 @@
-from typing import List, Optional
+import logging
+from typing import Iterable, Iterator, List, Optional, Sequence
 from datetime import datetime
-from utils.database import Salida, Producto, Frasco, get_session
+from utils.database import Salida, Producto, Frasco, create_tables, get_engine, get_session, reservar_secuencia
+from utils.historial_database import HistorialVenta, create_historial_tables, get_historial_engine, get_historial_session
+from utils.cache_catalogo import TODOS, cache_frascos, cache_productos
+from utils.exportacion import exportar_filas
 from sqlalchemy.exc import SQLAlchemyError
-from sqlalchemy import func
+from sqlalchemy import and_, bindparam, func, insert, or_, select, update
+
+logger = logging.getLogger(__name__)
+
+# Costo estándar del alcohol; solo se cobra en las ventas con frasco
+COSTO_ALCOHOL = 2.50
+
+# IDs por consulta al reconstruir el historial; si faltan más de
+# BACKFILL_COMPLETO ventas conviene una sola pasada por todas las salidas
+TAMANO_BLOQUE_HISTORIAL = 500
+BACKFILL_COMPLETO = 10000
 
 class SalidaService:
     """Servicio para manejar todas las operaciones CRUD de salidas"""
     
-    def __init__(self):
-        pass
+    # Columnas de historial_ventas que se exportan, en orden
+    COLUMNAS_EXPORTACION = (
+        'id', 'fecha_venta', 'id_producto', 'nombre_producto', 'genero_producto',
+        'proveedor_momento', 'id_frasco', 'nombre_frasco', 'cantidad_vendida',
+        'costo_por_ml_momento', 'costo_frasco_momento', 'costo_alcohol_momento',
+        'costo_produccion', 'precio_venta', 'ganancia', 'cliente', 'producto_eliminado',
+    )
+    
+    def __init__(self, inventario=None):
+        # Crear las tablas si no existen y completar el historial de ventas
+        create_tables()
+        create_historial_tables()
+        self.sincronizar_historial()
+        
+        # Inventario en memoria al que se le avisan los cambios de stock (opcional)
+        self.inventario = inventario
     
     def registrar_salida(self, id_producto: str, cantidad_vendida: float, 
                         precio_venta: float, cliente: str = None) -> bool:
@@ -26,8 +54,11 @@ class SalidaService:
         """
         session = get_session()
         try:
-            # Verificar que el producto existe
-            producto = session.query(Producto).filter(Producto.id == id_producto).first()
+            # Verificar que el producto existe (solo las columnas necesarias)
+            producto = session.execute(
+                select(Producto.nombre, Producto.genero, Producto.proveedor, Producto.stock_actual, Producto.costo_entrada)
+                .where(Producto.id == id_producto)
+            ).first()
             if not producto:
                 raise ValueError(f"No existe un producto con ID: {id_producto}")
             
@@ -41,25 +72,33 @@ class SalidaService:
             costo_total_vendido = costo_por_ml_real * cantidad_vendida
             ganancia = precio_venta - costo_total_vendido
             
-            # Generar ID único para la salida
-            id_salida = self._generar_id_salida()
+            # Generar ID único para la salida (en la misma transacción)
+            id_salida = self._generar_id_salida(session)
             
             # Crear registro de salida
-            nueva_salida = Salida(
-                id=id_salida,
-                id_producto=id_producto,
-                cantidad_vendida=cantidad_vendida,
-                precio_venta=precio_venta,
-                fecha_venta=datetime.now(),
-                cliente=cliente or "",
-                ganancia=ganancia
-            )
+            datos_salida = {
+                'id': id_salida,
+                'id_producto': id_producto,
+                'cantidad_vendida': cantidad_vendida,
+                'precio_venta': precio_venta,
+                'fecha_venta': datetime.now(),
+                'cliente': cliente or "",
+                'ganancia': ganancia,
+                'costo_frasco_momento': 0.0,
+                'costo_alcohol_momento': 0.0
+            }
             
-            # Actualizar stock del producto
-            producto.stock_actual -= cantidad_vendida
+            # Descontar stock de forma atómica (falla si otra venta lo consumió)
+            if not self._descontar_stock(session, Producto, id_producto, cantidad_vendida):
+                raise ValueError(f"Stock insuficiente. Otra venta modificó el stock, Solicitado: {cantidad_vendida} ml")
             
-            session.add(nueva_salida)
+            session.add(Salida(**datos_salida))
             session.commit()
+            
+            self._escribir_historial([
+                self._fila_historial(datos_salida, producto, costo_por_ml_real, costo_total_vendido)
+            ])
+            self._publicar_stock([id_producto], [])
             return True
             
         except (ValueError, SQLAlchemyError) as e:
@@ -86,13 +125,18 @@ class SalidaService:
         """
         session = get_session()
         try:
-            # Verificar que la esencia existe
-            producto = session.query(Producto).filter(Producto.id == id_producto).first()
+            # Verificar que la esencia existe (solo las columnas necesarias)
+            producto = session.execute(
+                select(Producto.nombre, Producto.genero, Producto.proveedor, Producto.stock_actual, Producto.costo_entrada)
+                .where(Producto.id == id_producto)
+            ).first()
             if not producto:
                 raise ValueError(f"No existe una esencia con ID: {id_producto}")
             
             # Verificar que el frasco existe
-            frasco = session.query(Frasco).filter(Frasco.id == id_frasco).first()
+            frasco = session.execute(
+                select(Frasco.nombre, Frasco.costo, Frasco.capacidad_ml, Frasco.stock_actual).where(Frasco.id == id_frasco)
+            ).first()
             if not frasco:
                 raise ValueError(f"No existe un frasco con ID: {id_frasco}")
             
@@ -113,43 +157,244 @@ class SalidaService:
             costo_por_ml_real = producto.costo_entrada / stock_inicial if stock_inicial > 0 else 0
             costo_esencia = costo_por_ml_real * cantidad_vendida
             costo_frasco = frasco.costo
-            costo_alcohol = 2.50  # Costo estándar del alcohol
+            costo_alcohol = COSTO_ALCOHOL
             costo_total = costo_esencia + costo_frasco + costo_alcohol
             ganancia = precio_venta - costo_total
             
-            # Generar ID único para la salida
-            id_salida = self._generar_id_salida()
+            # Generar ID único para la salida (en la misma transacción)
+            id_salida = self._generar_id_salida(session)
+            
+            # Crear registro de salida con el frasco y sus costos del momento
+            datos_salida = {
+                'id': id_salida,
+                'id_producto': id_producto,
+                'cantidad_vendida': cantidad_vendida,
+                'precio_venta': precio_venta,
+                'fecha_venta': datetime.now(),
+                'cliente': cliente or 'Cliente general',
+                'ganancia': ganancia,
+                'id_frasco': id_frasco,
+                'nombre_frasco': frasco.nombre,
+                'costo_frasco_momento': costo_frasco,
+                'costo_alcohol_momento': costo_alcohol
+            }
             
-            # Crear registro de salida (incluye información del frasco en el cliente field para tracking)
-            cliente_info = f"{cliente or 'Cliente general'} | Frasco: {frasco.nombre} ({frasco.capacidad_ml}ml)"
+            # Descontar stock de esencia y frasco de forma atómica
+            if not self._descontar_stock(session, Producto, id_producto, cantidad_vendida):
+                raise ValueError(f"Stock insuficiente de esencia. Otra venta modificó el stock, Solicitado: {cantidad_vendida} ml")
+            if not self._descontar_stock(session, Frasco, id_frasco, 1):
+                raise ValueError("Stock insuficiente de frascos. Otra venta modificó el stock, Solicitado: 1")
             
-            nueva_salida = Salida(
-                id=id_salida,
-                id_producto=id_producto,
-                cantidad_vendida=cantidad_vendida,
-                precio_venta=precio_venta,
-                fecha_venta=datetime.now(),
-                cliente=cliente_info,
-                ganancia=ganancia
-            )
+            session.add(Salida(**datos_salida))
+            session.commit()
             
-            # Actualizar stock de la esencia
-            producto.stock_actual -= cantidad_vendida
+            self._escribir_historial([
+                self._fila_historial(datos_salida, producto, costo_por_ml_real, costo_total, frasco.nombre)
+            ])
+            self._publicar_stock([id_producto], [id_frasco])
+            return True
             
-            # Actualizar stock del frasco
-            frasco.stock_actual -= 1
+        except (ValueError, SQLAlchemyError) as e:
+            session.rollback()
+            print(f"Error al registrar venta combinada: {e}")
+            raise e
+        finally:
+            session.close()
+    
+    def registrar_ventas_lote(self, lineas: Sequence[tuple]) -> List[str]:
+        """
+        Registra varias ventas combinadas (un carrito) en una sola transacción
+        
+        Valida todo el stock al inicio, reserva los IDs en bloque, inserta
+        las salidas con un executemany y hace un único commit. Si cualquier
+        línea falla no se registra ninguna.
+        
+        Args:
+            lineas: Lista de tuplas (id_producto, id_frasco, cantidad_ml, precio_venta, cliente)
+            
+        Returns:
+            List[str]: IDs de las salidas registradas, en el orden de las líneas
+        """
+        if not lineas:
+            return []
+        
+        session = get_session()
+        try:
+            ids_producto = {linea[0] for linea in lineas}
+            ids_frasco = {linea[1] for linea in lineas}
+            
+            # Cargar esencias y frascos involucrados con una consulta cada uno
+            productos = {
+                fila.id: fila for fila in session.execute(
+                    select(Producto.id, Producto.nombre, Producto.genero, Producto.proveedor,
+                           Producto.stock_actual, Producto.costo_entrada)
+                    .where(Producto.id.in_(ids_producto))
+                )
+            }
+            frascos = {
+                fila.id: fila for fila in session.execute(
+                    select(Frasco.id, Frasco.nombre, Frasco.costo, Frasco.capacidad_ml, Frasco.stock_actual)
+                    .where(Frasco.id.in_(ids_frasco))
+                )
+            }
+            
+            # Validar cada línea y acumular lo que se descuenta por esencia y frasco
+            stock_restante = {id_producto: fila.stock_actual for id_producto, fila in productos.items()}
+            frascos_restantes = {id_frasco: fila.stock_actual for id_frasco, fila in frascos.items()}
+            ahora = datetime.now()
+            filas_salida = []
+            costos_linea = []  # (costo_por_ml, costo_total) de cada línea para el historial
+            
+            for numero, (id_producto, id_frasco, cantidad_vendida, precio_venta, cliente) in enumerate(lineas, start=1):
+                producto = productos.get(id_producto)
+                if not producto:
+                    raise ValueError(f"Línea {numero}: No existe una esencia con ID: {id_producto}")
+                frasco = frascos.get(id_frasco)
+                if not frasco:
+                    raise ValueError(f"Línea {numero}: No existe un frasco con ID: {id_frasco}")
+                if cantidad_vendida > frasco.capacidad_ml:
+                    raise ValueError(f"Línea {numero}: La cantidad de esencia ({cantidad_vendida} ml) excede la capacidad del frasco ({frasco.capacidad_ml} ml)")
+                
+                stock_actual = stock_restante[id_producto]
+                if stock_actual < cantidad_vendida:
+                    raise ValueError(f"Línea {numero}: Stock insuficiente de {producto.nombre}. Disponible: {stock_actual} ml, Solicitado: {cantidad_vendida} ml")
+                if frascos_restantes[id_frasco] < 1:
+                    raise ValueError(f"Línea {numero}: Stock insuficiente de frascos {frasco.nombre}. Disponible: {frascos_restantes[id_frasco]}, Solicitado: 1")
+                
+                # Misma ganancia que registrar_venta_combinada, como si se vendieran en orden
+                stock_inicial = stock_actual + cantidad_vendida
+                costo_por_ml_real = producto.costo_entrada / stock_inicial if stock_inicial > 0 else 0
+                costo_alcohol = COSTO_ALCOHOL
+                costo_total = costo_por_ml_real * cantidad_vendida + frasco.costo + costo_alcohol
+                
+                stock_restante[id_producto] = stock_actual - cantidad_vendida
+                frascos_restantes[id_frasco] -= 1
+                costos_linea.append((costo_por_ml_real, costo_total))
+                
+                filas_salida.append({
+                    'id_producto': id_producto,
+                    'cantidad_vendida': cantidad_vendida,
+                    'precio_venta': precio_venta,
+                    'fecha_venta': ahora,
+                    'cliente': cliente or 'Cliente general',
+                    'ganancia': precio_venta - costo_total,
+                    'id_frasco': id_frasco,
+                    'nombre_frasco': frasco.nombre,
+                    'costo_frasco_momento': frasco.costo,
+                    'costo_alcohol_momento': costo_alcohol
+                })
+            
+            # Descontar stock con un UPDATE condicional por esencia y por frasco
+            descuentos_producto = [
+                {'b_id': id_producto, 'b_cantidad': productos[id_producto].stock_actual - restante}
+                for id_producto, restante in stock_restante.items()
+            ]
+            descuentos_frasco = [
+                {'b_id': id_frasco, 'b_cantidad': frascos[id_frasco].stock_actual - restante}
+                for id_frasco, restante in frascos_restantes.items()
+            ]
+            if not self._descontar_stock_lote(session, Producto, descuentos_producto):
+                raise ValueError("Stock insuficiente de esencia. Otra venta modificó el stock")
+            if not self._descontar_stock_lote(session, Frasco, descuentos_frasco):
+                raise ValueError("Stock insuficiente de frascos. Otra venta modificó el stock")
+            
+            # Reservar todos los IDs de una vez e insertar con executemany
+            ids_salida = self._reservar_ids_salida(session, len(filas_salida))
+            for id_salida, fila in zip(ids_salida, filas_salida):
+                fila['id'] = id_salida
+            session.execute(insert(Salida.__table__), filas_salida)
             
-            session.add(nueva_salida)
             session.commit()
-            return True
+            
+            self._escribir_historial([
+                self._fila_historial(
+                    fila, productos[fila['id_producto']], costo_por_ml, costo_total,
+                    frascos[fila['id_frasco']].nombre
+                )
+                for fila, (costo_por_ml, costo_total) in zip(filas_salida, costos_linea)
+            ])
+            self._publicar_stock(productos.keys(), frascos.keys())
+            return ids_salida
             
         except (ValueError, SQLAlchemyError) as e:
             session.rollback()
-            print(f"Error al registrar venta combinada: {e}")
+            print(f"Error al registrar ventas en lote: {e}")
             raise e
         finally:
             session.close()
     
+    def _publicar_stock(self, ids_producto, ids_frasco):
+        """
+        Invalida en la caché del catálogo las filas vendidas y pasa su stock
+        nuevo al inventario en memoria
+        """
+        ids_producto, ids_frasco = list(ids_producto), list(ids_frasco)
+        if ids_producto:
+            cache_productos.invalidar(*ids_producto, TODOS)
+        if ids_frasco:
+            cache_frascos.invalidar(*ids_frasco, TODOS)
+        if not self.inventario:
+            return
+        session = get_session()
+        try:
+            esencias = dict(session.execute(
+                select(Producto.id, Producto.stock_actual).where(Producto.id.in_(ids_producto))
+            ).all()) if ids_producto else {}
+            frascos = dict(session.execute(
+                select(Frasco.id, Frasco.stock_actual).where(Frasco.id.in_(ids_frasco))
+            ).all()) if ids_frasco else {}
+        except SQLAlchemyError as e:
+            print(f"Error al leer el stock vendido: {e}")
+            return
+        finally:
+            session.close()
+        self.inventario.actualizar_stock(esencias=esencias, frascos=frascos)
+    
+    def _descontar_stock_lote(self, session, modelo, descuentos: List[dict]) -> bool:
+        """
+        Versión executemany de _descontar_stock
+        
+        Args:
+            descuentos: Lista de {'b_id': id, 'b_cantidad': cantidad}
+            
+        Returns:
+            bool: True si se descontaron todas las filas
+        """
+        if not descuentos:
+            return True
+        tabla = modelo.__table__
+        resultado = session.execute(
+            update(tabla)
+            .where(tabla.c.id == bindparam('b_id'), tabla.c.stock_actual >= bindparam('b_cantidad'))
+            .values(stock_actual=tabla.c.stock_actual - bindparam('b_cantidad')),
+            descuentos
+        )
+        return resultado.rowcount == len(descuentos)
+    
+    def _descontar_stock(self, session, modelo, id_registro: str, cantidad: float) -> bool:
+        """
+        Descuenta stock con un UPDATE condicional
+        
+        UPDATE ... SET stock_actual = stock_actual - :cantidad
+        WHERE id = :id AND stock_actual >= :cantidad
+        
+        Args:
+            session: Sesión con la transacción de la venta
+            modelo: Producto o Frasco
+            id_registro: ID de la fila a descontar
+            cantidad: Cantidad a descontar
+            
+        Returns:
+            bool: True si se descontó, False si no había stock suficiente
+        """
+        resultado = session.execute(
+            update(modelo)
+            .where(modelo.id == id_registro, modelo.stock_actual >= cantidad)
+            .values(stock_actual=modelo.stock_actual - cantidad)
+            .execution_options(synchronize_session=False)
+        )
+        return resultado.rowcount == 1
+    
     def obtener_todas_las_salidas(self) -> List[dict]:
         """
         Obtiene todas las salidas registradas
@@ -216,159 +461,405 @@ class SalidaService:
         finally:
             session.close()
     
-    def obtener_estadisticas_ventas(self) -> dict:
+    def _generar_id_salida(self, session) -> str:
+        """Genera un ID único para la salida (formato: SAL001, SAL002, etc.)"""
+        return self._reservar_ids_salida(session, 1)[0]
+    
+    def _reservar_ids_salida(self, session, cantidad: int) -> List[str]:
         """
-        Obtiene estadísticas generales de ventas
+        Reserva IDs consecutivos para salidas usando el contador de la tabla secuencias
+        
+        Es O(1): no recorre la tabla salidas y no abre otra sesión.
+        """
+        return [f"SAL{numero:03d}" for numero in reservar_secuencia(session, 'salidas', cantidad)]
+    
+    def obtener_historial_ventas(self):
+        """
+        Obtiene el historial completo de ventas
+        
+        Lee solo la tabla historial_ventas (snapshot escrito al registrar cada
+        venta), recorriendo el índice por fecha; no consulta productos.
+        Para pantallas usar obtener_historial_ventas_pagina.
         
         Returns:
-            dict: Diccionario con estadísticas de ventas
+            list: Lista de diccionarios con información de las ventas
         """
-        session = get_session()
+        session = get_historial_session()
         try:
-            salidas = session.query(Salida).all()
+            consulta = self._consulta_historial().order_by(
+                HistorialVenta.fecha_venta.desc(), HistorialVenta.id.desc()  # Más recientes primero
+            )
+            return [self._venta_historial(fila) for fila in session.execute(consulta)]
             
-            total_ventas = len(salidas)
-            total_ingresos = sum(salida.precio_venta for salida in salidas)
-            total_ganancias = sum(salida.ganancia for salida in salidas)
+        except Exception as e:
+            print(f"Error al obtener historial: {e}")
+            return []
+        finally:
+            session.close()
+    
+    def obtener_historial_ventas_pagina(self, limite: int = 50, cursor: Optional[tuple] = None,
+                                        fecha_desde: Optional[datetime] = None,
+                                        fecha_hasta: Optional[datetime] = None,
+                                        id_producto: Optional[str] = None,
+                                        texto: Optional[str] = None) -> dict:
+        """
+        Obtiene una página del historial ordenada por (fecha_venta DESC, id DESC)
+        
+        Usa paginación por llave (keyset): en lugar de OFFSET se pide lo que
+        viene después del último (fecha_venta, id) mostrado, así cada página
+        cuesta lo mismo sin importar cuántas ventas haya.
+        
+        Args:
+            limite: Cantidad máxima de ventas de la página
+            cursor: (fecha_venta, id) de la última venta de la página anterior
+            fecha_desde: Solo ventas desde esta fecha (inclusive)
+            fecha_hasta: Solo ventas antes de esta fecha (exclusiva)
+            id_producto: Solo ventas de este producto
+            texto: Solo ventas cuyo nombre de producto contenga este texto
             
-            return {
-                'total_ventas': total_ventas,
-                'total_ingresos': total_ingresos,
-                'total_ganancias': total_ganancias,
-                'ganancia_promedio': total_ganancias / total_ventas if total_ventas > 0 else 0
-            }
+        Returns:
+            dict: {'ventas': lista de ventas, 'cursor': cursor de la página
+            siguiente o None si no hay más}
+        """
+        session = get_historial_session()
+        try:
+            consulta = self._consulta_historial()
+            
+            if cursor is not None:
+                fecha_cursor, id_cursor = cursor
+                consulta = consulta.where(or_(
+                    HistorialVenta.fecha_venta < fecha_cursor,
+                    and_(HistorialVenta.fecha_venta == fecha_cursor, HistorialVenta.id < id_cursor)
+                ))
+            if fecha_desde is not None:
+                consulta = consulta.where(HistorialVenta.fecha_venta >= fecha_desde)
+            if fecha_hasta is not None:
+                consulta = consulta.where(HistorialVenta.fecha_venta < fecha_hasta)
+            if id_producto:
+                consulta = consulta.where(HistorialVenta.id_producto == id_producto)
+            if texto:
+                consulta = consulta.where(HistorialVenta.nombre_producto.contains(texto, autoescape=True))
+            
+            # Se pide una fila de más para saber si hay otra página
+            filas = session.execute(
+                consulta
+                .order_by(HistorialVenta.fecha_venta.desc(), HistorialVenta.id.desc())
+                .limit(limite + 1)
+            ).all()
+            
+            hay_mas = len(filas) > limite
+            filas = filas[:limite]
             
-        except SQLAlchemyError as e:
-            print(f"Error al obtener estadísticas: {e}")
             return {
-                'total_ventas': 0,
-                'total_ingresos': 0.0,
-                'total_ganancias': 0.0,
-                'ganancia_promedio': 0.0
+                'ventas': [self._venta_historial(fila) for fila in filas],
+                'cursor': (filas[-1].fecha_venta, filas[-1].id) if hay_mas else None
             }
+            
+        except Exception as e:
+            print(f"Error al obtener página del historial: {e}")
+            return {'ventas': [], 'cursor': None}
         finally:
             session.close()
     
-    def _generar_id_salida(self) -> str:
-        """Genera un ID único para la salida"""
+    def iterar_historial_ventas(self, fecha_desde: Optional[datetime] = None,
+                                fecha_hasta: Optional[datetime] = None,
+                                lote: int = 1000) -> Iterator[tuple]:
+        """
+        Recorre el historial de ventas en orden cronológico sin cargarlo completo
+        
+        Las filas se leen del cursor de a `lote` (yield_per) y se entregan una
+        por una; la conexión queda abierta mientras se consume el generador.
+        
+        Args:
+            fecha_desde: Solo ventas desde esta fecha (inclusive)
+            fecha_hasta: Solo ventas antes de esta fecha (exclusiva)
+            lote: Filas que se traen de la base de datos por vez
+            
+        Yields:
+            tuple: Valores en el orden de COLUMNAS_EXPORTACION
+        """
+        consulta = select(*(getattr(HistorialVenta, columna) for columna in self.COLUMNAS_EXPORTACION))
+        if fecha_desde is not None:
+            consulta = consulta.where(HistorialVenta.fecha_venta >= fecha_desde)
+        if fecha_hasta is not None:
+            consulta = consulta.where(HistorialVenta.fecha_venta < fecha_hasta)
+        consulta = consulta.order_by(HistorialVenta.fecha_venta, HistorialVenta.id)
+        
+        # Conexión de Core (sin la capa del ORM): las filas se procesan más rápido
+        with get_historial_engine().connect() as connection:
+            for fila in connection.execution_options(yield_per=lote).execute(consulta):
+                yield tuple(fila)
+    
+    def exportar_historial_ventas(self, ruta: str, formato: str = 'csv',
+                                  fecha_desde: Optional[datetime] = None,
+                                  fecha_hasta: Optional[datetime] = None) -> int:
+        """
+        Exporta el historial de ventas (o un rango de fechas) a CSV o JSON Lines
+        
+        Args:
+            ruta: Archivo de destino
+            formato: 'csv' o 'jsonl'
+            fecha_desde: Solo ventas desde esta fecha (inclusive)
+            fecha_hasta: Solo ventas antes de esta fecha (exclusiva)
+            
+        Returns:
+            int: Cantidad de ventas exportadas
+        """
+        return exportar_filas(
+            ruta, self.COLUMNAS_EXPORTACION,
+            self.iterar_historial_ventas(fecha_desde, fecha_hasta),
+            formato
+        )
+    
+    def _consulta_historial(self):
+        """Columnas de historial_ventas que necesita la vista del historial"""
+        return select(
+            HistorialVenta.id,
+            HistorialVenta.id_producto,
+            HistorialVenta.nombre_producto,
+            HistorialVenta.nombre_frasco,
+            HistorialVenta.id_frasco,
+            HistorialVenta.cantidad_vendida,
+            HistorialVenta.precio_venta,
+            HistorialVenta.costo_produccion,
+            HistorialVenta.ganancia,
+            HistorialVenta.fecha_venta,
+            HistorialVenta.cliente,
+            HistorialVenta.producto_eliminado,
+        )
+    
+    def _venta_historial(self, fila) -> dict:
+        """Convierte una fila de _consulta_historial al diccionario de la vista"""
+        if fila.nombre_frasco:
+            frasco_nombre = fila.nombre_frasco
+        elif fila.id_frasco is not None:
+            frasco_nombre = f"Frasco {fila.id_frasco}"
+        else:
+            frasco_nombre = "Sin frasco"
+        
+        return {
+            'id': fila.id,
+            'fecha': fila.fecha_venta.strftime("%d/%m/%Y %H:%M"),
+            'fecha_orden': fila.fecha_venta,  # Para ordenamiento
+            'producto_nombre': fila.nombre_producto,
+            'frasco_nombre': frasco_nombre,
+            'producto_id': fila.id_producto,
+            'cantidad_vendida': fila.cantidad_vendida,
+            'precio_venta': fila.precio_venta,
+            'costo_produccion': fila.costo_produccion,
+            'ganancia': fila.ganancia,
+            'cliente': fila.cliente or "N/A",
+            'estado_producto': "Sin stock" if fila.producto_eliminado else "Disponible"
+        }
+    
+    def sincronizar_historial(self) -> int:
+        """
+        Copia a historial_ventas las salidas que todavía no tienen snapshot
+        
+        La primera vez hace el backfill de todas las ventas anteriores; después
+        solo completa las que no se pudieron escribir al registrarse. Busca
+        las salidas cuyo ID no está en el historial (no compara cantidades,
+        así una fila de más en el historial no oculta una venta que falta).
+        
+        Returns:
+            int: Cantidad de ventas agregadas al historial
+        """
         session = get_session()
+        session_historial = get_historial_session()
         try:
-            # Obtener el último ID
-            ultima_salida = session.query(Salida).order_by(Salida.id.desc()).first()
+            faltantes = self._salidas_sin_historial()
+            if not faltantes:
+                return 0
             
-            if ultima_salida:
-                # Extraer el número del último ID (formato: SAL001, SAL002, etc.)
-                ultimo_numero = int(ultima_salida.id[3:])
-                nuevo_numero = ultimo_numero + 1
+            if len(faltantes) > BACKFILL_COMPLETO:
+                # Primer backfill de una base antigua: una sola consulta
+                filas = [fila for fila in self._reconstruir_historial(session) if fila['id'] in faltantes]
             else:
-                nuevo_numero = 1
+                filas = list(self._reconstruir_historial(session, faltantes))
+            session_historial.execute(insert(HistorialVenta.__table__), filas)
+            session_historial.commit()
+            logger.debug("%s ventas copiadas al historial", len(filas))
+            return len(filas)
             
-            return f"SAL{nuevo_numero:03d}"
-            
-        except Exception:
-            # Si hay algún error, usar timestamp
-            return f"SAL{int(datetime.now().timestamp())}"
+        except SQLAlchemyError as e:
+            session_historial.rollback()
+            print(f"Error al sincronizar el historial de ventas: {e}")
+            return 0
         finally:
             session.close()
+            session_historial.close()
     
-    def obtener_historial_ventas(self):
+    def _salidas_sin_historial(self) -> set:
         """
-        Obtiene el historial completo de ventas
+        IDs de salidas que no tienen fila en historial_ventas
         
-        Returns:
-            list: Lista de diccionarios con información de las ventas
+        Adjunta historial_ventas.db a la conexión de inventario.db para
+        resolverlo con un solo NOT EXISTS sobre las claves primarias, sin
+        traer todos los IDs de las dos bases a memoria.
         """
-        session = get_session()
-        try:
-            # Obtener todas las salidas
-            salidas = session.query(Salida).all()
+        ruta_historial = get_historial_engine().url.database
+        with get_engine().connect() as connection:
+            connection.exec_driver_sql("ATTACH DATABASE ? AS historial", (ruta_historial,))
+            try:
+                return set(connection.exec_driver_sql(
+                    "SELECT id FROM salidas WHERE NOT EXISTS "
+                    "(SELECT 1 FROM historial.historial_ventas AS h WHERE h.id = salidas.id)"
+                ).scalars())
+            finally:
+                connection.exec_driver_sql("DETACH DATABASE historial")
+    
+    def _reconstruir_historial(self, session, ids: Optional[Iterable[str]] = None):
+        """
+        Arma las filas de historial_ventas de las salidas indicadas (o de todas)
+        
+        Solo se usa para el backfill: une las salidas con su producto, su
+        frasco y el total vendido por producto. Con ids, consulta por bloques
+        solo esas salidas (completar unas pocas ventas no recorre todas); sin
+        ids, recorre todas las salidas en una sola consulta. Las ventas
+        que guardaron sus costos (costo_alcohol_momento no es NULL) usan la
+        ganancia y los costos registrados, igual que _fila_historial; solo las
+        ventas antiguas sin esos costos se estiman como lo hacía el historial
+        antes del snapshot.
+        """
+        if ids is None:
+            bloques = [None]
+        else:
+            ids = sorted(ids)
+            bloques = [ids[inicio:inicio + TAMANO_BLOQUE_HISTORIAL]
+                       for inicio in range(0, len(ids), TAMANO_BLOQUE_HISTORIAL)]
+        
+        for bloque in bloques:
+            # Total vendido por producto (para reconstruir el stock inicial),
+            # solo de los productos del bloque
+            ventas_por_producto = select(
+                Salida.id_producto.label('id_producto'),
+                func.sum(Salida.cantidad_vendida).label('ventas_totales')
+            )
+            if bloque is not None:
+                ventas_por_producto = ventas_por_producto.where(
+                    Salida.id_producto.in_(select(Salida.id_producto).where(Salida.id.in_(bloque)))
+                )
+            ventas_por_producto = ventas_por_producto.group_by(Salida.id_producto).subquery()
+            
+            consulta = (
+                select(
+                    Salida.id,
+                    Salida.id_producto,
+                    Salida.cantidad_vendida,
+                    Salida.precio_venta,
+                    Salida.fecha_venta,
+                    Salida.cliente,
+                    Salida.ganancia,
+                    Salida.id_frasco,
+                    Salida.costo_frasco_momento,
+                    Salida.costo_alcohol_momento,
+                    func.coalesce(Salida.nombre_frasco, Frasco.nombre).label('frasco_nombre'),
+                    Producto.id.label('producto_existente'),
+                    Producto.nombre.label('producto_nombre'),
+                    Producto.genero,
+                    Producto.proveedor,
+                    Producto.stock_actual,
+                    Producto.costo_entrada,
+                    ventas_por_producto.c.ventas_totales,
+                )
+                .outerjoin(Producto, Producto.id == Salida.id_producto)
+                .outerjoin(Frasco, Frasco.id == Salida.id_frasco)
+                .outerjoin(ventas_por_producto, ventas_por_producto.c.id_producto == Salida.id_producto)
+            )
+            if bloque is not None:
+                consulta = consulta.where(Salida.id.in_(bloque))
             
-            historial = []
-            for salida in salidas:
-                # Obtener el producto manualmente
-                producto = session.query(Producto).filter(Producto.id == salida.id_producto).first()
+            for fila in session.execute(consulta):
+                costo_frasco = fila.costo_frasco_momento or 0.0
                 
-                # Mostrar TODAS las ventas, incluso de productos eliminados
-                if producto:
-                    # Producto aún existe en inventario
-                    producto_nombre = producto.nombre
-                    estado_producto = "Disponible"
-                else:
-                    # Producto eliminado del inventario - mantener el nombre original
-                    producto_nombre = self._recuperar_nombre_producto_eliminado(salida.id_producto)
-                    estado_producto = "Sin stock"
-                
-                # Extraer información del frasco del campo cliente
-                cliente_original = salida.cliente or "N/A"
-                frasco_nombre = "Sin frasco"
-                costo_frasco = 0.0
-                
-                # Si el cliente contiene información del frasco (formato: "cliente | Frasco: nombre (capacidad)")
-                if " | Frasco: " in cliente_original:
-                    partes = cliente_original.split(" | Frasco: ")
-                    cliente_real = partes[0]
-                    frasco_info = partes[1] if len(partes) > 1 else ""
-                    
-                    # Extraer solo el nombre del frasco (antes del paréntesis)
-                    if "(" in frasco_info:
-                        frasco_nombre = frasco_info.split("(")[0].strip()
-                    else:
-                        frasco_nombre = frasco_info
-                    
-                    # Buscar el costo del frasco
-                    frasco = session.query(Frasco).filter(Frasco.nombre == frasco_nombre).first()
-                    if frasco:
-                        costo_frasco = frasco.costo
-                else:
-                    cliente_real = cliente_original
+                if fila.costo_alcohol_momento is not None:
+                    # Costos registrados al vender: se respeta la ganancia guardada
+                    costo_alcohol = fila.costo_alcohol_momento
+                    ganancia = fila.ganancia
+                    costo_produccion = fila.precio_venta - ganancia
+                    costo_esencia = costo_produccion - costo_frasco - costo_alcohol
+                    costo_por_ml = costo_esencia / fila.cantidad_vendida if fila.cantidad_vendida else 0
+                    yield self._fila_backfill(fila, costo_por_ml, costo_frasco, costo_alcohol, costo_produccion, ganancia)
+                    continue
                 
-                # Calcular costo de producción
-                costo_esencia = 0.0
-                if producto:
-                    # Para productos existentes, calcular el stock inicial
-                    # sumando el stock actual + todas las ventas de ese producto
-                    ventas_totales = session.query(Salida).filter(Salida.id_producto == producto.id).with_entities(
-                        func.sum(Salida.cantidad_vendida)
-                    ).scalar() or 0
-                    stock_inicial_calculado = producto.stock_actual + ventas_totales
-                    
-                    costo_por_ml = producto.costo_entrada / stock_inicial_calculado if stock_inicial_calculado > 0 else 0
-                    costo_esencia = costo_por_ml * salida.cantidad_vendida
+                if fila.producto_existente is not None:
+                    # Stock inicial = stock actual + todas las ventas del producto
+                    stock_inicial_calculado = fila.stock_actual + (fila.ventas_totales or 0)
+                    costo_por_ml = fila.costo_entrada / stock_inicial_calculado if stock_inicial_calculado > 0 else 0
+                    costo_esencia = costo_por_ml * fila.cantidad_vendida
                 else:
                     # Para productos eliminados, estimar basándose en ganancia
-                    # costo_produccion ≈ precio_venta - ganancia
-                    costo_esencia = max(0, salida.precio_venta - salida.ganancia - costo_frasco)
+                    costo_esencia = max(0, fila.precio_venta - fila.ganancia - costo_frasco)
+                    costo_por_ml = costo_esencia / fila.cantidad_vendida if fila.cantidad_vendida else 0
                 
-                # Calcular costo total de producción (estimado para alcohol: Q2.50 por venta)
-                costo_alcohol = 2.50  # Estimación fija
+                # Misma regla que al vender: el alcohol solo va con frasco
+                tiene_frasco = fila.id_frasco is not None or fila.frasco_nombre is not None
+                costo_alcohol = COSTO_ALCOHOL if tiene_frasco else 0.0
                 costo_produccion = costo_esencia + costo_alcohol + costo_frasco
-                
-                # Recalcular ganancia basándose en el costo de producción actual
-                ganancia_actual = salida.precio_venta - costo_produccion
-                
-                historial.append({
-                    'id': salida.id,
-                    'fecha': salida.fecha_venta.strftime("%d/%m/%Y %H:%M"),
-                    'fecha_orden': salida.fecha_venta,  # Para ordenamiento
-                    'producto_nombre': producto_nombre,
-                    'frasco_nombre': frasco_nombre,
-                    'producto_id': salida.id_producto,
-                    'cantidad_vendida': salida.cantidad_vendida,
-                    'precio_venta': salida.precio_venta,
-                    'costo_produccion': costo_produccion,
-                    'ganancia': ganancia_actual,
-                    'cliente': cliente_real,
-                    'estado_producto': estado_producto
-                })
-            
-            # Ordenar por fecha descendente (más recientes primero)
-            historial.sort(key=lambda x: x['fecha_orden'], reverse=True)
-            
-            return historial
-            
-        except Exception as e:
-            print(f"Error al obtener historial: {e}")
-            return []
+                yield self._fila_backfill(fila, costo_por_ml, costo_frasco, costo_alcohol, costo_produccion,
+                                          fila.precio_venta - costo_produccion)
+    
+    def _fila_backfill(self, fila, costo_por_ml: float, costo_frasco: float, costo_alcohol: float,
+                       costo_produccion: float, ganancia: float) -> dict:
+        """Arma la fila de historial_ventas de una salida reconstruida"""
+        return {
+            'id': fila.id,
+            'id_producto': fila.id_producto,
+            'nombre_producto': fila.producto_nombre or self._nombre_producto_eliminado(fila.id_producto),
+            'genero_producto': fila.genero or 'Unisex',
+            'cantidad_vendida': fila.cantidad_vendida,
+            'precio_venta': fila.precio_venta,
+            'fecha_venta': fila.fecha_venta,
+            'cliente': fila.cliente,
+            'ganancia': ganancia,
+            'costo_por_ml_momento': costo_por_ml,
+            'proveedor_momento': fila.proveedor or '',
+            'id_frasco': fila.id_frasco,
+            'nombre_frasco': fila.frasco_nombre,
+            'costo_frasco_momento': costo_frasco,
+            'costo_alcohol_momento': costo_alcohol,
+            'costo_produccion': costo_produccion,
+            'producto_eliminado': fila.producto_existente is None
+        }
+    
+    def _fila_historial(self, salida: dict, producto, costo_por_ml: float, costo_produccion: float,
+                        nombre_frasco: Optional[str] = None) -> dict:
+        """Arma la fila de historial_ventas de una salida recién registrada"""
+        return {
+            'id': salida['id'],
+            'id_producto': salida['id_producto'],
+            'nombre_producto': producto.nombre,
+            'genero_producto': producto.genero or 'Unisex',
+            'cantidad_vendida': salida['cantidad_vendida'],
+            'precio_venta': salida['precio_venta'],
+            'fecha_venta': salida['fecha_venta'],
+            'cliente': salida['cliente'],
+            'ganancia': salida['ganancia'],
+            'costo_por_ml_momento': costo_por_ml,
+            'proveedor_momento': producto.proveedor or '',
+            'id_frasco': salida.get('id_frasco'),
+            'nombre_frasco': nombre_frasco,
+            'costo_frasco_momento': salida.get('costo_frasco_momento') or 0.0,
+            'costo_alcohol_momento': salida.get('costo_alcohol_momento') or 0.0,
+            'costo_produccion': costo_produccion,
+            'producto_eliminado': False
+        }
+    
+    def _escribir_historial(self, filas: List[dict]):
+        """
+        Escribe en historial_ventas las ventas que se acaban de confirmar
+        
+        Va después del commit de salidas porque el historial es otro archivo
+        SQLite. Si esta escritura falla la venta sigue registrada y
+        sincronizar_historial completa la fila al volver a iniciar.
+        """
+        session = get_historial_session()
+        try:
+            session.execute(insert(HistorialVenta.__table__).prefix_with('OR IGNORE'), filas)
+            session.commit()
+        except SQLAlchemyError as e:
+            session.rollback()
+            print(f"Error al escribir el historial de ventas: {e}")
         finally:
             session.close()
     
@@ -376,14 +867,23 @@ class SalidaService:
         """
         Obtiene estadísticas básicas de las ventas
         
+        Los totales se calculan en SQL con una sola consulta.
+        
         Returns:
             dict: Diccionario con estadísticas de ventas
         """
         session = get_session()
         try:
-            salidas = session.query(Salida).all()
-            
-            if not salidas:
+            total_ventas, total_ingresos, total_ganancia, productos_vendidos = session.execute(
+                select(
+                    func.count(Salida.id),
+                    func.sum(Salida.precio_venta),
+                    func.sum(Salida.ganancia),
+                    func.count(func.distinct(Salida.id_producto))
+                )
+            ).one()
+            
+            if not total_ventas:
                 return {
                     'total_ventas': 0,
                     'total_ingresos': 0.0,
@@ -392,11 +892,7 @@ class SalidaService:
                     'productos_vendidos': 0
                 }
             
-            total_ventas = len(salidas)
-            total_ingresos = sum(s.precio_venta for s in salidas)
-            total_ganancia = sum(s.ganancia for s in salidas)
-            promedio_venta = total_ingresos / total_ventas if total_ventas > 0 else 0
-            productos_vendidos = len(set(s.id_producto for s in salidas))
+            promedio_venta = total_ingresos / total_ventas
             
             return {
                 'total_ventas': total_ventas,
@@ -418,25 +914,56 @@ class SalidaService:
         finally:
             session.close()
     
-    def _recuperar_nombre_producto_eliminado(self, id_producto):
-        """
-        Intenta recuperar el nombre original de un producto eliminado
-        Basándose en patrones de ID o usando un mapeo de nombres conocidos
-        """
-        # Mapeo de IDs conocidos a nombres (puedes expandir esto)
-        nombres_conocidos = {
-            'RILEYREID': 'Riley Reid Essence',
-            'ESE001': 'Lavanda Premium',
-            'ESE002': 'Rosa Búlgara',
-            'ESE003': 'Vainilla Exótica',
-            'ESE004': 'Ylang Ylang',
-            # Agregar más según sea necesario
-        }
-        
-        # Si el ID está en el mapeo, usar ese nombre
-        if id_producto in nombres_conocidos:
-            return nombres_conocidos[id_producto]
+    def obtener_estadisticas_por_frasco(self) -> List[dict]:
+        """
+        Obtiene ventas, ingresos y ganancia agrupados por frasco
         
+        Returns:
+            List[dict]: Una entrada por frasco vendido, ordenadas por ganancia
+        """
+        session = get_session()
+        try:
+            # El nombre guardado en la venta manda: sigue valiendo si el frasco se
+            # eliminó y es el único dato de las ventas antiguas sin id_frasco
+            nombre = func.coalesce(Salida.nombre_frasco, Frasco.nombre)
+            filas = session.execute(
+                select(
+                    Salida.id_frasco,
+                    nombre,
+                    func.count(Salida.id),
+                    func.sum(Salida.precio_venta),
+                    func.sum(Salida.ganancia),
+                    func.sum(Salida.costo_frasco_momento)
+                )
+                .outerjoin(Frasco, Frasco.id == Salida.id_frasco)
+                .where(or_(Salida.id_frasco.is_not(None), Salida.nombre_frasco.is_not(None)))
+                .group_by(Salida.id_frasco, nombre)
+                .order_by(func.sum(Salida.ganancia).desc())
+            )
+            
+            return [
+                {
+                    'id_frasco': id_frasco,
+                    'nombre': nombre or f"Frasco {id_frasco}",
+                    'total_ventas': total_ventas,
+                    'total_ingresos': round(total_ingresos or 0, 2),
+                    'total_ganancia': round(total_ganancia or 0, 2),
+                    'costo_frascos': round(costo_frascos or 0, 2)
+                }
+                for id_frasco, nombre, total_ventas, total_ingresos, total_ganancia, costo_frascos in filas
+            ]
+            
+        except Exception as e:
+            print(f"Error al obtener estadísticas por frasco: {e}")
+            return []
+        finally:
+            session.close()
+    
+    def _nombre_producto_eliminado(self, id_producto):
+        """
+        Nombre para ventas de productos que ya estaban eliminados antes de
+        existir el historial (las ventas nuevas guardan el nombre real)
+        """
         # Si es un patrón ESE + número, crear nombre genérico
         if id_producto.startswith('ESE'):
             return f"Esencia {id_producto}"
@@ -0,0 +1,69 @@
+"""
+Tiempos de arranque de la aplicación
+
+main.py marca cada etapa (importaciones, servicios, ventana principal, primer
+cuadro, catálogo) con marcar(); el código que corre una sola vez al inicio
+(ruta de la base de datos, creación del esquema) se mide con medir(). Cuando
+el catálogo llega a la pantalla, main.py escribe en el log el desglose que
+arma reporte_arranque().
+
+El reloj empieza cuando se importa este módulo: main.py lo importa antes que
+Flet y SQLAlchemy para que el reporte incluya sus importaciones.
+"""
+import threading
+import time
+from contextlib import contextmanager
+from typing import List, Tuple
+
+_inicio = time.perf_counter()
+_ultima_marca = _inicio
+_etapas: List[Tuple[str, float]] = []   # (etapa, segundos desde la marca anterior)
+_detalles: List[Tuple[str, float]] = []  # (tarea, segundos que duró)
+_lock = threading.Lock()
+
+
+def marcar(etapa: str) -> float:
+    """
+    Cierra una etapa del arranque
+
+    Returns:
+        float: Segundos desde la marca anterior
+    """
+    global _ultima_marca
+    ahora = time.perf_counter()
+    with _lock:
+        duracion = ahora - _ultima_marca
+        _ultima_marca = ahora
+        _etapas.append((etapa, duracion))
+    return duracion
+
+
+@contextmanager
+def medir(tarea: str):
+    """Mide un bloque de código del arranque (se muestra como detalle de su etapa)"""
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        duracion = time.perf_counter() - inicio
+        with _lock:
+            _detalles.append((tarea, duracion))
+
+
+def tiempo_desde_inicio() -> float:
+    return time.perf_counter() - _inicio
+
+
+def reporte_arranque() -> str:
+    """Desglose de las etapas marcadas y de las tareas medidas, en milisegundos"""
+    with _lock:
+        etapas = list(_etapas)
+        detalles = list(_detalles)
+    lineas = [f"Arranque: {tiempo_desde_inicio() * 1000:.0f} ms"]
+    for etapa, duracion in etapas:
+        lineas.append(f"  {etapa:<32} {duracion * 1000:8.1f} ms")
+    if detalles:
+        lineas.append("  Detalle:")
+        for tarea, duracion in detalles:
+            lineas.append(f"    {tarea:<30} {duracion * 1000:8.1f} ms")
+    return "\n".join(lineas)
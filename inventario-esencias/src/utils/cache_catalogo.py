@@ -0,0 +1,101 @@
+"""
+Caché de lectura del catálogo (esencias y frascos)
+
+El catálogo se lee mucho más de lo que cambia: cada búsqueda por ID, cada
+apertura del formulario de ventas y cada recarga de la ventana principal.
+Los servicios leen a través de esta caché y, después de cada commit que
+modifica un producto o un frasco, invalidan exactamente sus entradas y la
+lista completa.
+
+La caché es del proceso (la comparten todas las instancias de los servicios)
+y tiene un tamaño máximo; al llenarse se descarta la entrada usada hace más
+tiempo. Las escrituras de otro proceso (otra caja sobre la misma base) no la
+invalidan: por eso el botón "Actualizar" (recargar_catalogo en main.py) la
+vacía antes de leer. El formulario de ventas sí lee desde la caché.
+"""
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable
+
+# Clave de la lista completa del catálogo
+TODOS = ('todos',)
+
+
+class CacheCatalogo:
+    """
+    Caché LRU con lectura a través (read-through) y contadores
+
+    Args:
+        nombre: Nombre para las estadísticas
+        max_entradas: Entradas guardadas antes de descartar la más antigua
+    """
+
+    def __init__(self, nombre: str, max_entradas: int = 1024):
+        self.nombre = nombre
+        self.max_entradas = max_entradas
+        self._datos: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Cambia con cada invalidación; una lectura que empezó antes no se guarda
+        self._version = 0
+        self.aciertos = 0
+        self.fallos = 0
+        self.desalojos = 0
+
+    def obtener(self, clave: Hashable, cargar: Callable[[], Any]) -> Any:
+        """
+        Devuelve el valor guardado o lo carga con cargar() y lo guarda
+
+        Si cargar() lanza una excepción no se guarda nada. None también se
+        guarda (un ID que no existe no vuelve a consultar la base de datos).
+        """
+        with self._lock:
+            if clave in self._datos:
+                self._datos.move_to_end(clave)
+                self.aciertos += 1
+                return self._datos[clave]
+            self.fallos += 1
+            version = self._version
+
+        valor = cargar()
+
+        with self._lock:
+            # Si hubo una escritura mientras se leía, el valor puede estar viejo
+            if version == self._version:
+                self._datos[clave] = valor
+                self._datos.move_to_end(clave)
+                while len(self._datos) > self.max_entradas:
+                    self._datos.popitem(last=False)
+                    self.desalojos += 1
+        return valor
+
+    def invalidar(self, *claves: Hashable):
+        """Descarta las entradas indicadas (después de escribir en la base de datos)"""
+        with self._lock:
+            self._version += 1
+            for clave in claves:
+                self._datos.pop(clave, None)
+
+    def invalidar_todo(self):
+        with self._lock:
+            self._version += 1
+            self._datos.clear()
+
+    def estadisticas(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                'aciertos': self.aciertos,
+                'fallos': self.fallos,
+                'desalojos': self.desalojos,
+                'entradas': len(self._datos),
+                'max_entradas': self.max_entradas,
+            }
+
+
+# Cachés compartidas por ProductoService, FrascoService y SalidaService
+cache_productos = CacheCatalogo('productos')
+cache_frascos = CacheCatalogo('frascos')
+
+
+def estadisticas_cache() -> Dict[str, Dict[str, int]]:
+    """Contadores de aciertos, fallos y desalojos de las cachés del catálogo"""
+    return {cache.nombre: cache.estadisticas() for cache in (cache_productos, cache_frascos)}
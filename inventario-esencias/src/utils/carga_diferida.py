@@ -0,0 +1,68 @@
+"""
+Carga diferida de ventanas y servicios secundarios
+
+main.py solo necesita la ventana principal y la consulta de productos para
+mostrar la tabla; el formulario de ventas, el historial, la importación y sus
+servicios se importan y construyen la primera vez que se usan. Después de
+pintar la tabla, precargar() los prepara en segundo plano para que abrirlos
+no tenga demora.
+"""
+import importlib
+import threading
+from typing import Any, Callable
+
+
+class Diferido:
+    """Valor que se construye la primera vez que se pide (una sola vez, aunque lo pidan dos hilos)"""
+
+    def __init__(self, fabrica: Callable[[], Any], nombre: str = ""):
+        self._fabrica = fabrica
+        self.nombre = nombre or getattr(fabrica, '__name__', 'diferido')
+        self._valor = None
+        self._listo = False
+        self._lock = threading.Lock()
+
+    @property
+    def listo(self) -> bool:
+        return self._listo
+
+    def obtener(self):
+        if not self._listo:
+            with self._lock:
+                if not self._listo:
+                    self._valor = self._fabrica()
+                    self._listo = True
+                    self._fabrica = None
+        return self._valor
+
+    def __repr__(self):
+        estado = "listo" if self._listo else "pendiente"
+        return f"Diferido({self.nombre}, {estado})"
+
+
+def clase_diferida(modulo: str, nombre: str) -> Diferido:
+    """Clase (o cualquier atributo) de un módulo que se importa al pedirla"""
+    return Diferido(lambda: getattr(importlib.import_module(modulo), nombre), f"{modulo}.{nombre}")
+
+
+def instancia_diferida(modulo: str, nombre: str, *args, **kwargs) -> Diferido:
+    """Instancia de modulo.nombre(*args, **kwargs) que se importa y construye al pedirla"""
+    return Diferido(
+        lambda: getattr(importlib.import_module(modulo), nombre)(*args, **kwargs),
+        f"{modulo}.{nombre}()"
+    )
+
+
+def precargar(*diferidos: Diferido) -> list:
+    """
+    Construye en orden los diferidos que falten (para llamar en segundo plano)
+
+    Returns:
+        list: Nombres de los que se construyeron ahora
+    """
+    construidos = []
+    for diferido in diferidos:
+        if not diferido.listo:
+            diferido.obtener()
+            construidos.append(diferido.nombre)
+    return construidos
@@ -1,11 +1,21 @@
 import os
-from sqlalchemy import create_engine, Column, Integer, String, Date, Float, ForeignKey, DateTime
+import logging
+import tempfile
+import threading
+from sqlalchemy import create_engine, event, select, update, Column, Integer, String, Date, Float, ForeignKey, DateTime, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
 from datetime import datetime
+from utils.arranque import medir
+
+logger = logging.getLogger(__name__)
 
 Base = declarative_base()
 
+# Umbrales de stock bajo (los usan los modelos, los registros y las estadísticas en SQL)
+UMBRAL_STOCK_BAJO_ESENCIA = 50  # ml
+UMBRAL_STOCK_BAJO_FRASCO = 10  # unidades
+
 class Producto(Base):
     __tablename__ = 'productos'
 
@@ -19,6 +29,11 @@ class Producto(Base):
     costo_por_ml = Column(Float, nullable=False)
     tipo_producto = Column(String, nullable=False, default='esencia')  # 'esencia' o 'frasco'
     
+    __table_args__ = (
+        Index('ix_productos_genero', 'genero'),
+        Index('ix_productos_proveedor', 'proveedor'),
+    )
+    
     # Relación con Salidas (sin foreign key constraint para independencia)
     # salidas = relationship("Salida", back_populates="producto")
 
@@ -26,7 +41,7 @@ class Producto(Base):
         return self.stock_actual * self.costo_por_ml
 
     def stock_bajo(self):
-        return self.stock_actual < 50  # Umbral fijo de 50ml
+        return self.stock_actual < UMBRAL_STOCK_BAJO_ESENCIA
 
 class Frasco(Base):
     __tablename__ = 'frascos'
@@ -41,7 +56,7 @@ class Frasco(Base):
         return self.stock_actual * self.costo
 
     def stock_bajo(self):
-        return self.stock_actual < 10  # Umbral de 10 frascos
+        return self.stock_actual < UMBRAL_STOCK_BAJO_FRASCO
 
 class Salida(Base):
     __tablename__ = 'salidas'
@@ -54,82 +69,309 @@ class Salida(Base):
     cliente = Column(String, nullable=True)
     ganancia = Column(Float, nullable=False, default=0.0)
     
+    # Frasco vendido y costos al momento de la venta (None en ventas sin frasco)
+    id_frasco = Column(String, nullable=True)  # Sin Foreign Key, igual que id_producto
+    costo_frasco_momento = Column(Float, nullable=True)
+    costo_alcohol_momento = Column(Float, nullable=True)
+    nombre_frasco = Column(String, nullable=True)  # Se conserva aunque el frasco se elimine
+    
+    __table_args__ = (
+        Index('ix_salidas_producto_fecha', 'id_producto', 'fecha_venta'),
+        Index('ix_salidas_fecha_venta', 'fecha_venta'),
+        Index('ix_salidas_id_frasco', 'id_frasco'),
+    )
+    
     # Sin relación con Producto para mantener historial independiente
     # producto = relationship("Producto", back_populates="salidas")
 
-import os
+class Secuencia(Base):
+    __tablename__ = 'secuencias'
+
+    nombre = Column(String, primary_key=True)  # p. ej. 'salidas'
+    valor = Column(Integer, nullable=False, default=0)  # Último número entregado
+
+def reservar_secuencia(session, nombre, cantidad=1):
+    """
+    Reserva `cantidad` números consecutivos de una secuencia
+    
+    Se ejecuta dentro de la transacción de la sesión: el UPDATE toma el
+    bloqueo de escritura, así que dos vendedores nunca reciben el mismo
+    número y un rollback devuelve los números reservados.
+    
+    Returns:
+        range: Números reservados, en orden
+    """
+    resultado = session.execute(
+        update(Secuencia)
+        .where(Secuencia.nombre == nombre)
+        .values(valor=Secuencia.valor + cantidad)
+        .execution_options(synchronize_session=False)
+    )
+    if resultado.rowcount == 0:
+        # Primera vez: la secuencia empieza en cero
+        session.add(Secuencia(nombre=nombre, valor=cantidad))
+        session.flush()
+        ultimo = cantidad
+    else:
+        ultimo = session.execute(select(Secuencia.valor).where(Secuencia.nombre == nombre)).scalar_one()
+    return range(ultimo - cantidad + 1, ultimo + 1)
+
 import sys
 
-def get_database_path():
-    """Obtiene la ruta de la base de datos considerando si es .exe o desarrollo"""
+# Ruta resuelta la primera vez que se pide (ver get_database_path)
+_database_path = None
+_path_lock = threading.Lock()
+
+def _directorio_escribible(directorio):
+    """Prueba real de escritura: en Windows os.access no refleja las ACL de Program Files"""
+    try:
+        with tempfile.TemporaryFile(dir=directorio):
+            pass
+        return True
+    except OSError:
+        return False
+
+def _directorio_documentos():
+    documents_dir = os.path.join(os.path.expanduser('~'), 'Documents', 'InventarioEsencias')
+    os.makedirs(documents_dir, exist_ok=True)
+    return documents_dir
+
+def _resolver_ruta_base_datos():
     if getattr(sys, 'frozen', False):
-        # Si está ejecutándose como .exe
+        # Si está ejecutándose como .exe, usar el directorio del .exe si se puede
+        # escribir ahí; si no, Documents del usuario
         try:
-            # Intentar usar el directorio donde está el .exe
             exe_dir = os.path.dirname(sys.executable)
-            db_path = os.path.join(exe_dir, 'inventario.db')
-            
-            # Verificar si tenemos permisos de escritura
-            test_file = os.path.join(exe_dir, 'test_write.tmp')
-            try:
-                with open(test_file, 'w') as f:
-                    f.write('test')
-                os.remove(test_file)
-                return db_path
-            except (PermissionError, OSError):
-                # Si no tenemos permisos, usar Documents del usuario
-                documents_dir = os.path.join(os.path.expanduser('~'), 'Documents', 'InventarioEsencias')
-                if not os.path.exists(documents_dir):
-                    os.makedirs(documents_dir, exist_ok=True)
-                return os.path.join(documents_dir, 'inventario.db')
-        except Exception:
-            # Como último recurso, usar Documents del usuario
-            documents_dir = os.path.join(os.path.expanduser('~'), 'Documents', 'InventarioEsencias')
-            if not os.path.exists(documents_dir):
-                os.makedirs(documents_dir, exist_ok=True)
-            return os.path.join(documents_dir, 'inventario.db')
+            if _directorio_escribible(exe_dir):
+                return os.path.join(exe_dir, 'inventario.db')
+        except Exception as e:
+            logger.warning("No se pudo verificar el directorio del ejecutable: %s", e)
+        return os.path.join(_directorio_documentos(), 'inventario.db')
     else:
-        # Si está ejecutándose en desarrollo
-        # Obtener la ruta absoluta del directorio src
+        # Si está ejecutándose en desarrollo: src/inventario.db
         current_dir = os.path.dirname(os.path.abspath(__file__))
         src_dir = os.path.dirname(current_dir)  # Subir un nivel desde utils/ a src/
         return os.path.join(src_dir, 'inventario.db')
 
-DATABASE_PATH = get_database_path()
-DATABASE_URL = f'sqlite:///{DATABASE_PATH}'
+def get_database_path():
+    """
+    Obtiene la ruta de la base de datos considerando si es .exe o desarrollo
+
+    Se resuelve una sola vez por proceso, la primera vez que se necesita (no al
+    importar el módulo): la prueba de escritura del .exe no se repite.
+    """
+    global _database_path
+    if _database_path is None:
+        with _path_lock:
+            if _database_path is None:
+                with medir('ruta de la base de datos'):
+                    ruta = _resolver_ruta_base_datos()
+                logger.debug("Ruta de la base de datos: %s (¿Es .exe? %s)", ruta, getattr(sys, 'frozen', False))
+                _database_path = ruta
+    return _database_path
+
+def usar_base_de_datos(ruta):
+    """
+    Apunta la aplicación a otro archivo (benchmarks, datos de prueba)
+
+    historial_ventas.db se toma del mismo directorio. Se liberan los engines;
+    llamar antes de crear los servicios.
+    """
+    global _database_path
+    with _path_lock:
+        _database_path = os.path.abspath(ruta)
+    dispose_engines()
+
+def get_database_url():
+    return f'sqlite:///{get_database_path()}'
+
+def __getattr__(nombre):
+    # DATABASE_PATH y DATABASE_URL se siguen pudiendo importar, pero se resuelven al pedirlos
+    if nombre == 'DATABASE_PATH':
+        return get_database_path()
+    if nombre == 'DATABASE_URL':
+        return get_database_url()
+    raise AttributeError(f"module {__name__!r} has no attribute {nombre!r}")
 
-# Debug: Mostrar la ruta de la base de datos
-print(f"DEBUG: Ruta de la base de datos: {DATABASE_PATH}")
-print(f"DEBUG: ¿Es .exe? {getattr(sys, 'frozen', False)}")
-print(f"DEBUG: URL de la base de datos: {DATABASE_URL}")
+# Configuración del pool de conexiones compartida por todos los engines
+POOL_SETTINGS = {
+    'pool_size': 5,
+    'max_overflow': 10,
+    'pool_timeout': 30,
+    'pool_pre_ping': False,
+}
 
-def get_engine():
-    return create_engine(DATABASE_URL)
+# Perfiles de rendimiento de SQLite aplicados a cada conexión nueva
+SQLITE_PROFILES = {
+    # Máxima seguridad ante cortes de luz; WAL permite leer mientras se vende
+    'durable': {
+        'journal_mode': 'WAL',
+        'synchronous': 'FULL',
+        'cache_size': -8000,         # 8 MB
+        'mmap_size': 0,
+        'temp_store': 'MEMORY',
+        'busy_timeout': 5000,
+    },
+    # Uso normal del mostrador
+    'fast': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'cache_size': -32000,        # 32 MB
+        'mmap_size': 268435456,      # 256 MB
+        'temp_store': 'MEMORY',
+        'busy_timeout': 5000,
+    },
+    # Importaciones masivas: sin fsync, caché grande
+    'bulk-import': {
+        'journal_mode': 'WAL',
+        'synchronous': 'OFF',
+        'cache_size': -131072,       # 128 MB
+        'mmap_size': 536870912,      # 512 MB
+        'temp_store': 'MEMORY',
+        'busy_timeout': 10000,
+    },
+}
+
+# Perfil por URL; la clave None es el perfil por defecto
+_sqlite_profiles = {None: 'fast'}
+
+# Registro de engines y fábricas de sesiones por URL (uno por proceso)
+_engines = {}
+_session_factories = {}
+_registry_lock = threading.Lock()
+
+def set_sqlite_profile(perfil, url=None):
+    """
+    Selecciona el perfil de SQLite para una URL (o el perfil por defecto si url es None)
+
+    El engine afectado se libera para que las nuevas conexiones usen el perfil.
+    """
+    if perfil not in SQLITE_PROFILES:
+        raise ValueError(f"Perfil '{perfil}' no válido. Debe ser uno de: {', '.join(SQLITE_PROFILES)}")
+    _sqlite_profiles[url] = perfil
+    if url is None:
+        dispose_engines()
+    else:
+        _dispose_engine(url)
+
+def get_sqlite_profile(url=None):
+    """Obtiene el nombre del perfil de SQLite que se aplica a la URL"""
+    return _sqlite_profiles.get(url or get_database_url(), _sqlite_profiles[None])
+
+def _instalar_perfil_sqlite(engine, perfil):
+    """Registra el evento connect que aplica los PRAGMA del perfil"""
+    pragmas = SQLITE_PROFILES[perfil]
+
+    @event.listens_for(engine, "connect")
+    def _aplicar_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for nombre, valor in pragmas.items():
+                cursor.execute(f"PRAGMA {nombre}={valor}")
+        finally:
+            cursor.close()
+
+def configure_pool(**settings):
+    """
+    Ajusta la configuración del pool de conexiones
+
+    Los engines ya creados se liberan para que los nuevos valores
+    se apliquen en la siguiente conexión.
+    """
+    POOL_SETTINGS.update(settings)
+    dispose_engines()
+
+def get_engine(url=None):
+    """Obtiene el engine compartido para la URL indicada, creándolo la primera vez"""
+    url = url or get_database_url()
+    engine = _engines.get(url)
+    if engine is None:
+        with _registry_lock:
+            engine = _engines.get(url)
+            if engine is None:
+                engine = create_engine(url, **POOL_SETTINGS)
+                if engine.dialect.name == 'sqlite':
+                    _instalar_perfil_sqlite(engine, get_sqlite_profile(url))
+                _engines[url] = engine
+    return engine
+
+def get_session_factory(url=None):
+    """Obtiene la fábrica de sesiones compartida para la URL indicada"""
+    url = url or get_database_url()
+    factory = _session_factories.get(url)
+    if factory is None:
+        engine = get_engine(url)
+        with _registry_lock:
+            factory = _session_factories.get(url)
+            if factory is None:
+                factory = sessionmaker(bind=engine)
+                _session_factories[url] = factory
+    return factory
+
+def _dispose_engine(url):
+    """Libera el engine de una URL concreta, si existe"""
+    with _registry_lock:
+        engine = _engines.pop(url, None)
+        _session_factories.pop(url, None)
+    if engine is not None:
+        engine.dispose()
+
+def dispose_engines():
+    """Cierra todas las conexiones de los engines registrados (llamar al cerrar la app)"""
+    with _registry_lock:
+        engines = list(_engines.values())
+        _engines.clear()
+        _session_factories.clear()
+    for engine in engines:
+        engine.dispose()
+
+# Esquemas ya creados y migrados en este proceso (por URL)
+_esquemas_listos = set()
+_esquema_lock = threading.Lock()
+
+def crear_esquema_una_vez(url, crear):
+    """
+    Ejecuta crear() solo la primera vez que se pide para la URL
+
+    Cada servicio llama a create_tables() al construirse; el CREATE TABLE,
+    la inspección y las migraciones se hacen una sola vez por proceso.
+    """
+    if url in _esquemas_listos:
+        return
+    with _esquema_lock:
+        if url not in _esquemas_listos:
+            crear()
+            _esquemas_listos.add(url)
 
 def create_tables():
+    crear_esquema_una_vez(get_database_url(), _crear_tablas)
+
+def _crear_tablas():
+    database_path = get_database_path()
     try:
-        # Asegurar que el directorio existe
-        db_dir = os.path.dirname(DATABASE_PATH)
-        if not os.path.exists(db_dir):
-            os.makedirs(db_dir, exist_ok=True)
-            print(f"DEBUG: Directorio creado: {db_dir}")
-        
-        engine = get_engine()
-        Base.metadata.create_all(engine)
-        print(f"DEBUG: Tablas creadas exitosamente en: {DATABASE_PATH}")
-        
+        with medir('esquema de inventario.db'):
+            # Asegurar que el directorio existe
+            db_dir = os.path.dirname(database_path)
+            if not os.path.exists(db_dir):
+                os.makedirs(db_dir, exist_ok=True)
+                logger.debug("Directorio creado: %s", db_dir)
+
+            engine = get_engine()
+            Base.metadata.create_all(engine)
+            logger.debug("Tablas creadas en: %s", database_path)
+
+            # Aplicar migraciones pendientes (índices, columnas nuevas...)
+            from utils.migrate_schema import aplicar_migraciones
+            aplicar_migraciones(engine)
+
         # Verificar si el archivo se creó
-        if os.path.exists(DATABASE_PATH):
-            print(f"DEBUG: Base de datos confirmada en: {DATABASE_PATH}")
-        else:
-            print(f"ERROR: No se pudo crear la base de datos en: {DATABASE_PATH}")
-            
-    except Exception as e:
-        print(f"ERROR al crear tablas: {e}")
-        print(f"ERROR: Ruta de base de datos: {DATABASE_PATH}")
+        if not os.path.exists(database_path):
+            logger.error("No se pudo crear la base de datos en: %s", database_path)
+
+    except Exception:
+        logger.exception("Error al crear tablas en: %s", database_path)
         raise
 
 def get_session():
-    engine = get_engine()
-    Session = sessionmaker(bind=engine)
+    Session = get_session_factory()
     return Session()
\ No newline at end of file
@@ -0,0 +1,193 @@
+"""
+Generador de bases de datos sintéticas para los benchmarks
+
+Llena inventario.db e historial_ventas.db (los que estén configurados; ver
+usar_base_de_datos) con esencias, frascos y ventas parecidos a los reales:
+géneros, proveedores y capacidades de frasco repetidos, ventas repartidas en
+los últimos dos años, una parte sin frasco y una parte de productos ya
+eliminados (tienen ventas en el historial pero no están en productos).
+
+Las ventas se escriben en salidas y en historial_ventas con los mismos
+cálculos que SalidaService, así sincronizar_historial no tiene nada que
+copiar. Con una semilla fija los datos son siempre los mismos.
+"""
+import random
+from datetime import date, datetime, timedelta
+from typing import Iterator, List
+
+from sqlalchemy import func, insert, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from utils.database import Frasco, Producto, Salida, Secuencia, create_tables, get_engine
+from utils.historial_database import HistorialVenta, create_historial_tables, get_historial_engine
+
+# Filas por executemany
+TAMANO_LOTE = 5000
+
+COSTO_ALCOHOL = 2.50  # Igual que SalidaService
+
+_NOTAS = ('Vainilla', 'Ámbar', 'Sándalo', 'Jazmín', 'Rosa', 'Bergamota', 'Cuero', 'Oud', 'Lavanda',
+          'Pachulí', 'Almizcle', 'Cítrico', 'Coco', 'Tabaco', 'Vetiver', 'Neroli', 'Iris', 'Cedro')
+_ESTILOS = ('Intenso', 'Suave', 'Nocturno', 'Fresco', 'Clásico', 'Dulce', 'Oriental', 'Sport')
+_PROVEEDORES = tuple(f"Proveedor {letra}" for letra in 'ABCDEFGHIJKLMNOPQRST')
+_GENEROS = ('Masculino', 'Femenino', 'Unisex')
+_CAPACIDADES = (10, 15, 30, 50, 100)
+_CLIENTES = tuple(f"Cliente {numero}" for numero in range(1, 301)) + ('Cliente general',) * 100
+
+
+def generar_base_de_datos(productos: int = 1000, frascos: int = 50, salidas: int = 10000,
+                          eliminados: float = 0.05, sin_frasco: float = 0.2, semilla: int = 42) -> dict:
+    """
+    Genera el catálogo y las ventas en las bases configuradas
+
+    Args:
+        productos: Esencias en el inventario
+        frascos: Frascos en el inventario
+        salidas: Ventas registradas
+        eliminados: Proporción extra de esencias que solo existen en el historial
+        sin_frasco: Proporción de ventas sin frasco
+        semilla: Semilla del generador aleatorio
+
+    Returns:
+        dict: Cantidades generadas por tabla
+
+    Raises:
+        ValueError: Si la base ya tiene productos o ventas (nunca mezcla datos
+            sintéticos con datos reales)
+    """
+    create_tables()
+    create_historial_tables()
+    engine = get_engine()
+    with engine.connect() as connection:
+        existentes = connection.execute(select(func.count(Producto.id))).scalar() + \
+            connection.execute(select(func.count(Salida.id))).scalar()
+    if existentes:
+        raise ValueError("La base de datos ya tiene datos; use un archivo nuevo para los datos sintéticos")
+
+    azar = random.Random(semilla)
+    esencias = [_esencia(azar, numero) for numero in range(1, productos + 1)]
+    borradas = [_esencia(azar, numero) for numero in range(productos + 1, productos + 1 + int(productos * eliminados))]
+    lista_frascos = [_frasco(azar, numero) for numero in range(1, frascos + 1)]
+
+    with engine.begin() as connection:
+        _insertar(connection, Producto.__table__, esencias)
+        _insertar(connection, Frasco.__table__, lista_frascos)
+
+    # Las ventas se escriben por lotes en las dos bases
+    con_historial = esencias + borradas
+    ids_borrados = {esencia['id'] for esencia in borradas}
+    total = 0
+    with engine.begin() as connection, get_historial_engine().begin() as connection_historial:
+        lote_salidas, lote_historial = [], []
+        for salida, historial in _ventas(azar, salidas, con_historial, lista_frascos, sin_frasco, ids_borrados):
+            lote_salidas.append(salida)
+            lote_historial.append(historial)
+            if len(lote_salidas) >= TAMANO_LOTE:
+                total += _vaciar(connection, connection_historial, lote_salidas, lote_historial)
+        total += _vaciar(connection, connection_historial, lote_salidas, lote_historial)
+        # El contador de IDs sigue después de la última venta generada
+        connection.execute(
+            sqlite_insert(Secuencia.__table__).values(nombre='salidas', valor=total)
+            .on_conflict_do_update(index_elements=['nombre'], set_={'valor': total})
+        )
+
+    return {'productos': len(esencias), 'eliminados': len(borradas),
+            'frascos': len(lista_frascos), 'salidas': total}
+
+
+def _insertar(connection, tabla, filas: List[dict]):
+    for inicio in range(0, len(filas), TAMANO_LOTE):
+        connection.execute(insert(tabla), filas[inicio:inicio + TAMANO_LOTE])
+
+
+def _vaciar(connection, connection_historial, lote_salidas: list, lote_historial: list) -> int:
+    if not lote_salidas:
+        return 0
+    connection.execute(insert(Salida.__table__), lote_salidas)
+    connection_historial.execute(insert(HistorialVenta.__table__), lote_historial)
+    cantidad = len(lote_salidas)
+    lote_salidas.clear()
+    lote_historial.clear()
+    return cantidad
+
+
+def _esencia(azar: random.Random, numero: int) -> dict:
+    # Stock alto para que los benchmarks de venta no se queden sin esencia
+    stock = round(azar.uniform(500, 5000), 1)
+    costo_por_ml = round(azar.uniform(5, 60), 2)
+    return {
+        'id': f"ESE{numero:06d}",
+        'nombre': f"{azar.choice(_NOTAS)} {azar.choice(_NOTAS)} {azar.choice(_ESTILOS)} {numero}",
+        'genero': azar.choice(_GENEROS),
+        'stock_actual': stock,
+        'costo_entrada': round(stock * costo_por_ml, 2),
+        'proveedor': azar.choice(_PROVEEDORES),
+        'fecha_caducidad': date.today() + timedelta(days=azar.randint(-60, 3 * 365)),
+        'costo_por_ml': costo_por_ml,
+        'tipo_producto': 'esencia',
+    }
+
+
+def _frasco(azar: random.Random, numero: int) -> dict:
+    capacidad = azar.choice(_CAPACIDADES)
+    return {
+        'id': f"F{numero:04d}",
+        'nombre': f"Frasco {capacidad} ml modelo {numero}",
+        'costo': round(capacidad * azar.uniform(0.05, 0.2) + 1, 2),
+        'capacidad_ml': capacidad,
+        'stock_actual': azar.randint(500, 5000),
+    }
+
+
+def _ventas(azar: random.Random, cantidad: int, esencias: List[dict], frascos: List[dict],
+            sin_frasco: float, ids_borrados: set) -> Iterator[tuple]:
+    """(fila de salidas, fila de historial_ventas) en orden de fecha"""
+    fin = datetime.now().replace(microsecond=0)
+    paso = timedelta(days=730) / max(cantidad, 1)
+    fecha = fin - timedelta(days=730)
+    for numero in range(1, cantidad + 1):
+        fecha += paso
+        esencia = azar.choice(esencias)
+        frasco = azar.choice(frascos) if frascos and azar.random() >= sin_frasco else None
+        cantidad_ml = frasco['capacidad_ml'] if frasco else azar.choice(_CAPACIDADES)
+        costo_esencia = esencia['costo_por_ml'] * cantidad_ml
+        costo_frasco = frasco['costo'] if frasco else 0.0
+        costo_alcohol = COSTO_ALCOHOL if frasco else 0.0
+        costo_total = costo_esencia + costo_frasco + costo_alcohol
+        precio = round(costo_total * azar.uniform(1.3, 2.5), 2)
+        id_salida = f"SAL{numero:03d}"
+        cliente = azar.choice(_CLIENTES)
+        fecha_venta = fecha.replace(microsecond=0)
+        ganancia = precio - costo_total
+
+        yield {
+            'id': id_salida,
+            'id_producto': esencia['id'],
+            'cantidad_vendida': cantidad_ml,
+            'precio_venta': precio,
+            'fecha_venta': fecha_venta,
+            'cliente': cliente,
+            'ganancia': ganancia,
+            'id_frasco': frasco['id'] if frasco else None,
+            'nombre_frasco': frasco['nombre'] if frasco else None,
+            'costo_frasco_momento': costo_frasco,
+            'costo_alcohol_momento': costo_alcohol,
+        }, {
+            'id': id_salida,
+            'id_producto': esencia['id'],
+            'nombre_producto': esencia['nombre'],
+            'genero_producto': esencia['genero'],
+            'cantidad_vendida': cantidad_ml,
+            'precio_venta': precio,
+            'fecha_venta': fecha_venta,
+            'cliente': cliente,
+            'ganancia': ganancia,
+            'costo_por_ml_momento': esencia['costo_por_ml'],
+            'proveedor_momento': esencia['proveedor'],
+            'id_frasco': frasco['id'] if frasco else None,
+            'nombre_frasco': frasco['nombre'] if frasco else None,
+            'costo_frasco_momento': costo_frasco,
+            'costo_alcohol_momento': costo_alcohol,
+            'costo_produccion': costo_total,
+            'producto_eliminado': esencia['id'] in ids_borrados,
+        }
@@ -0,0 +1,69 @@
+"""
+Exportación en streaming a CSV y JSON Lines
+
+Las filas llegan de un generador (un cursor de la base de datos leído por
+lotes) y se escriben una por una, así exportar un año de ventas usa la misma
+memoria que exportar un día. Se escribe a un archivo temporal junto al
+destino y se renombra al terminar: si algo falla no queda un archivo a medias.
+"""
+import csv
+import json
+import os
+from datetime import date, datetime
+from typing import Iterable, Sequence
+
+FORMATOS = ('csv', 'jsonl')
+EXTENSIONES = {'csv': 'csv', 'jsonl': 'jsonl'}
+
+
+def _valor(valor):
+    """Fechas en ISO; el resto tal cual"""
+    if isinstance(valor, datetime):
+        # Con microsegundos, igual que el texto que guarda SQLite: dos ventas
+        # del mismo segundo no quedan con la misma fecha
+        return valor.isoformat(sep=' ', timespec='microseconds')
+    if isinstance(valor, date):
+        return valor.isoformat()
+    return valor
+
+
+def exportar_filas(ruta: str, columnas: Sequence[str], filas: Iterable[Sequence],
+                   formato: str = 'csv') -> int:
+    """
+    Escribe las filas en ruta con el formato indicado
+
+    Args:
+        ruta: Archivo de destino (se reemplaza si existe)
+        columnas: Nombres de las columnas, en el orden de cada fila
+        filas: Tuplas de valores; se consumen de a una
+        formato: 'csv' (UTF-8 con BOM para que Excel respete los acentos) o 'jsonl'
+
+    Returns:
+        int: Cantidad de filas escritas
+    """
+    if formato not in FORMATOS:
+        raise ValueError(f"Formato de exportación no soportado: {formato}")
+
+    temporal = f"{ruta}.tmp"
+    escritas = 0
+    try:
+        if formato == 'csv':
+            with open(temporal, 'w', newline='', encoding='utf-8-sig') as archivo:
+                escritor = csv.writer(archivo)
+                escritor.writerow(columnas)
+                for fila in filas:
+                    escritor.writerow([_valor(valor) for valor in fila])
+                    escritas += 1
+        else:
+            with open(temporal, 'w', encoding='utf-8') as archivo:
+                for fila in filas:
+                    registro = {columna: _valor(valor) for columna, valor in zip(columnas, fila)}
+                    archivo.write(json.dumps(registro, ensure_ascii=False))
+                    archivo.write('\n')
+                    escritas += 1
+        os.replace(temporal, ruta)
+    except BaseException:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+        raise
+    return escritas
@@ -0,0 +1,90 @@
+"""
+Filtro con espera (debounce) para campos de búsqueda
+
+Cada cambio del campo reinicia la espera; cuando el usuario deja de escribir
+se ejecuta el filtro y solo se muestra el resultado de la última consulta.
+Los resultados de consultas que quedaron viejas mientras se calculaban se
+descartan sin pintarse.
+"""
+import threading
+from typing import Any, Callable, Optional
+
+
+class FiltroDiferido:
+    """
+    Tubería de filtrado: espera -> ejecutar(consulta) -> renderizar(resultado)
+
+    Args:
+        ejecutar: Calcula el resultado de una consulta (corre fuera del hilo del evento)
+        renderizar: Muestra el resultado; solo se llama si la consulta sigue vigente
+        espera: Segundos sin cambios antes de ejecutar
+    """
+
+    def __init__(self, ejecutar: Callable[[Any], Any], renderizar: Callable[[Any], None],
+                 espera: float = 0.3):
+        self.ejecutar = ejecutar
+        self.renderizar = renderizar
+        self.espera = espera
+        self._generacion = 0
+        self._temporizador: Optional[threading.Timer] = None
+        # Consulta aún sin pintar (pendiente o calculándose)
+        self._pendiente = False
+        self._consulta: Any = None
+        self._lock = threading.Lock()
+        self._lock_render = threading.Lock()
+
+    def solicitar(self, consulta: Any = None):
+        """Programa el filtro para la consulta; anula cualquier consulta anterior"""
+        with self._lock:
+            self._generacion += 1
+            generacion = self._generacion
+            self._pendiente = True
+            self._consulta = consulta
+            if self._temporizador is not None:
+                self._temporizador.cancel()
+            if self.espera <= 0:
+                self._temporizador = None
+            else:
+                self._temporizador = threading.Timer(self.espera, self._correr, (generacion, consulta))
+                self._temporizador.daemon = True
+                self._temporizador.start()
+
+        if self.espera <= 0:
+            self._correr(generacion, consulta)
+
+    def cancelar(self):
+        """Anula la consulta pendiente o en curso (su resultado no se mostrará)"""
+        with self._lock:
+            self._generacion += 1
+            self._pendiente = False
+            if self._temporizador is not None:
+                self._temporizador.cancel()
+                self._temporizador = None
+
+    def reprogramar(self):
+        """Vuelve a programar la consulta pendiente (p. ej. si cambiaron los datos que filtra)"""
+        with self._lock:
+            if not self._pendiente:
+                return
+            consulta = self._consulta
+        self.solicitar(consulta)
+
+    def vigente(self, generacion: int) -> bool:
+        return generacion == self._generacion
+
+    def _correr(self, generacion: int, consulta: Any):
+        if not self.vigente(generacion):
+            return
+        try:
+            resultado = self.ejecutar(consulta)
+        except Exception as e:
+            print(f"Error al filtrar: {e}")
+            return
+
+        # Se revisa de nuevo al pintar: otra consulta pudo llegar mientras se calculaba
+        with self._lock_render:
+            if self.vigente(generacion):
+                self.renderizar(resultado)
+                with self._lock:
+                    if self.vigente(generacion):
+                        self._pendiente = False
@@ -1,11 +1,19 @@
 """
 Base de datos separada para el historial de ventas
 Esto permite eliminar productos sin restricciones de integridad referencial
+
+Cada venta se escribe aquí en el momento de registrarla (ver SalidaService),
+así el historial se lee de una sola tabla sin consultar productos.
 """
-from sqlalchemy import create_engine, Column, Integer, String, Date, Float, DateTime
+import os
+import logging
+from sqlalchemy import Column, Integer, String, Date, Float, DateTime, Boolean, Index, inspect, text, update
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
 from datetime import datetime
+from utils.database import crear_esquema_una_vez, get_database_path, get_engine, get_session_factory, set_sqlite_profile
+from utils.arranque import medir
+
+logger = logging.getLogger(__name__)
 
 Base = declarative_base()
 
@@ -21,21 +29,104 @@ class HistorialVenta(Base):
     fecha_venta = Column(DateTime, nullable=False, default=datetime.now)
     cliente = Column(String, nullable=True)
     ganancia = Column(Float, nullable=False, default=0.0)
-    
+
     # Información del producto al momento de la venta (snapshot)
     costo_por_ml_momento = Column(Float, nullable=False)  # Costo por ml al momento de la venta
     proveedor_momento = Column(String, nullable=False)   # Proveedor al momento de la venta
 
-DATABASE_URL_HISTORIAL = 'sqlite:///historial_ventas.db'
+    # Frasco vendido y costos al momento de la venta
+    id_frasco = Column(String, nullable=True)  # NULL en ventas sin frasco
+    nombre_frasco = Column(String, nullable=True)
+    costo_frasco_momento = Column(Float, nullable=False, default=0.0)
+    costo_alcohol_momento = Column(Float, nullable=False, default=0.0)
+    costo_produccion = Column(Float, nullable=False, default=0.0)  # Esencia + frasco + alcohol
+
+    # Se marca al eliminar el producto del inventario
+    producto_eliminado = Column(Boolean, nullable=False, default=False)
+
+    __table_args__ = (
+        Index('ix_historial_ventas_fecha_id', 'fecha_venta', 'id'),
+        Index('ix_historial_ventas_id_producto', 'id_producto'),
+    )
+
+def get_historial_url():
+    """Junto a inventario.db para que no dependa del directorio de trabajo"""
+    return f"sqlite:///{os.path.join(os.path.dirname(get_database_path()), 'historial_ventas.db')}"
+
+def __getattr__(nombre):
+    # Igual que DATABASE_URL en utils.database: se resuelve al pedirlo
+    if nombre == 'DATABASE_URL_HISTORIAL':
+        return get_historial_url()
+    raise AttributeError(f"module {__name__!r} has no attribute {nombre!r}")
+
+def set_historial_sqlite_profile(perfil):
+    """Selecciona el perfil de SQLite (durable, fast, bulk-import) del historial"""
+    set_sqlite_profile(perfil, get_historial_url())
 
 def get_historial_engine():
-    return create_engine(DATABASE_URL_HISTORIAL)
+    return get_engine(get_historial_url())
 
 def create_historial_tables():
-    engine = get_historial_engine()
-    Base.metadata.create_all(engine)
+    crear_esquema_una_vez(get_historial_url(), _crear_tablas_historial)
+
+def _crear_tablas_historial():
+    with medir('esquema de historial_ventas.db'):
+        engine = get_historial_engine()
+        Base.metadata.create_all(engine)
+        _agregar_columnas_faltantes(engine)
+
+def _agregar_columnas_faltantes(engine):
+    """Agrega a una tabla historial_ventas antigua las columnas nuevas del modelo"""
+    tabla = HistorialVenta.__table__
+    existentes = {columna['name'] for columna in inspect(engine).get_columns(tabla.name)}
+    faltantes = [columna for columna in tabla.columns if columna.name not in existentes]
+    if not faltantes:
+        return
+
+    with engine.begin() as connection:
+        for columna in faltantes:
+            tipo = columna.type.compile(engine.dialect)
+            if columna.default is None:
+                connection.execute(text(f"ALTER TABLE {tabla.name} ADD COLUMN {columna.name} {tipo}"))
+            else:
+                # SQLite exige un DEFAULT para agregar una columna NOT NULL
+                defecto = int(columna.default.arg) if isinstance(columna.default.arg, bool) else columna.default.arg
+                connection.execute(text(
+                    f"ALTER TABLE {tabla.name} ADD COLUMN {columna.name} {tipo} NOT NULL DEFAULT {defecto}"
+                ))
+            logger.debug("Columna %s agregada a %s", columna.name, tabla.name)
+    for indice in tabla.indexes:
+        indice.create(engine, checkfirst=True)
 
 def get_historial_session():
-    engine = get_historial_engine()
-    Session = sessionmaker(bind=engine)
+    Session = get_session_factory(get_historial_url())
     return Session()
+
+def marcar_producto_en_historial(id_producto: str, eliminado: bool):
+    """
+    Actualiza la marca producto_eliminado de las ventas de un producto
+
+    Lo llama ProductoService al eliminar o volver a agregar un producto.
+    """
+    marcar_productos_en_historial([id_producto], eliminado)
+
+def marcar_productos_en_historial(ids_producto, eliminado: bool):
+    """Versión por lotes de marcar_producto_en_historial (importación masiva)"""
+    ids_producto = list(ids_producto)
+    if not ids_producto:
+        return
+    session = get_historial_session()
+    try:
+        # De a 500 IDs para no pasar el límite de parámetros de SQLite
+        for inicio in range(0, len(ids_producto), 500):
+            session.execute(
+                update(HistorialVenta)
+                .where(HistorialVenta.id_producto.in_(ids_producto[inicio:inicio + 500]))
+                .values(producto_eliminado=eliminado)
+            )
+        session.commit()
+    except Exception as e:
+        session.rollback()
+        print(f"Error al actualizar el historial de {len(ids_producto)} producto(s): {e}")
+    finally:
+        session.close()
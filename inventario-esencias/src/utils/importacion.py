@@ -0,0 +1,66 @@
+"""
+Lectura de archivos para la importación masiva del catálogo
+
+Acepta CSV (coma o punto y coma, con o sin BOM), JSON (una lista de objetos
+o {"productos": [...]} / {"frascos": [...]}) y JSON Lines. Cada fila se
+entrega con su número en el archivo para el reporte de errores.
+"""
+import csv
+import json
+import os
+from typing import Iterator, Optional, Tuple
+
+FORMATOS_IMPORTACION = ('.csv', '.json', '.jsonl')
+
+
+def leer_archivo(ruta: str) -> Iterator[Tuple[int, Optional[dict], Optional[str]]]:
+    """
+    Recorre las filas de un archivo de importación
+
+    Yields:
+        (numero, fila, error): numero es la línea del CSV/JSON Lines o la
+        posición (desde 1) en la lista JSON; las llaves de la fila van en
+        minúsculas. Si la fila no se pudo leer, fila es None y error explica por qué.
+    """
+    extension = os.path.splitext(ruta)[1].lower()
+    if extension not in FORMATOS_IMPORTACION:
+        raise ValueError(f"Formato no soportado: {extension or ruta}. Use CSV, JSON o JSON Lines")
+
+    if extension == '.csv':
+        yield from _leer_csv(ruta)
+    elif extension == '.jsonl':
+        with open(ruta, encoding='utf-8-sig') as archivo:
+            for numero, linea in enumerate(archivo, start=1):
+                if not linea.strip():
+                    continue
+                try:
+                    fila = json.loads(linea)
+                except json.JSONDecodeError as e:
+                    yield numero, None, f"JSON inválido: {e.msg}"
+                    continue
+                yield (numero, *_normalizar_llaves(fila))
+    else:
+        with open(ruta, encoding='utf-8-sig') as archivo:
+            datos = json.load(archivo)
+        if isinstance(datos, dict):
+            datos = datos.get('productos') or datos.get('frascos') or []
+        for numero, fila in enumerate(datos, start=1):
+            yield (numero, *_normalizar_llaves(fila))
+
+
+def _leer_csv(ruta: str) -> Iterator[Tuple[int, Optional[dict], Optional[str]]]:
+    with open(ruta, newline='', encoding='utf-8-sig') as archivo:
+        muestra = archivo.read(4096)
+        archivo.seek(0)
+        # Las hojas de cálculo en español suelen exportar con punto y coma
+        delimitador = ';' if muestra.count(';') > muestra.count(',') else ','
+        lector = csv.DictReader(archivo, delimiter=delimitador)
+        for fila in lector:
+            # La línea 1 es el encabezado
+            yield (lector.line_num, *_normalizar_llaves(fila))
+
+
+def _normalizar_llaves(fila) -> Tuple[Optional[dict], Optional[str]]:
+    if not isinstance(fila, dict):
+        return None, "La fila debe ser un objeto con columnas"
+    return {str(llave).strip().lower(): valor for llave, valor in fila.items() if llave is not None}, None
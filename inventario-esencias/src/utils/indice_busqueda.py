@@ -0,0 +1,186 @@
+"""
+Índice en memoria para filtrar productos en la ventana principal
+
+Se construye una sola vez cada vez que llega la lista de productos; cada
+filtro es una intersección de conjuntos de posiciones en lugar de recorrer
+todos los productos en Python.
+"""
+import unicodedata
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional, Set
+
+# Separa los campos de la llave para que una búsqueda no coincida "entre" campos
+_SEPARADOR = "\x00"
+
+
+def normalizar(texto) -> str:
+    """Pasa a minúsculas y quita acentos: 'Jazmín Ñandú' -> 'jazmin nandu'"""
+    texto = str(texto)
+    if texto.isascii():
+        return texto.lower()
+    return _normalizar_unicode(texto)
+
+
+@lru_cache(maxsize=4096)
+def _normalizar_unicode(texto: str) -> str:
+    descompuesto = unicodedata.normalize('NFKD', texto)
+    return ''.join(c for c in descompuesto if not unicodedata.combining(c)).casefold()
+
+
+class IndiceProductos:
+    """
+    Índice de búsqueda sobre la lista de productos (esencias y frascos)
+
+    Guarda por posición la llave normalizada (nombre, proveedor e ID), los
+    conjuntos precalculados de tipo, género y stock bajo y un mapa de
+    subcadenas ya buscadas -> posiciones que las contienen.
+
+    Si "jaz" está en el mapa, "jazmin" solo se busca entre las posiciones de
+    "jaz": al escribir, cada tecla revisa únicamente lo que coincidió con la
+    anterior en lugar de todo el catálogo.
+
+    Las posiciones son estables: agregar usa una posición nueva al final y
+    quitar deja la posición vacía (None), así un cambio no reindexa el resto.
+    """
+
+    # Subcadenas que se recuerdan en el mapa (se descartan las más antiguas)
+    MAX_SUBCADENAS = 256
+
+    def __init__(self, productos: List[dict], necesita_reabastecimiento: Callable[[dict], bool]):
+        self.productos: List[Optional[dict]] = list(productos)
+        self.necesita_reabastecimiento = necesita_reabastecimiento
+        self.llaves: List[str] = [''] * len(self.productos)
+        self.subcadenas: Dict[str, Set[int]] = {}
+        self.todos: Set[int] = set()
+        self.esencias: Set[int] = set()
+        self.frascos: Set[int] = set()
+        self.stock_bajo: Set[int] = set()
+        self.por_genero: Dict[str, Set[int]] = {}
+
+        for i, producto in enumerate(self.productos):
+            self._indexar(i, producto)
+
+    def agregar(self, producto: dict) -> int:
+        """Agrega un producto al final y devuelve su posición"""
+        i = len(self.productos)
+        self.productos.append(producto)
+        self.llaves.append('')
+        self._indexar(i, producto)
+        return i
+
+    def actualizar(self, i: int, producto: dict):
+        """Reemplaza el producto de una posición"""
+        self._desindexar(i)
+        self.productos[i] = producto
+        self._indexar(i, producto)
+
+    def quitar(self, i: int):
+        """Deja vacía la posición de un producto eliminado"""
+        self._desindexar(i)
+        self.productos[i] = None
+
+    def coincide(self, i: int, texto: str = "", tipo: str = None, genero: str = "Todos",
+                 solo_stock_bajo: bool = False) -> bool:
+        """Igual que filtrar, pero para una sola posición"""
+        if i not in self.todos:
+            return False
+        if tipo == "frasco" and i not in self.frascos:
+            return False
+        if tipo == "esencia" and i not in self.esencias:
+            return False
+        if genero and genero != "Todos" and i not in self.frascos and i not in self.por_genero.get(genero, ()):
+            return False
+        if solo_stock_bajo and i not in self.stock_bajo:
+            return False
+        return not texto or normalizar(texto) in self.llaves[i]
+
+    def _indexar(self, i: int, producto: dict):
+        llave = _SEPARADOR.join((
+            normalizar(producto['nombre']),
+            normalizar(producto.get('proveedor', '')),
+            normalizar(producto['id_producto'])
+        ))
+        self.llaves[i] = llave
+        self.todos.add(i)
+
+        if 'capacidad_ml' in producto:
+            self.frascos.add(i)
+        else:
+            self.esencias.add(i)
+            self.por_genero.setdefault(producto.get('genero', 'Unisex'), set()).add(i)
+
+        if self.necesita_reabastecimiento(producto):
+            self.stock_bajo.add(i)
+
+        # Mantener al día las búsquedas ya guardadas
+        for subcadena, posiciones in self.subcadenas.items():
+            if subcadena in llave:
+                posiciones.add(i)
+
+    def _desindexar(self, i: int):
+        for conjunto in (self.todos, self.esencias, self.frascos, self.stock_bajo,
+                         *self.por_genero.values(), *self.subcadenas.values()):
+            conjunto.discard(i)
+        self.llaves[i] = ''
+
+    def filtrar(self, texto: str = "", tipo: str = None, genero: str = "Todos",
+                solo_stock_bajo: bool = False) -> List[dict]:
+        """Devuelve los productos que cumplen todos los filtros, en su orden original"""
+        return [self.productos[i] for i in self.filtrar_posiciones(texto, tipo, genero, solo_stock_bajo)]
+
+    def filtrar_posiciones(self, texto: str = "", tipo: str = None, genero: str = "Todos",
+                           solo_stock_bajo: bool = False) -> List[int]:
+        """
+        Devuelve, ordenadas, las posiciones de los productos que cumplen todos los filtros
+
+        Args:
+            texto: Subcadena a buscar en nombre, proveedor o ID (sin distinguir acentos)
+            tipo: "esencia", "frasco" o cualquier otro valor para ambos
+            genero: Género de las esencias o "Todos"; los frascos siempre pasan
+            solo_stock_bajo: Solo productos que necesitan reabastecimiento
+        """
+        # Se empieza por el conjunto más selectivo de los filtros sin texto
+        if tipo == "frasco":
+            resultado = self.frascos
+        elif tipo == "esencia":
+            resultado = self.esencias
+        else:
+            resultado = self.todos
+
+        if genero and genero != "Todos":
+            resultado = resultado & (self.por_genero.get(genero, set()) | self.frascos)
+        if solo_stock_bajo:
+            resultado = resultado & self.stock_bajo
+
+        consulta = normalizar(texto) if texto else ""
+        if consulta:
+            resultado = self._buscar_texto(consulta, resultado)
+
+        return sorted(resultado)
+
+    def _buscar_texto(self, consulta: str, candidatos: Set[int]) -> Set[int]:
+        """Filtra los candidatos cuya llave contiene la consulta"""
+        return candidatos & self._posiciones_subcadena(consulta)
+
+    def _posiciones_subcadena(self, consulta: str) -> Set[int]:
+        """Posiciones cuya llave contiene la consulta (se calcula una vez por consulta)"""
+        posiciones = self.subcadenas.get(consulta)
+        if posiciones is not None:
+            return posiciones
+
+        # Partir del conjunto más chico de una subcadena de la consulta ya buscada
+        base = None
+        for subcadena, encontradas in self.subcadenas.items():
+            if subcadena in consulta and (base is None or len(encontradas) < len(base)):
+                base = encontradas
+
+        llaves = self.llaves
+        if base is None:
+            posiciones = {i for i, llave in enumerate(llaves) if consulta in llave}
+        else:
+            posiciones = {i for i in base if consulta in llaves[i]}
+
+        if len(self.subcadenas) >= self.MAX_SUBCADENAS:
+            del self.subcadenas[next(iter(self.subcadenas))]
+        self.subcadenas[consulta] = posiciones
+        return posiciones
@@ -0,0 +1,301 @@
+"""
+Instrumentación opcional de las consultas SQL
+
+Desactivada por defecto: se activa con la variable de entorno
+INVENTARIO_PERFIL_SQL=1 (main.py) o llamando a activar_instrumentacion().
+Mientras está activa, cada sentencia que pasa por un engine de SQLAlchemy
+(inventario.db e historial_ventas.db) se registra con:
+
+- su huella: el SQL con los literales y las listas IN (?, ?, ...) colapsadas,
+  así la misma consulta con otros valores cuenta como una sola;
+- el método que la originó (el primer marco de services/ o views/ en la pila,
+  por ejemplo SalidaService.obtener_historial_ventas);
+- cantidad de ejecuciones, tiempo total y percentiles 50/95/99;
+- filas devueltas (leídas del cursor) o afectadas (INSERT/UPDATE/DELETE);
+- máximo de ejecuciones dentro de una misma llamada al método: un valor alto
+  en una consulta por ID es la marca de un N+1.
+
+Para contar las filas leídas, las conexiones nuevas usan un cursor de sqlite3
+que suma lo que se va obteniendo; por eso activar o desactivar libera los
+engines (igual que configure_pool).
+"""
+import math
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from utils.database import POOL_SETTINGS, dispose_engines
+
+# Duraciones que se guardan por consulta para los percentiles
+MUESTRAS_POR_CONSULTA = 2000
+
+_DIRECTORIO_APP = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_CAPAS = (os.path.join(_DIRECTORIO_APP, 'services', ''), os.path.join(_DIRECTORIO_APP, 'views', ''))
+
+_activa = False
+_lock = threading.Lock()
+_estadisticas: Dict[Tuple[str, str], "_Estadistica"] = {}
+_hilo = threading.local()
+
+
+class _Estadistica:
+    __slots__ = ('huella', 'llamador', 'llamadas', 'tiempo_total', 'duraciones', 'filas', 'max_por_llamada')
+
+    def __init__(self, huella, llamador):
+        self.huella = huella
+        self.llamador = llamador
+        self.llamadas = 0
+        self.tiempo_total = 0.0
+        self.duraciones = deque(maxlen=MUESTRAS_POR_CONSULTA)
+        self.filas = 0
+        self.max_por_llamada = 0
+
+
+class _CursorContado(sqlite3.Cursor):
+    """Cursor que suma las filas obtenidas a la estadística de su última sentencia"""
+
+    _estadistica = None
+
+    def _sumar(self, cantidad):
+        estadistica = self._estadistica
+        if estadistica is not None and cantidad:
+            with _lock:
+                estadistica.filas += cantidad
+
+    def fetchone(self):
+        fila = super().fetchone()
+        if fila is not None:
+            self._sumar(1)
+        return fila
+
+    def fetchmany(self, *args, **kwargs):
+        filas = super().fetchmany(*args, **kwargs)
+        self._sumar(len(filas))
+        return filas
+
+    def fetchall(self):
+        filas = super().fetchall()
+        self._sumar(len(filas))
+        return filas
+
+    def __next__(self):
+        fila = super().__next__()
+        self._sumar(1)
+        return fila
+
+
+class _ConexionContada(sqlite3.Connection):
+    def cursor(self, factory=_CursorContado):
+        return super().cursor(factory)
+
+
+# --- Activación ---
+
+def instrumentacion_activa() -> bool:
+    return _activa
+
+
+def activar_instrumentacion():
+    """Empieza a registrar las consultas de todos los engines"""
+    global _activa
+    if _activa:
+        return
+    event.listen(Engine, 'before_cursor_execute', _antes_de_ejecutar)
+    event.listen(Engine, 'after_cursor_execute', _despues_de_ejecutar)
+    POOL_SETTINGS['connect_args'] = {'factory': _ConexionContada}
+    dispose_engines()
+    _activa = True
+
+
+def desactivar_instrumentacion():
+    """Deja de registrar (las estadísticas tomadas se conservan)"""
+    global _activa
+    if not _activa:
+        return
+    event.remove(Engine, 'before_cursor_execute', _antes_de_ejecutar)
+    event.remove(Engine, 'after_cursor_execute', _despues_de_ejecutar)
+    POOL_SETTINGS.pop('connect_args', None)
+    dispose_engines()
+    _activa = False
+
+
+def reiniciar_estadisticas():
+    with _lock:
+        _estadisticas.clear()
+
+
+# --- Eventos de SQLAlchemy ---
+
+def _antes_de_ejecutar(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._inicio_instrumentacion = time.perf_counter()
+
+
+def _despues_de_ejecutar(conn, cursor, statement, parameters, context, executemany):
+    inicio = getattr(context, '_inicio_instrumentacion', None)
+    if inicio is None:
+        return
+    duracion = time.perf_counter() - inicio
+    marco, llamador = _buscar_llamador(sys._getframe(1))
+    huella = huella_sql(statement)
+    clave = (huella, llamador)
+
+    # Ejecuciones de esta consulta dentro de la llamada actual al método. Se
+    # guarda el marco (no su id) para que otra llamada no pueda reusar el id.
+    if marco is None:
+        por_llamada = 1
+    else:
+        if getattr(_hilo, 'marco', None) is not marco:
+            _hilo.marco = marco
+            _hilo.conteos = {}
+        por_llamada = _hilo.conteos.get(clave, 0) + 1
+        _hilo.conteos[clave] = por_llamada
+
+    with _lock:
+        estadistica = _estadisticas.get(clave)
+        if estadistica is None:
+            estadistica = _estadisticas[clave] = _Estadistica(huella, llamador)
+        estadistica.llamadas += 1
+        estadistica.tiempo_total += duracion
+        estadistica.duraciones.append(duracion)
+        if por_llamada > estadistica.max_por_llamada:
+            estadistica.max_por_llamada = por_llamada
+        if cursor.description is None and cursor.rowcount > 0:
+            # INSERT/UPDATE/DELETE: filas afectadas
+            estadistica.filas += cursor.rowcount
+
+    if cursor.description is not None and isinstance(cursor, _CursorContado):
+        # SELECT: las filas se suman a medida que se leen
+        cursor._estadistica = estadistica
+
+
+def _buscar_llamador(marco):
+    """Primer marco de services/ o views/ en la pila (o el primero de la app)"""
+    primero_app = None
+    while marco is not None:
+        archivo = marco.f_code.co_filename
+        if archivo.startswith(_CAPAS):
+            return marco, _nombre_marco(marco)
+        if primero_app is None and archivo.startswith(_DIRECTORIO_APP) and not archivo.endswith('instrumentacion.py'):
+            primero_app = marco
+        marco = marco.f_back
+    if primero_app is not None:
+        return primero_app, _nombre_marco(primero_app)
+    return None, '?'
+
+
+def _nombre_marco(marco) -> str:
+    codigo = marco.f_code
+    return getattr(codigo, 'co_qualname', codigo.co_name)
+
+
+_LITERALES = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_LISTAS = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_ESPACIOS = re.compile(r"\s+")
+
+
+def huella_sql(sentencia: str) -> str:
+    """SQL normalizado: espacios simples, literales como ? y listas IN como (?, ...)"""
+    huella = _ESPACIOS.sub(' ', sentencia).strip()
+    huella = _LITERALES.sub('?', huella)
+    return _LISTAS.sub('(?, ...)', huella)
+
+
+# --- Consulta de resultados ---
+
+def _percentil(ordenadas: List[float], p: float) -> float:
+    if not ordenadas:
+        return 0.0
+    # Rango más cercano
+    indice = max(0, math.ceil(p / 100 * len(ordenadas)) - 1)
+    return ordenadas[indice]
+
+
+def estadisticas_consultas(agrupar: str = 'huella', limite: Optional[int] = None) -> List[dict]:
+    """
+    Estadísticas registradas, ordenadas por tiempo total (mayor primero)
+
+    Args:
+        agrupar: 'huella' (una fila por consulta y método), 'llamador'
+            (una por método) o 'consulta' (una por SQL, sumando los métodos)
+        limite: Máximo de filas a devolver
+
+    Returns:
+        List[dict]: huella, llamador, llamadas, tiempo_total_ms, promedio_ms,
+        p50_ms, p95_ms, p99_ms, filas, max_por_llamada
+    """
+    if agrupar not in ('huella', 'llamador', 'consulta'):
+        raise ValueError(f"Agrupación no válida: {agrupar}. Use 'huella', 'llamador' o 'consulta'")
+
+    grupos: Dict[tuple, dict] = {}
+    with _lock:
+        for estadistica in _estadisticas.values():
+            if agrupar == 'huella':
+                clave = (estadistica.huella, estadistica.llamador)
+            elif agrupar == 'llamador':
+                clave = (None, estadistica.llamador)
+            else:
+                clave = (estadistica.huella, None)
+            grupo = grupos.setdefault(clave, {
+                'huella': clave[0], 'llamador': clave[1], 'llamadas': 0, 'tiempo_total': 0.0,
+                'duraciones': [], 'filas': 0, 'max_por_llamada': 0,
+            })
+            grupo['llamadas'] += estadistica.llamadas
+            grupo['tiempo_total'] += estadistica.tiempo_total
+            grupo['duraciones'].extend(estadistica.duraciones)
+            grupo['filas'] += estadistica.filas
+            grupo['max_por_llamada'] = max(grupo['max_por_llamada'], estadistica.max_por_llamada)
+
+    resultado = []
+    for grupo in grupos.values():
+        duraciones = sorted(grupo.pop('duraciones'))
+        tiempo_total = grupo.pop('tiempo_total')
+        grupo.update({
+            'tiempo_total_ms': round(tiempo_total * 1000, 3),
+            'promedio_ms': round(tiempo_total * 1000 / grupo['llamadas'], 3),
+            'p50_ms': round(_percentil(duraciones, 50) * 1000, 3),
+            'p95_ms': round(_percentil(duraciones, 95) * 1000, 3),
+            'p99_ms': round(_percentil(duraciones, 99) * 1000, 3),
+        })
+        resultado.append(grupo)
+    resultado.sort(key=lambda grupo: grupo['tiempo_total_ms'], reverse=True)
+    return resultado[:limite] if limite else resultado
+
+
+def sospechas_n_mas_1(umbral: int = 10) -> List[dict]:
+    """Consultas que un mismo método ejecutó umbral o más veces en una sola llamada"""
+    return [estadistica for estadistica in estadisticas_consultas()
+            if estadistica['max_por_llamada'] >= umbral]
+
+
+def resumen_consultas() -> dict:
+    """Totales: consultas ejecutadas, distintas y tiempo total en ms"""
+    with _lock:
+        llamadas = sum(estadistica.llamadas for estadistica in _estadisticas.values())
+        tiempo = sum(estadistica.tiempo_total for estadistica in _estadisticas.values())
+        distintas = len({estadistica.huella for estadistica in _estadisticas.values()})
+    return {'activa': _activa, 'llamadas': llamadas, 'distintas': distintas,
+            'tiempo_total_ms': round(tiempo * 1000, 3)}
+
+
+def reporte_consultas(limite: int = 15) -> str:
+    """Resumen en texto de las consultas más costosas (para la consola o el log)"""
+    resumen = resumen_consultas()
+    lineas = [f"Consultas SQL: {resumen['llamadas']} ejecuciones, {resumen['distintas']} distintas, "
+              f"{resumen['tiempo_total_ms']:.1f} ms"]
+    for estadistica in estadisticas_consultas(limite=limite):
+        lineas.append(
+            f"  {estadistica['tiempo_total_ms']:9.1f} ms  x{estadistica['llamadas']:<6} "
+            f"p95 {estadistica['p95_ms']:7.2f} ms  filas {estadistica['filas']:<7} "
+            f"máx/llamada {estadistica['max_por_llamada']:<4} {estadistica['llamador']}"
+        )
+        lineas.append(f"      {estadistica['huella'][:140]}")
+    return "\n".join(lineas)
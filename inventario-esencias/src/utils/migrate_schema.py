@@ -0,0 +1,165 @@
+"""
+Migraciones versionadas del esquema de inventario.db
+
+La versión aplicada se guarda en PRAGMA user_version. Cada paso es
+idempotente, así que volver a ejecutarlo sobre una base ya migrada no
+tiene efecto.
+"""
+import logging
+from sqlalchemy import text
+from utils.database import Producto, Salida, Secuencia
+
+logger = logging.getLogger(__name__)
+
+def _crear_indices(connection, nombres):
+    """Crea los índices declarados en los modelos con los nombres indicados"""
+    for tabla in (Salida.__table__, Producto.__table__):
+        for indice in tabla.indexes:
+            if indice.name in nombres:
+                indice.create(connection, checkfirst=True)
+
+def _crear_indices_secundarios(connection):
+    """Crea los índices secundarios de salidas y productos"""
+    _crear_indices(connection, {
+        'ix_salidas_producto_fecha',
+        'ix_salidas_fecha_venta',
+        'ix_productos_genero',
+        'ix_productos_proveedor',
+    })
+
+def _inicializar_secuencia_salidas(connection):
+    """Inicializa el contador de salidas con el mayor número SAL existente"""
+    existe = connection.execute(
+        text("SELECT 1 FROM secuencias WHERE nombre = 'salidas'")
+    ).first()
+    if existe:
+        return
+    ultimo = connection.execute(text(
+        "SELECT MAX(CAST(SUBSTR(id, 4) AS INTEGER)) FROM salidas WHERE id LIKE 'SAL%'"
+    )).scalar() or 0
+    connection.execute(
+        Secuencia.__table__.insert().values(nombre='salidas', valor=ultimo)
+    )
+
+def _agregar_frasco_a_salidas(connection):
+    """
+    Agrega id_frasco, costo_frasco_momento y costo_alcohol_momento a salidas
+    
+    Las ventas antiguas guardaban el frasco dentro de cliente
+    ("cliente | Frasco: nombre (30ml)"). Se interpretan una sola vez: el
+    frasco se busca por nombre y el cliente queda limpio. Las filas cuyo
+    frasco ya no existe las completa _guardar_nombre_frasco.
+    """
+    columnas = {fila[1] for fila in connection.execute(text("PRAGMA table_info(salidas)"))}
+    for columna, tipo in (('id_frasco', 'VARCHAR'),
+                          ('costo_frasco_momento', 'FLOAT'),
+                          ('costo_alcohol_momento', 'FLOAT')):
+        if columna not in columnas:
+            connection.execute(text(f"ALTER TABLE salidas ADD COLUMN {columna} {tipo}"))
+    
+    _crear_indices(connection, {'ix_salidas_id_frasco'})
+    
+    # Frascos por nombre (se conserva el primero si hay repetidos)
+    frascos = {}
+    for id_frasco, nombre, costo in connection.execute(text("SELECT id, nombre, costo FROM frascos ORDER BY rowid")):
+        frascos.setdefault(nombre, (id_frasco, costo))
+    
+    pendientes = connection.execute(text(
+        "SELECT id, cliente FROM salidas "
+        "WHERE cliente LIKE '% | Frasco: %' AND costo_frasco_momento IS NULL"
+    )).fetchall()
+    
+    resueltas = []
+    for id_salida, cliente in pendientes:
+        cliente_real, frasco_nombre = _separar_frasco(cliente)
+        frasco = frascos.get(frasco_nombre)
+        if frasco:
+            resueltas.append({
+                'id': id_salida,
+                'cliente': cliente_real,
+                'id_frasco': frasco[0],
+                'costo_frasco': frasco[1],
+            })
+    
+    if resueltas:
+        connection.execute(text(
+            "UPDATE salidas SET cliente = :cliente, id_frasco = :id_frasco, "
+            "costo_frasco_momento = :costo_frasco, costo_alcohol_momento = 2.50 "
+            "WHERE id = :id"
+        ), resueltas)
+
+def _separar_frasco(cliente):
+    """("cliente | Frasco: nombre (30ml)") -> (cliente, nombre)"""
+    cliente_real, frasco_info = cliente.split(" | Frasco: ", 1)
+    frasco_nombre = frasco_info.split("(")[0].strip() if "(" in frasco_info else frasco_info
+    return cliente_real, frasco_nombre
+
+def _guardar_nombre_frasco(connection):
+    """
+    Agrega nombre_frasco a salidas y lo llena en las ventas con frasco
+    
+    Con el nombre guardado, el historial sigue mostrando el frasco aunque
+    después se elimine. Las ventas antiguas cuyo frasco ya no existía al
+    migrar conservan el nombre leído de cliente y el cliente queda limpio;
+    sus costos quedan en NULL porque no se conoce el costo del frasco.
+    """
+    columnas = {fila[1] for fila in connection.execute(text("PRAGMA table_info(salidas)"))}
+    if 'nombre_frasco' not in columnas:
+        connection.execute(text("ALTER TABLE salidas ADD COLUMN nombre_frasco VARCHAR"))
+    
+    connection.execute(text(
+        "UPDATE salidas SET nombre_frasco = "
+        "(SELECT nombre FROM frascos WHERE frascos.id = salidas.id_frasco) "
+        "WHERE id_frasco IS NOT NULL AND nombre_frasco IS NULL"
+    ))
+    
+    pendientes = connection.execute(text(
+        "SELECT id, cliente FROM salidas WHERE cliente LIKE '% | Frasco: %' AND id_frasco IS NULL"
+    )).fetchall()
+    filas = []
+    for id_salida, cliente in pendientes:
+        cliente_real, frasco_nombre = _separar_frasco(cliente)
+        filas.append({'id': id_salida, 'cliente': cliente_real, 'nombre_frasco': frasco_nombre})
+    if filas:
+        connection.execute(text(
+            "UPDATE salidas SET cliente = :cliente, nombre_frasco = :nombre_frasco, "
+            "costo_frasco_momento = NULL, costo_alcohol_momento = NULL WHERE id = :id"
+        ), filas)
+
+# Lista ordenada de (versión, descripción, función)
+MIGRACIONES = [
+    (1, "Índices secundarios en salidas y productos", _crear_indices_secundarios),
+    (2, "Contador de IDs de salidas", _inicializar_secuencia_salidas),
+    (3, "Frasco y costos del momento en salidas", _agregar_frasco_a_salidas),
+    (4, "Nombre del frasco vendido en salidas", _guardar_nombre_frasco),
+]
+
+def obtener_version(connection) -> int:
+    """Obtiene la versión del esquema aplicada en la base de datos"""
+    return connection.execute(text("PRAGMA user_version")).scalar() or 0
+
+def aplicar_migraciones(engine) -> int:
+    """
+    Aplica las migraciones pendientes en orden
+    
+    Args:
+        engine: Engine de la base de datos a migrar
+        
+    Returns:
+        int: Versión del esquema después de migrar
+    """
+    with engine.begin() as connection:
+        version_actual = obtener_version(connection)
+        for version, descripcion, migracion in MIGRACIONES:
+            if version <= version_actual:
+                continue
+            logger.info("Aplicando migración %s: %s", version, descripcion)
+            migracion(connection)
+            connection.execute(text(f"PRAGMA user_version = {version}"))
+            version_actual = version
+    return version_actual
+
+if __name__ == "__main__":
+    from utils.database import get_engine
+    version = aplicar_migraciones(get_engine())
+    print(f"🎉 Esquema actualizado a la versión {version}")
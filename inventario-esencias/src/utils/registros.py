@@ -0,0 +1,191 @@
+"""
+Registros compactos del catálogo (esencias y frascos)
+
+Los servicios leen solo las columnas que necesitan con una consulta de Core
+(sin crear entidades del ORM) y devuelven un registro con __slots__ por fila
+en lugar de un diccionario de 10 llaves. Los registros se leen igual que los
+diccionarios de antes (producto['nombre'], producto.get(...), 'clave' in
+producto, dict(producto)) y son inmutables: para cambiar un valor se usa
+reemplazar(), que devuelve un registro nuevo.
+
+Los valores derivados (valor total, stock bajo) se calculan al leerlos y la
+fecha de caducidad se guarda como el texto ISO que devuelve SQLite; solo se
+convierte a date si se pide fecha_caducidad_date.
+"""
+from collections.abc import Mapping
+from datetime import date, datetime
+from typing import Tuple
+
+from sqlalchemy import String, select, type_coerce
+
+from utils.database import UMBRAL_STOCK_BAJO_ESENCIA, UMBRAL_STOCK_BAJO_FRASCO, Frasco, Producto
+
+
+class Registro(Mapping):
+    """Base de los registros: acceso tipo diccionario sobre los slots y propiedades"""
+
+    __slots__ = ()
+
+    # Llaves visibles, en el orden de los diccionarios que reemplazan
+    _llaves: Tuple[str, ...] = ()
+    _conjunto_llaves = frozenset()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._conjunto_llaves = frozenset(cls._llaves)
+
+    def __getitem__(self, llave):
+        if llave not in self._conjunto_llaves:
+            raise KeyError(llave)
+        return getattr(self, llave)
+
+    def __contains__(self, llave):
+        return llave in self._conjunto_llaves
+
+    def __iter__(self):
+        return iter(self._llaves)
+
+    def __len__(self):
+        return len(self._llaves)
+
+    def _valores(self) -> tuple:
+        return tuple(getattr(self, campo) for campo in self.__slots__)
+
+    def reemplazar(self, **cambios) -> "Registro":
+        """Copia del registro con algunos campos cambiados"""
+        valores = {campo: getattr(self, campo) for campo in self.__slots__}
+        valores.update(cambios)
+        return type(self)(**valores)
+
+    def __eq__(self, otro):
+        if type(otro) is type(self):
+            return self._valores() == otro._valores()
+        return Mapping.__eq__(self, otro)
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"{type(self).__name__}({dict(self)!r})"
+
+
+class RegistroProducto(Registro):
+    """Esencia con las llaves de siempre de ProductoService"""
+
+    __slots__ = ('id_producto', 'nombre', 'genero', 'stock_actual', 'costo_entrada',
+                 'proveedor', 'fecha_caducidad', 'costo_por_ml')
+
+    _llaves = ('id_producto', 'nombre', 'genero', 'stock_actual', 'costo_entrada', 'proveedor',
+               'fecha_caducidad', 'costo_por_ml', 'valor_total', 'stock_bajo')
+
+    def __init__(self, id_producto, nombre, genero, stock_actual, costo_entrada,
+                 proveedor, fecha_caducidad, costo_por_ml):
+        self.id_producto = id_producto
+        self.nombre = nombre
+        self.genero = genero
+        self.stock_actual = stock_actual
+        self.costo_entrada = costo_entrada
+        self.proveedor = proveedor
+        # Texto 'YYYY-MM-DD' tal como lo guarda SQLite
+        self.fecha_caducidad = fecha_caducidad.isoformat() if isinstance(fecha_caducidad, date) else fecha_caducidad
+        self.costo_por_ml = costo_por_ml
+
+    @property
+    def valor_total(self):
+        return self.stock_actual * self.costo_por_ml
+
+    @property
+    def stock_bajo(self):
+        return self.stock_actual < UMBRAL_STOCK_BAJO_ESENCIA
+
+    @property
+    def fecha_caducidad_date(self) -> date:
+        return datetime.strptime(self.fecha_caducidad, '%Y-%m-%d').date()
+
+
+class RegistroFrasco(Registro):
+    """Frasco con las llaves de siempre de FrascoService"""
+
+    __slots__ = ('id_frasco', 'nombre', 'costo', 'capacidad_ml', 'stock_actual')
+
+    _llaves = ('id_frasco', 'nombre', 'costo', 'capacidad_ml', 'stock_actual',
+               'valor_total', 'stock_bajo', 'tipo_producto')
+
+    tipo_producto = 'frasco'
+
+    def __init__(self, id_frasco, nombre, costo, capacidad_ml, stock_actual):
+        self.id_frasco = id_frasco
+        self.nombre = nombre
+        self.costo = costo
+        self.capacidad_ml = capacidad_ml
+        self.stock_actual = stock_actual
+
+    @property
+    def valor_total(self):
+        return self.stock_actual * self.costo
+
+    @property
+    def stock_bajo(self):
+        return self.stock_actual < UMBRAL_STOCK_BAJO_FRASCO
+
+
+class ProductoFrasco(Registro):
+    """Frasco con el formato de productos de la ventana principal"""
+
+    __slots__ = ('id_producto', 'nombre', 'stock_actual', 'costo_frasco', 'capacidad_ml')
+
+    _llaves = ('id_producto', 'nombre', 'tipo_producto', 'genero', 'stock_actual', 'costo_entrada',
+               'proveedor', 'fecha_caducidad', 'costo_por_ml', 'capacidad_ml', 'costo_frasco')
+
+    # Los frascos no tienen género, proveedor específico ni caducidad
+    tipo_producto = 'frasco'
+    genero = 'N/A'
+    proveedor = 'N/A'
+    fecha_caducidad = 'N/A'
+
+    def __init__(self, id_producto, nombre, stock_actual, costo_frasco, capacidad_ml):
+        self.id_producto = id_producto
+        self.nombre = nombre
+        self.stock_actual = stock_actual
+        self.costo_frasco = costo_frasco
+        self.capacidad_ml = capacidad_ml
+
+    @property
+    def costo_entrada(self):
+        return self.costo_frasco  # Usar costo como costo_entrada
+
+    @property
+    def costo_por_ml(self):
+        if not self.capacidad_ml:
+            return 0
+        return round(self.costo_frasco / max(self.capacidad_ml, 1), 4)
+
+
+# Columnas que se leen para cada registro, en el orden de su constructor.
+# La fecha se lee como texto: así no se convierte a date en cada fila.
+COLUMNAS_PRODUCTO = (
+    Producto.id, Producto.nombre, Producto.genero, Producto.stock_actual, Producto.costo_entrada,
+    Producto.proveedor, type_coerce(Producto.fecha_caducidad, String), Producto.costo_por_ml,
+)
+COLUMNAS_FRASCO = (Frasco.id, Frasco.nombre, Frasco.costo, Frasco.capacidad_ml, Frasco.stock_actual)
+
+
+def leer_productos(session, *condiciones) -> list:
+    """Esencias que cumplen las condiciones (todas si no hay) como RegistroProducto"""
+    consulta = select(*COLUMNAS_PRODUCTO)
+    if condiciones:
+        consulta = consulta.where(*condiciones)
+    return [RegistroProducto(*fila) for fila in session.execute(consulta)]
+
+
+def leer_frascos(session, *condiciones) -> list:
+    """Frascos que cumplen las condiciones (todos si no hay) como RegistroFrasco"""
+    consulta = select(*COLUMNAS_FRASCO)
+    if condiciones:
+        consulta = consulta.where(*condiciones)
+    return [RegistroFrasco(*fila) for fila in session.execute(consulta)]
+
+
+def como_producto(frasco: RegistroFrasco) -> ProductoFrasco:
+    """Convierte un frasco de FrascoService al formato de productos de la ventana principal"""
+    return ProductoFrasco(frasco['id_frasco'], frasco['nombre'], frasco['stock_actual'],
+                          frasco['costo'], frasco['capacidad_ml'])
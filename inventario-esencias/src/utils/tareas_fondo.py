@@ -0,0 +1,136 @@
+"""
+Ejecutor de tareas en segundo plano para las vistas
+
+Las consultas a SQLite corren en un grupo de hilos para que los eventos de
+Flet no se queden esperando a la base de datos. El resultado vuelve a la
+página con page.run_thread (con el contexto de la sesión de Flet) y solo si
+la tarea no se canceló, así una vista que el usuario ya cerró no se pinta.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Set
+
+
+class TareaFondo:
+    """Una llamada enviada al ejecutor; se puede cancelar mientras no haya terminado"""
+
+    def __init__(self, grupo: Optional[str] = None):
+        self.grupo = grupo
+        self._cancelada = threading.Event()
+        self._terminada = threading.Event()
+
+    @property
+    def cancelada(self) -> bool:
+        return self._cancelada.is_set()
+
+    @property
+    def terminada(self) -> bool:
+        return self._terminada.is_set()
+
+    def cancelar(self):
+        """Descarta el resultado; si la tarea no empezó, tampoco se ejecuta"""
+        self._cancelada.set()
+
+    def esperar(self, timeout: Optional[float] = None) -> bool:
+        return self._terminada.wait(timeout)
+
+
+class EjecutorFondo:
+    """
+    Grupo de hilos compartido por la ventana principal y las secundarias
+
+    Args:
+        page: Página de Flet a la que se devuelven los resultados (opcional)
+        max_hilos: Consultas simultáneas; SQLite serializa las escrituras,
+            así que pocos hilos alcanzan
+    """
+
+    def __init__(self, page=None, max_hilos: int = 4):
+        self.page = page
+        self._pool = ThreadPoolExecutor(max_workers=max_hilos, thread_name_prefix="inventario")
+        self._grupos: Dict[str, Set[TareaFondo]] = {}
+        self._lock = threading.Lock()
+
+    def enviar(self, funcion: Callable[..., Any], *args,
+               al_terminar: Optional[Callable[[Any], None]] = None,
+               al_fallar: Optional[Callable[[Exception], None]] = None,
+               grupo: Optional[str] = None, **kwargs) -> TareaFondo:
+        """
+        Ejecuta funcion(*args, **kwargs) en segundo plano
+
+        Args:
+            al_terminar: Recibe el resultado (en un hilo de la página)
+            al_fallar: Recibe la excepción; si falta, solo se imprime
+            grupo: Nombre para cancelar juntas las tareas de una vista
+
+        Returns:
+            TareaFondo: Permite cancelar la tarea
+        """
+        tarea = TareaFondo(grupo)
+        if grupo is not None:
+            with self._lock:
+                self._grupos.setdefault(grupo, set()).add(tarea)
+        self._pool.submit(self._correr, tarea, funcion, args, kwargs, al_terminar, al_fallar)
+        return tarea
+
+    def cancelar_grupo(self, grupo: str):
+        """Cancela todas las tareas pendientes de un grupo (p. ej. al salir de una vista)"""
+        with self._lock:
+            tareas = self._grupos.pop(grupo, set())
+        for tarea in tareas:
+            tarea.cancelar()
+
+    def cerrar(self):
+        """Cancela lo pendiente y no acepta más tareas"""
+        with self._lock:
+            grupos, self._grupos = self._grupos, {}
+        for tareas in grupos.values():
+            for tarea in tareas:
+                tarea.cancelar()
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def _correr(self, tarea: TareaFondo, funcion, args, kwargs, al_terminar, al_fallar):
+        try:
+            if tarea.cancelada:
+                return
+            try:
+                resultado = funcion(*args, **kwargs)
+            except Exception as e:
+                if tarea.cancelada:
+                    return
+                if al_fallar:
+                    self._devolver(tarea, al_fallar, e)
+                else:
+                    print(f"Error en tarea de fondo: {e}")
+                return
+            if al_terminar and not tarea.cancelada:
+                self._devolver(tarea, al_terminar, resultado)
+        finally:
+            tarea._terminada.set()
+            if tarea.grupo is not None:
+                with self._lock:
+                    tareas = self._grupos.get(tarea.grupo)
+                    if tareas is not None:
+                        tareas.discard(tarea)
+                        if not tareas:
+                            del self._grupos[tarea.grupo]
+
+    def _devolver(self, tarea: TareaFondo, callback, valor):
+        """Entrega el resultado a la página; se vuelve a revisar la cancelación al llegar"""
+        def entregar():
+            if tarea.cancelada:
+                return
+            try:
+                callback(valor)
+            except Exception as e:
+                print(f"Error al mostrar el resultado de una tarea: {e}")
+
+        run_thread = getattr(self.page, 'run_thread', None) if self.page is not None else None
+        if run_thread:
+            try:
+                run_thread(entregar)
+                return
+            except Exception:
+                # La página ya se cerró o no tiene bucle de eventos
+                pass
+        entregar()
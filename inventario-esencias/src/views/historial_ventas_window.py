@@ -1,7 +1,10 @@
 import flet as ft
-from datetime import datetime
+import threading
+from datetime import datetime, timedelta
 from typing import List, Dict
 from utils.alerts import AlertManager
+from utils.filtro_diferido import FiltroDiferido
+from utils.exportacion import EXTENSIONES
 
 class DarkTheme:
     """Colores para el tema oscuro"""
@@ -41,11 +44,21 @@ class DarkTheme:
     HIGHLIGHT = ft.Colors.PURPLE_400
 
 class HistorialVentasWindow:
-    def __init__(self, page: ft.Page, salida_service, producto_service):
+    # Ventas que se piden por página al servicio
+    TAMANO_PAGINA = 50
+    
+    # Segundos sin escribir antes de buscar
+    ESPERA_BUSQUEDA = 0.3
+    
+    def __init__(self, page: ft.Page, salida_service, producto_service, ejecutor=None):
         self.page = page
         self.salida_service = salida_service
         self.producto_service = producto_service
         
+        # Las consultas corren en el EjecutorFondo; se cancelan al volver
+        self.ejecutor = ejecutor
+        self._grupo_tareas = f"historial-{id(self)}"
+        
         # Sistema de alertas
         self.alert_manager = AlertManager(page)
         
@@ -53,9 +66,24 @@ class HistorialVentasWindow:
         self.original_content = None
         
         # Datos
-        self.historial_ventas = []
+        self.historial_ventas = []  # Ventas de las páginas ya cargadas
         self.estadisticas = {}
         
+        # Paginación por llave: cursor de la página siguiente y filtro activo
+        self.cursor_pagina = None
+        self.filtro_texto = ""
+        self._lock_pagina = threading.Lock()
+        self._cargando_pagina = False
+        # Cambia al reiniciar la tabla; una página pedida antes se descarta
+        self._generacion_pagina = 0
+        
+        # La búsqueda consulta la base de datos cuando se deja de escribir
+        self._filtro_busqueda = FiltroDiferido(
+            ejecutar=lambda texto: (texto, self._pedir_pagina(None, texto)),
+            renderizar=self._mostrar_busqueda,
+            espera=self.ESPERA_BUSQUEDA
+        )
+        
         # Crear la interfaz
         self._crear_interfaz()
         self._cargar_datos()
@@ -92,6 +120,25 @@ class HistorialVentasWindow:
             bgcolor=DarkTheme.SECONDARY_BG,
         )
         
+        # Exportación: formato, rango de fechas opcional y archivo de destino
+        self.exportar_formato = ft.Dropdown(
+            label="Formato",
+            width=150,
+            value="csv",
+            options=[
+                ft.dropdown.Option("csv", "CSV"),
+                ft.dropdown.Option("jsonl", "JSON Lines"),
+            ],
+            border_color=DarkTheme.BORDER_COLOR,
+            focused_border_color=DarkTheme.ACCENT,
+            text_style=ft.TextStyle(color=DarkTheme.PRIMARY_TEXT),
+            label_style=ft.TextStyle(color=DarkTheme.SECONDARY_TEXT),
+        )
+        self.exportar_desde = self._crear_campo_fecha("Desde (AAAA-MM-DD)")
+        self.exportar_hasta = self._crear_campo_fecha("Hasta (AAAA-MM-DD)")
+        self.selector_archivo = ft.FilePicker(on_result=self._on_destino_exportacion)
+        self._exportacion_pendiente = None
+        
         # Filtros y búsqueda
         self.filtros_container = ft.Container(
             content=ft.Row([
@@ -117,7 +164,24 @@ class HistorialVentasWindow:
                         shape=ft.RoundedRectangleBorder(radius=8),
                     )
                 ),
-            ], spacing=20, alignment=ft.MainAxisAlignment.START),
+                ft.VerticalDivider(width=10, color=DarkTheme.DIVIDER_COLOR),
+                self.exportar_formato,
+                self.exportar_desde,
+                self.exportar_hasta,
+                ft.ElevatedButton(
+                    content=ft.Row([
+                        ft.Icon(ft.Icons.DOWNLOAD, size=20),
+                        ft.Text("Exportar")
+                    ], spacing=8),
+                    on_click=self._exportar,
+                    style=ft.ButtonStyle(
+                        bgcolor=DarkTheme.BUTTON_SUCCESS,
+                        color=DarkTheme.PRIMARY_TEXT,
+                        elevation=4,
+                        shape=ft.RoundedRectangleBorder(radius=8),
+                    )
+                ),
+            ], spacing=20, alignment=ft.MainAxisAlignment.START, wrap=True),
             padding=ft.Padding(30, 20, 30, 10),
             bgcolor=DarkTheme.CARD_BG,
             border_radius=10,
@@ -144,6 +208,16 @@ class HistorialVentasWindow:
             expand=True
         )
     
+    def _crear_campo_fecha(self, etiqueta: str) -> ft.TextField:
+        return ft.TextField(
+            label=etiqueta,
+            width=180,
+            border_color=DarkTheme.BORDER_COLOR,
+            focused_border_color=DarkTheme.ACCENT,
+            text_style=ft.TextStyle(color=DarkTheme.PRIMARY_TEXT),
+            label_style=ft.TextStyle(color=DarkTheme.SECONDARY_TEXT),
+        )
+    
     def _crear_estadisticas(self):
         """Crea las tarjetas de estadísticas"""
         def crear_stat_card(titulo, valor, icono, color):
@@ -206,7 +280,16 @@ class HistorialVentasWindow:
             ft.Container(ft.Text("Cliente", weight=ft.FontWeight.BOLD, color=DarkTheme.PRIMARY_TEXT, size=13, text_align=ft.TextAlign.CENTER), width=120, alignment=ft.alignment.center),
         ], spacing=12)
         
-        self.tabla_filas = ft.Column([], spacing=8, scroll=ft.ScrollMode.AUTO)
+        self.tabla_filas = ft.Column(
+            [],
+            spacing=8,
+            scroll=ft.ScrollMode.AUTO,
+            on_scroll=self._on_scroll_tabla,
+            on_scroll_interval=100
+        )
+        
+        # Pie de la tabla: botón "Cargar más" o mensaje de historial vacío
+        self.pie_tabla = ft.Container(alignment=ft.alignment.center, padding=ft.Padding(0, 10, 0, 10))
         
         return ft.Container(
             content=ft.Column([
@@ -231,20 +314,47 @@ class HistorialVentasWindow:
         )
     
     def _cargar_datos(self):
-        """Carga los datos del historial y estadísticas"""
+        """Carga los datos del historial y estadísticas (en segundo plano)"""
+        self._en_fondo(
+            self.salida_service.obtener_estadisticas_ventas,
+            al_terminar=self._estadisticas_cargadas
+        )
+        
+        # Cargar solo la primera página del historial
+        self._cargar_pagina(reiniciar=True)
+    
+    def _estadisticas_cargadas(self, estadisticas: dict):
+        self.estadisticas = estadisticas
+        self._actualizar_estadisticas()
+    
+    def _en_fondo(self, funcion, *args, al_terminar=None, al_fallar=None, cancelable=True):
+        """
+        Ejecuta una consulta en el ejecutor (o aquí mismo si la ventana no tiene uno)
+        
+        Las tareas cancelables se descartan al volver a la ventana principal.
+        """
+        al_fallar = al_fallar or self._error_carga
+        if self.ejecutor is not None:
+            return self.ejecutor.enviar(
+                funcion, *args,
+                al_terminar=al_terminar,
+                al_fallar=al_fallar,
+                grupo=self._grupo_tareas if cancelable else None
+            )
         try:
-            # Cargar historial
-            self.historial_ventas = self.salida_service.obtener_historial_ventas()
-            
-            # Cargar estadísticas
-            self.estadisticas = self.salida_service.obtener_estadisticas_ventas()
-            
-            # Actualizar la interfaz
-            self._actualizar_estadisticas()
-            self._actualizar_tabla()
-            
+            resultado = funcion(*args)
         except Exception as e:
-            self.alert_manager.show_error(f"Error al cargar datos: {str(e)}")
+            al_fallar(e)
+            return None
+        if al_terminar:
+            al_terminar(resultado)
+    
+    def _error_carga(self, error: Exception):
+        with self._lock_pagina:
+            if self._cargando_pagina:
+                self._cargando_pagina = False
+                self._quitar_pie()
+        self.alert_manager.show_error(f"Error al cargar datos: {str(error)}")
     
     def _actualizar_estadisticas(self):
         """Actualiza las tarjetas de estadísticas"""
@@ -287,66 +397,156 @@ class HistorialVentasWindow:
         
         self.page.update()
     
-    def _actualizar_tabla(self):
-        """Actualiza la tabla con el historial"""
+    def _cargar_pagina(self, reiniciar: bool = False):
+        """
+        Pide al servicio la página siguiente del historial y agrega sus filas
+        
+        Args:
+            reiniciar: Vuelve a la primera página (al abrir o actualizar)
+        """
+        # Un scroll que llega mientras se carga otra página se descarta;
+        # un reinicio deja sin efecto la carga en curso
+        with self._lock_pagina:
+            if reiniciar:
+                self._reiniciar_tabla()
+            elif self.cursor_pagina is None or self._cargando_pagina:
+                return
+            self._cargando_pagina = True
+            generacion = self._generacion_pagina
+            cursor, texto = self.cursor_pagina, self.filtro_texto
+            self._mostrar_cargando()
+        
+        self._en_fondo(
+            self._pedir_pagina, cursor, texto,
+            al_terminar=lambda pagina: self._pagina_cargada(generacion, pagina)
+        )
+    
+    def _pagina_cargada(self, generacion: int, pagina: dict):
+        with self._lock_pagina:
+            if generacion != self._generacion_pagina:
+                return
+            self._cargando_pagina = False
+            self._mostrar_pagina(pagina)
+    
+    def _pedir_pagina(self, cursor, texto: str) -> dict:
+        return self.salida_service.obtener_historial_ventas_pagina(
+            limite=self.TAMANO_PAGINA,
+            cursor=cursor,
+            texto=texto or None
+        )
+    
+    def _reiniciar_tabla(self):
+        self._generacion_pagina += 1
+        self._cargando_pagina = False
+        self.cursor_pagina = None
+        self.historial_ventas = []
         self.tabla_filas.controls.clear()
+    
+    def _mostrar_pagina(self, pagina: dict):
+        inicio = len(self.historial_ventas)
+        self.historial_ventas.extend(pagina['ventas'])
+        self.cursor_pagina = pagina['cursor']
+        self._agregar_filas(pagina['ventas'], inicio)
+        self.page.update()
+    
+    def _mostrar_busqueda(self, resultado):
+        """Reemplaza la tabla por la primera página de la última búsqueda"""
+        texto, pagina = resultado
+        with self._lock_pagina:
+            self.filtro_texto = texto
+            self._reiniciar_tabla()
+            self._mostrar_pagina(pagina)
+    
+    def _mostrar_cargando(self):
+        """Muestra al final de la tabla un indicador mientras llega la página"""
+        self._quitar_pie()
+        self.pie_tabla.content = ft.Row([
+            ft.ProgressRing(width=20, height=20, stroke_width=2, color=DarkTheme.ACCENT),
+            ft.Text("Cargando ventas...", color=DarkTheme.SECONDARY_TEXT, size=14)
+        ], spacing=12, tight=True)
+        self.tabla_filas.controls.append(self.pie_tabla)
+        self.page.update()
+    
+    def _quitar_pie(self):
+        if self.tabla_filas.controls and self.tabla_filas.controls[-1] is self.pie_tabla:
+            self.tabla_filas.controls.pop()
+    
+    def _agregar_filas(self, ventas: List[Dict], inicio: int):
+        """Agrega las filas de una página al final de la tabla"""
+        self._quitar_pie()
+        
+        for i, venta in enumerate(ventas, start=inicio):
+            self.tabla_filas.controls.append(self._crear_fila(venta, i))
         
-        for i, venta in enumerate(self.historial_ventas):
-            fila_color = DarkTheme.TABLE_ROW_EVEN if i % 2 == 0 else DarkTheme.TABLE_ROW_ODD
-            
-            # Obtener datos de la venta
-            costo_produccion = venta.get('costo_produccion', 0)
-            precio_venta = venta.get('precio_venta', 0)
-            ganancia = venta.get('ganancia', 0)
-            
-            fila = ft.Container(
+        if self.cursor_pagina is not None:
+            self.pie_tabla.content = ft.TextButton(
                 content=ft.Row([
-                    ft.Container(ft.Text(venta['fecha'], color=DarkTheme.PRIMARY_TEXT, size=12, text_align=ft.TextAlign.CENTER), width=110, alignment=ft.alignment.center),
-                    ft.Container(ft.Text(venta['id'], color=DarkTheme.ACCENT_TEXT, size=12, weight=ft.FontWeight.W_500, text_align=ft.TextAlign.CENTER), width=80, alignment=ft.alignment.center),
-                    ft.Container(ft.Text(venta['producto_nombre'], color=DarkTheme.PRIMARY_TEXT, size=11, text_align=ft.TextAlign.CENTER), width=160, alignment=ft.alignment.center),
-                    ft.Container(ft.Text(venta.get('frasco_nombre', 'Sin frasco'), color=DarkTheme.SECONDARY_TEXT, size=11, text_align=ft.TextAlign.CENTER), width=130, alignment=ft.alignment.center),
-                    ft.Container(ft.Text(f"{venta['cantidad_vendida']:.1f}", color=DarkTheme.PRIMARY_TEXT, size=12, text_align=ft.TextAlign.CENTER), width=80, alignment=ft.alignment.center),
-                    ft.Container(ft.Text(f"Q{costo_produccion:.2f}", color=DarkTheme.ERROR, size=12, text_align=ft.TextAlign.CENTER), width=100, alignment=ft.alignment.center),
-                    ft.Container(ft.Text(f"Q{precio_venta:.2f}", color=ft.Colors.GREEN_300, size=12, weight=ft.FontWeight.BOLD, text_align=ft.TextAlign.CENTER), width=120, alignment=ft.alignment.center),
-                    ft.Container(ft.Text(f"Q{ganancia:.2f}", color=DarkTheme.WARNING, size=12, weight=ft.FontWeight.BOLD, text_align=ft.TextAlign.CENTER), width=100, alignment=ft.alignment.center),
-                    ft.Container(ft.Text(venta['cliente'], color=DarkTheme.SECONDARY_TEXT, size=11, text_align=ft.TextAlign.CENTER), width=120, alignment=ft.alignment.center),
-                ], spacing=12),
-                padding=ft.Padding(20, 12, 20, 12),
-                bgcolor=fila_color,
-                border_radius=8,
-                margin=ft.margin.only(bottom=4),
-                border=ft.border.all(0.5, DarkTheme.BORDER_COLOR),
-                animate_scale=200,
-                on_hover=lambda e, container=None: self._on_row_hover(e)
+                    ft.Icon(ft.Icons.EXPAND_MORE, size=20),
+                    ft.Text("Cargar más")
+                ], spacing=8, tight=True),
+                on_click=lambda e: self._cargar_pagina(),
+                style=ft.ButtonStyle(color=DarkTheme.ACCENT_TEXT)
             )
-            
-            self.tabla_filas.controls.append(fila)
-        
-        if not self.historial_ventas:
-            self.tabla_filas.controls.append(
-                ft.Container(
-                    content=ft.Column([
-                        ft.Icon(ft.Icons.HISTORY, size=64, color=DarkTheme.SECONDARY_TEXT),
-                        ft.Text(
-                            "No hay ventas registradas",
-                            color=DarkTheme.SECONDARY_TEXT,
-                            size=18,
-                            text_align=ft.TextAlign.CENTER,
-                            weight=ft.FontWeight.W_500
-                        ),
-                        ft.Text(
-                            "Las ventas aparecerán aquí una vez que registres la primera",
-                            color=DarkTheme.MUTED_TEXT,
-                            size=14,
-                            text_align=ft.TextAlign.CENTER
-                        )
-                    ], spacing=15, horizontal_alignment=ft.CrossAxisAlignment.CENTER),
-                    padding=ft.Padding(25, 60, 25, 60),
-                    alignment=ft.alignment.center
+            self.tabla_filas.controls.append(self.pie_tabla)
+        elif not self.historial_ventas:
+            if self.filtro_texto:
+                titulo = "No hay ventas que coincidan con la búsqueda"
+                detalle = "Prueba con otro nombre de producto"
+            else:
+                titulo = "No hay ventas registradas"
+                detalle = "Las ventas aparecerán aquí una vez que registres la primera"
+            self.pie_tabla.content = ft.Column([
+                ft.Icon(ft.Icons.HISTORY, size=64, color=DarkTheme.SECONDARY_TEXT),
+                ft.Text(
+                    titulo,
+                    color=DarkTheme.SECONDARY_TEXT,
+                    size=18,
+                    text_align=ft.TextAlign.CENTER,
+                    weight=ft.FontWeight.W_500
+                ),
+                ft.Text(
+                    detalle,
+                    color=DarkTheme.MUTED_TEXT,
+                    size=14,
+                    text_align=ft.TextAlign.CENTER
                 )
-            )
+            ], spacing=15, horizontal_alignment=ft.CrossAxisAlignment.CENTER)
+            self.tabla_filas.controls.append(self.pie_tabla)
+    
+    def _crear_fila(self, venta: Dict, i: int):
+        """Crea la fila de una venta"""
+        fila_color = DarkTheme.TABLE_ROW_EVEN if i % 2 == 0 else DarkTheme.TABLE_ROW_ODD
         
-        self.page.update()
+        # Obtener datos de la venta
+        costo_produccion = venta.get('costo_produccion', 0)
+        precio_venta = venta.get('precio_venta', 0)
+        ganancia = venta.get('ganancia', 0)
+        
+        return ft.Container(
+            content=ft.Row([
+                ft.Container(ft.Text(venta['fecha'], color=DarkTheme.PRIMARY_TEXT, size=12, text_align=ft.TextAlign.CENTER), width=110, alignment=ft.alignment.center),
+                ft.Container(ft.Text(venta['id'], color=DarkTheme.ACCENT_TEXT, size=12, weight=ft.FontWeight.W_500, text_align=ft.TextAlign.CENTER), width=80, alignment=ft.alignment.center),
+                ft.Container(ft.Text(venta['producto_nombre'], color=DarkTheme.PRIMARY_TEXT, size=11, text_align=ft.TextAlign.CENTER), width=160, alignment=ft.alignment.center),
+                ft.Container(ft.Text(venta.get('frasco_nombre', 'Sin frasco'), color=DarkTheme.SECONDARY_TEXT, size=11, text_align=ft.TextAlign.CENTER), width=130, alignment=ft.alignment.center),
+                ft.Container(ft.Text(f"{venta['cantidad_vendida']:.1f}", color=DarkTheme.PRIMARY_TEXT, size=12, text_align=ft.TextAlign.CENTER), width=80, alignment=ft.alignment.center),
+                ft.Container(ft.Text(f"Q{costo_produccion:.2f}", color=DarkTheme.ERROR, size=12, text_align=ft.TextAlign.CENTER), width=100, alignment=ft.alignment.center),
+                ft.Container(ft.Text(f"Q{precio_venta:.2f}", color=ft.Colors.GREEN_300, size=12, weight=ft.FontWeight.BOLD, text_align=ft.TextAlign.CENTER), width=120, alignment=ft.alignment.center),
+                ft.Container(ft.Text(f"Q{ganancia:.2f}", color=DarkTheme.WARNING, size=12, weight=ft.FontWeight.BOLD, text_align=ft.TextAlign.CENTER), width=100, alignment=ft.alignment.center),
+                ft.Container(ft.Text(venta['cliente'], color=DarkTheme.SECONDARY_TEXT, size=11, text_align=ft.TextAlign.CENTER), width=120, alignment=ft.alignment.center),
+            ], spacing=12),
+            padding=ft.Padding(20, 12, 20, 12),
+            bgcolor=fila_color,
+            border_radius=8,
+            margin=ft.margin.only(bottom=4),
+            border=ft.border.all(0.5, DarkTheme.BORDER_COLOR),
+            animate_scale=200,
+            on_hover=lambda e, container=None: self._on_row_hover(e)
+        )
+    
+    def _on_scroll_tabla(self, e: ft.OnScrollEvent):
+        """Carga la página siguiente al acercarse al final de la tabla"""
+        if self.cursor_pagina is not None and e.max_scroll_extent and e.pixels >= e.max_scroll_extent - 200:
+            self._cargar_pagina()
     
     def _on_row_hover(self, e):
         """Maneja el hover sobre las filas"""
@@ -357,57 +557,75 @@ class HistorialVentasWindow:
         e.control.update()
     
     def _filtrar_historial(self, e):
-        """Filtra el historial por nombre de producto"""
-        filtro = e.control.value.lower() if e.control.value else ""
-        
-        if not filtro:
-            # Mostrar todos
-            self._actualizar_tabla()
-            return
-        
-        # Filtrar por nombre de producto
-        historial_filtrado = [
-            venta for venta in self.historial_ventas
-            if filtro in venta['producto_nombre'].lower()
-        ]
-        
-        # Actualizar tabla con datos filtrados
-        self.tabla_filas.controls.clear()
-        
-        for i, venta in enumerate(historial_filtrado):
-            fila_color = DarkTheme.TABLE_ROW_EVEN if i % 2 == 0 else DarkTheme.TABLE_ROW_ODD
-            
-            fila = ft.Container(
-                content=ft.Row([
-                    ft.Container(ft.Text(venta['fecha'], color=DarkTheme.PRIMARY_TEXT, size=13), width=130),
-                    ft.Container(ft.Text(venta['id'], color=DarkTheme.ACCENT_TEXT, size=13, weight=ft.FontWeight.W_500), width=90),
-                    ft.Container(ft.Text(venta['producto_nombre'], color=DarkTheme.PRIMARY_TEXT, size=13), width=180),
-                    ft.Container(ft.Text(venta.get('frasco_nombre', 'Sin frasco'), color=DarkTheme.SECONDARY_TEXT, size=13), width=140),
-                    ft.Container(ft.Text(f"{venta['cantidad_vendida']:.1f} ml", color=DarkTheme.PRIMARY_TEXT, size=13), width=90),
-                    ft.Container(ft.Text(f"Q{venta['precio_venta']:.2f}", color=DarkTheme.SUCCESS, size=13, weight=ft.FontWeight.BOLD), width=100),
-                    ft.Container(ft.Text(f"Q{venta['ganancia']:.2f}", color=DarkTheme.WARNING, size=13, weight=ft.FontWeight.BOLD), width=100),
-                    ft.Container(ft.Text(venta['cliente'], color=DarkTheme.SECONDARY_TEXT, size=13), width=130),
-                ], spacing=15),
-                padding=ft.Padding(25, 15, 25, 15),
-                bgcolor=fila_color,
-                border_radius=8,
-                margin=ft.margin.only(bottom=4),
-                border=ft.border.all(0.5, DarkTheme.BORDER_COLOR),
-                animate_scale=200,
-                on_hover=lambda e, container=None: self._on_row_hover(e)
-            )
-            
-            self.tabla_filas.controls.append(fila)
-        
-        self.page.update()
+        """Filtra el historial por nombre de producto (en la consulta, no en memoria)"""
+        self._filtro_busqueda.solicitar(e.control.value.strip() if e.control.value else "")
     
     def _actualizar_datos(self, e):
         """Actualiza todos los datos"""
         self._cargar_datos()
         self.alert_manager.show_toast("Datos actualizados", "info")
     
+    def _exportar(self, e):
+        """Valida el rango de fechas y pide el archivo de destino"""
+        try:
+            desde = self._leer_fecha(self.exportar_desde)
+            hasta = self._leer_fecha(self.exportar_hasta)
+        except ValueError:
+            self.alert_manager.show_warning("⚠️ Fecha inválida\nUse el formato AAAA-MM-DD o deje el campo vacío")
+            return
+        if desde and hasta and hasta < desde:
+            self.alert_manager.show_warning("⚠️ Rango inválido\nLa fecha 'Hasta' es anterior a 'Desde'")
+            return
+        
+        formato = self.exportar_formato.value or "csv"
+        # 'Hasta' incluye todo ese día: el servicio recibe el inicio del día siguiente
+        fin = hasta + timedelta(days=1) if hasta else None
+        self._exportacion_pendiente = (formato, desde, fin)
+        
+        rango = f"_{desde:%Y%m%d}" if desde else ""
+        rango += f"_{hasta:%Y%m%d}" if hasta else ""
+        self.selector_archivo.save_file(
+            dialog_title="Exportar historial de ventas",
+            file_name=f"historial_ventas{rango}.{EXTENSIONES[formato]}",
+            allowed_extensions=[EXTENSIONES[formato]]
+        )
+    
+    def _leer_fecha(self, campo: ft.TextField):
+        texto = (campo.value or "").strip()
+        return datetime.strptime(texto, "%Y-%m-%d") if texto else None
+    
+    def _on_destino_exportacion(self, e: ft.FilePickerResultEvent):
+        """Exporta en segundo plano al archivo elegido"""
+        if not e.path or self._exportacion_pendiente is None:
+            return
+        formato, desde, hasta = self._exportacion_pendiente
+        self._exportacion_pendiente = None
+        
+        ruta = e.path
+        extension = f".{EXTENSIONES[formato]}"
+        if not ruta.lower().endswith(extension):
+            ruta += extension
+        
+        self.alert_manager.show_info("Exportando historial...")
+        # Una exportación iniciada termina aunque el usuario vuelva a la ventana principal
+        self._en_fondo(
+            self.salida_service.exportar_historial_ventas, ruta, formato, desde, hasta,
+            al_terminar=lambda total: self.alert_manager.show_success(f"{total} ventas exportadas a {ruta}"),
+            al_fallar=lambda error: self.alert_manager.show_error(f"Error al exportar: {str(error)}"),
+            cancelable=False
+        )
+    
     def _volver(self, e):
         """Vuelve a la ventana principal"""
+        # Las consultas que sigan en curso ya no se muestran
+        self._filtro_busqueda.cancelar()
+        if self.ejecutor is not None:
+            self.ejecutor.cancelar_grupo(self._grupo_tareas)
+        
+        # El selector de archivos vive en el overlay mientras la ventana está abierta
+        if self.selector_archivo in self.page.overlay:
+            self.page.overlay.remove(self.selector_archivo)
+        
         if self.original_content:
             self.page.clean()
             for control in self.original_content:
@@ -421,5 +639,6 @@ class HistorialVentasWindow:
         
         # Limpiar la página y mostrar el historial
         self.page.clean()
+        self.page.overlay.append(self.selector_archivo)
         self.page.add(self.main_container)
         self.page.update()
@@ -1,8 +1,18 @@
 import flet as ft
+import logging
+import threading
+from bisect import bisect_left
 from datetime import datetime
 from typing import List, Optional, Callable
-from views.producto_form_window import ProductoFormWindow
 from utils.alerts import AlertManager
+from utils.indice_busqueda import IndiceProductos
+from utils.filtro_diferido import FiltroDiferido
+from services.inventario_memoria import CARGADO, ELIMINADO, clave_producto
+from utils.database import UMBRAL_STOCK_BAJO_ESENCIA
+from utils.registros import Registro
+from utils.instrumentacion import instrumentacion_activa
+
+logger = logging.getLogger(__name__)
 
 class DarkTheme:
     """Colores para el tema oscuro"""
@@ -42,11 +52,42 @@ class DarkTheme:
     HIGHLIGHT = ft.Colors.PURPLE_400
 
 class MainWindow:
+    # Filas de la tabla que se crean por tanda; el resto se agrega al hacer scroll
+    FILAS_POR_TANDA = 60
+    
+    # Segundos sin escribir antes de filtrar por el texto de búsqueda
+    ESPERA_BUSQUEDA = 0.25
+    
     def __init__(self, page: ft.Page):
         self.page = page
         self.productos = []
         self.productos_filtrados = []
         
+        # Caché de filas por clave_producto (tipo, id): (datos con los que se creó, control)
+        self._filas_cache = {}
+        self._filas_visibles = 0
+        self._tipo_encabezados = None
+        
+        # Índice de búsqueda, se reconstruye en mostrar_productos
+        self._indice = IndiceProductos([], self._necesita_reabastecimiento)
+        
+        # Posición de cada producto en el índice, posiciones de productos_filtrados
+        # y totales de las tarjetas (se ajustan con cada cambio)
+        self._posiciones = {}
+        self._posiciones_filtradas = []
+        self._totales = self._totales_vacios()
+        self._lock_tabla = threading.RLock()
+        # Cambia con cada modificación del índice (ver _mostrar_filtrados)
+        self._version_indice = 0
+        self.inventario = None
+        
+        # La búsqueda por texto espera a que se deje de escribir
+        self._filtro_busqueda = FiltroDiferido(
+            ejecutar=lambda consulta: self._calcular_filtro(),
+            renderizar=self._mostrar_filtrados,
+            espera=self.ESPERA_BUSQUEDA
+        )
+        
         # Sistema de alertas
         self.alert_manager = AlertManager(page)
         
@@ -57,6 +98,7 @@ class MainWindow:
         self.on_cargar_productos: Optional[Callable] = None
         self.on_mostrar_salidas: Optional[Callable] = None
         self.on_mostrar_historial: Optional[Callable] = None
+        self.on_importar_catalogo: Optional[Callable] = None
         
         # Botones de acción principales con diseño moderno
         self.btn_nuevo_producto = ft.ElevatedButton(
@@ -131,11 +173,32 @@ class MainWindow:
             height=56
         )
         
+        self.btn_importar = ft.ElevatedButton(
+            content=ft.Row([
+                ft.Icon(ft.Icons.UPLOAD_FILE_ROUNDED, size=20),
+                ft.Text("Importar", weight=ft.FontWeight.W_600)
+            ], spacing=8, alignment=ft.MainAxisAlignment.CENTER),
+            on_click=self._elegir_archivo_importacion,
+            style=ft.ButtonStyle(
+                bgcolor=DarkTheme.BUTTON_SECONDARY,
+                color=DarkTheme.PRIMARY_TEXT,
+                elevation={"": 2, "hovered": 6},
+                shadow_color=ft.Colors.BLACK26,
+                shape=ft.RoundedRectangleBorder(radius=12),
+                padding=ft.Padding(20, 12, 20, 12)
+            ),
+            width=200,
+            height=56
+        )
+        
+        # Selector del archivo a importar (CSV, JSON o JSON Lines)
+        self.selector_importacion = ft.FilePicker(on_result=self._on_archivo_importacion)
+        
         # Campo de búsqueda mejorado
         self.search_field = ft.Container(
             content=ft.TextField(
                 label="Buscar productos...",
-                on_change=self._filtrar_productos,
+                on_change=self._on_busqueda_cambiada,
                 prefix_icon=ft.Icons.SEARCH_ROUNDED,
                 width=400,
                 height=56,
@@ -265,8 +328,9 @@ class MainWindow:
                     self.btn_nuevo_producto,
                     self.btn_actualizar_lista,
                     self.btn_salida,
-                    self.btn_historial
-                ], spacing=20, alignment=ft.MainAxisAlignment.START),
+                    self.btn_historial,
+                    self.btn_importar
+                ], spacing=20, alignment=ft.MainAxisAlignment.START, wrap=True),
                 
                 # Segunda fila: Búsqueda y filtros
                 ft.Row([
@@ -324,15 +388,23 @@ class MainWindow:
             expand=True  # Permite que la sección ocupe todo el espacio disponible
         )
         
+        # Panel de consultas SQL (solo con la instrumentación activa)
+        self.panel_consultas = None
+        if instrumentacion_activa():
+            from views.panel_consultas import PanelConsultas
+            self.panel_consultas = PanelConsultas(self.page)
+        
         # Layout principal optimizado para ocupar todo el espacio
         main_content = ft.Column([
             header,
             toolbar,
             self.stats_container,
+            *([self.panel_consultas.contenedor] if self.panel_consultas else []),
             seccion_tabla,
         ], spacing=0, expand=True)
         
         # Container principal que ocupa toda la página
+        self.page.overlay.append(self.selector_importacion)
         self.page.add(main_content)
         
         # Cargar productos iniciales
@@ -341,15 +413,12 @@ class MainWindow:
     
     def _crear_estadisticas(self):
         """Crea tarjetas de estadísticas modernas con efectos hover"""
-        # Separar esencias y frascos por estructura de datos
-        esencias = [p for p in self.productos if 'capacidad_ml' not in p]
-        frascos = [p for p in self.productos if 'capacidad_ml' in p]
-        
-        total_productos = len(self.productos)
-        total_esencias = len(esencias)
-        total_frascos = len(frascos)
-        productos_bajo_stock = len([p for p in self.productos if self._necesita_reabastecimiento(p)])
-        valor_total_inventario = sum(self._calcular_valor_total(p) for p in self.productos)
+        # Totales mantenidos por mostrar_productos y aplicar_cambios
+        total_esencias = self._totales['esencias']
+        total_frascos = self._totales['frascos']
+        total_productos = total_esencias + total_frascos
+        productos_bajo_stock = self._totales['stock_bajo']
+        valor_total_inventario = self._totales['valor_total']
         
         def crear_tarjeta_stat(icono, titulo, valor, color_icono, color_valor, descripcion=""):
             return ft.Container(
@@ -441,11 +510,26 @@ class MainWindow:
             border_radius=ft.border_radius.only(top_left=10, top_right=10)
         )
         
-        self.productos_filas = ft.Column([], spacing=8, scroll=ft.ScrollMode.AUTO)
+        self.productos_filas = ft.Column(
+            [],
+            spacing=8,
+            scroll=ft.ScrollMode.AUTO,
+            on_scroll=self._on_scroll_productos,
+            on_scroll_interval=100
+        )
+        
+        # Barra visible mientras se lee el catálogo en segundo plano
+        self.indicador_carga = ft.ProgressBar(
+            visible=False,
+            color=DarkTheme.ACCENT,
+            bgcolor=DarkTheme.SECONDARY_BG,
+            bar_height=3
+        )
         
         return ft.Container(
             content=ft.Column([
                 self.headers_container,
+                self.indicador_carga,
                 ft.Container(
                     content=self.productos_filas,
                     padding=ft.Padding(25, 15, 25, 25),
@@ -531,6 +615,8 @@ class MainWindow:
         """Abre el formulario para agregar un nuevo producto"""
         print("Abriendo formulario para nuevo producto...")  # Debug
         try:
+            # Se importa al usarlo (main.py lo precarga después de mostrar la tabla)
+            from views.producto_form_window import ProductoFormWindow
             form_window = ProductoFormWindow(self.page)
             form_window.set_callbacks(
                 on_save=self._on_producto_saved,
@@ -544,6 +630,7 @@ class MainWindow:
     
     def _abrir_formulario_editar(self, producto):
         """Abre el formulario para editar un producto"""
+        from views.producto_form_window import ProductoFormWindow
         form_window = ProductoFormWindow(self.page, producto)
         form_window.set_callbacks(
             on_save=self._on_producto_saved,
@@ -571,6 +658,23 @@ class MainWindow:
             self.on_cargar_productos()
             self.alert_manager.show_toast("Lista actualizada", "info")
     
+    def _elegir_archivo_importacion(self, e):
+        """Abre el selector del archivo con esencias o frascos a importar"""
+        if not self.on_importar_catalogo:
+            self.alert_manager.show_toast("Funcionalidad de importación no disponible", "error")
+            return
+        self.selector_importacion.pick_files(
+            dialog_title="Importar esencias o frascos",
+            allowed_extensions=["csv", "json", "jsonl"],
+            allow_multiple=False
+        )
+    
+    def _on_archivo_importacion(self, e: ft.FilePickerResultEvent):
+        """Importa el archivo elegido"""
+        if not e.files or not self.on_importar_catalogo:
+            return
+        self.on_importar_catalogo(e.files[0].path)
+    
     def _on_producto_saved(self, data, is_editing):
         """Maneja cuando se guarda un producto desde el formulario"""
         try:
@@ -688,49 +792,46 @@ class MainWindow:
             print(f"DEBUG: No hay callback de eliminación configurado")
     
     def _filtrar_productos(self, e=None):
-        """Filtra los productos según los criterios"""
-        texto_busqueda = self.search_field.content.value.lower() if self.search_field.content.value else ""
-        solo_stock_bajo = self.filtro_stock_bajo.content.value
-        genero_seleccionado = self.filtro_genero.content.value
-        tipo_seleccionado = self.filtro_tipo.content.value
-        
-        self.productos_filtrados = []
+        """Filtra los productos según los criterios (de inmediato)"""
+        # Una búsqueda pendiente quedaría vieja: se filtra con los valores actuales
+        self._filtro_busqueda.cancelar()
+        self._mostrar_filtrados(self._calcular_filtro())
+    
+    def _on_busqueda_cambiada(self, e):
+        """Programa el filtro por texto; solo se pinta el de la última tecla"""
+        self._filtro_busqueda.solicitar()
+    
+    def _valores_filtro(self):
+        return {
+            'texto': self.search_field.content.value or "",
+            'tipo': self.filtro_tipo.content.value,
+            'genero': self.filtro_genero.content.value,
+            'solo_stock_bajo': self.filtro_stock_bajo.content.value
+        }
+    
+    def _calcular_filtro(self):
+        """
+        Calcula las posiciones filtradas usando el índice precalculado
         
-        for producto in self.productos:
-            # Filtro por texto - funciona para ambos tipos
-            coincide_texto = (
-                texto_busqueda in producto['nombre'].lower() or
-                texto_busqueda in str(producto.get('proveedor', '')).lower() or
-                texto_busqueda in str(producto['id_producto'])
-            )
-            
-            # Filtro por stock bajo - diferente para frascos y esencias
-            stock_bajo = self._necesita_reabastecimiento(producto)
-            coincide_stock = not solo_stock_bajo or stock_bajo
-            
-            # Filtro por tipo de producto
-            es_frasco = 'capacidad_ml' in producto
-            if tipo_seleccionado == "frasco":
-                coincide_tipo = es_frasco
-            elif tipo_seleccionado == "esencia":
-                coincide_tipo = not es_frasco
-            else:
-                coincide_tipo = True  # Por si acaso hay algún valor inesperado
-            
-            # Filtro por género - solo aplica a esencias
-            es_frasco = 'capacidad_ml' in producto
-            if es_frasco:
-                # Los frascos siempre pasan el filtro de género
-                coincide_genero = True
-            else:
-                # Solo filtrar por género en esencias
-                coincide_genero = (genero_seleccionado == "Todos" or 
-                                 producto.get('genero', 'Unisex') == genero_seleccionado)
-            
-            if coincide_texto and coincide_stock and coincide_genero and coincide_tipo:
-                self.productos_filtrados.append(producto)
+        Corre en el hilo del filtro diferido: toma el lock de la tabla porque
+        aplicar_cambios modifica el índice desde el hilo de la interfaz.
         
-        self._actualizar_tabla()
+        Returns:
+            tuple: (versión del índice, posiciones filtradas)
+        """
+        with self._lock_tabla:
+            return self._version_indice, self._indice.filtrar_posiciones(**self._valores_filtro())
+    
+    def _mostrar_filtrados(self, resultado):
+        with self._lock_tabla:
+            version, posiciones = resultado
+            if version != self._version_indice:
+                # El índice cambió entre el cálculo y el pintado: las posiciones
+                # pueden apuntar a productos quitados
+                posiciones = self._indice.filtrar_posiciones(**self._valores_filtro())
+            self._posiciones_filtradas = posiciones
+            self.productos_filtrados = [self._indice.productos[i] for i in posiciones]
+            self._actualizar_tabla()
     
     def _necesita_reabastecimiento(self, producto):
         """Verifica si un producto necesita reabastecimiento"""
@@ -740,7 +841,17 @@ class MainWindow:
             return producto['stock_actual'] < 5
         else:
             # Para esencias: stock bajo si tienen menos de 50ml
-            return producto['stock_actual'] < 50
+            return producto['stock_actual'] < UMBRAL_STOCK_BAJO_ESENCIA
+    
+    def _totales_vacios(self):
+        return {'esencias': 0, 'frascos': 0, 'stock_bajo': 0, 'valor_total': 0.0}
+    
+    def _acumular_totales(self, producto, signo):
+        """Suma (signo=1) o resta (signo=-1) un producto de los totales de las tarjetas"""
+        self._totales['frascos' if 'capacidad_ml' in producto else 'esencias'] += signo
+        if self._necesita_reabastecimiento(producto):
+            self._totales['stock_bajo'] += signo
+        self._totales['valor_total'] += signo * self._calcular_valor_total(producto)
     
     def _calcular_valor_total(self, producto):
         """Calcula el valor total del stock de un producto"""
@@ -753,44 +864,120 @@ class MainWindow:
             return producto['stock_actual'] * producto['costo_por_ml']
     
     def _actualizar_tabla(self):
-        """Actualiza la tabla moderna de productos"""
-        # Actualizar encabezados según el filtro seleccionado
-        if hasattr(self, 'headers_container'):
-            self.headers_container.content = self._crear_encabezados_tabla()
+        """
+        Actualiza la tabla moderna de productos
         
-        # Limpiar filas actuales
-        self.productos_filas.controls.clear()
+        Solo se materializan las primeras FILAS_POR_TANDA filas de la lista
+        filtrada. Las filas se reutilizan desde la caché mientras el producto
+        no cambie, así page.update() solo envía las filas nuevas o modificadas.
+        """
+        # Actualizar encabezados solo si cambió el tipo seleccionado
+        tipo_seleccionado = self.filtro_tipo.content.value if hasattr(self, 'filtro_tipo') else "esencia"
+        if hasattr(self, 'headers_container') and tipo_seleccionado != self._tipo_encabezados:
+            self.headers_container.content = self._crear_encabezados_tabla()
+            self._tipo_encabezados = tipo_seleccionado
         
         productos_a_mostrar = self.productos_filtrados if hasattr(self, 'productos_filtrados') else self.productos
-        tipo_seleccionado = self.filtro_tipo.content.value if hasattr(self, 'filtro_tipo') else "esencia"
+        self._filas_visibles = min(len(productos_a_mostrar), self.FILAS_POR_TANDA)
         
-        for i, producto in enumerate(productos_a_mostrar):
-            necesita_restock = self._necesita_reabastecimiento(producto)
-            valor_total = self._calcular_valor_total(producto)
-            
-            # Estado del producto
-            estado_color = DarkTheme.ERROR if necesita_restock else DarkTheme.SUCCESS
-            estado_texto = "⚠️ Stock Bajo" if necesita_restock else "✅ OK"
-            
-            # Color alternado para filas
-            row_color = DarkTheme.TABLE_ROW_EVEN if i % 2 == 0 else DarkTheme.TABLE_ROW_ODD
-            
-            # Detectar tipo de producto por su estructura
-            es_frasco = 'capacidad_ml' in producto
-            
-            # Generar fila según el tipo de producto
-            if es_frasco:
-                fila = self._crear_fila_frasco(producto, estado_color, estado_texto, valor_total, row_color)
-            else:
-                fila = self._crear_fila_esencia(producto, estado_color, estado_texto, valor_total, row_color)
-            
-            if fila:
-                self.productos_filas.controls.append(fila)
+        self.productos_filas.controls = [
+            self._obtener_fila(producto, i)
+            for i, producto in enumerate(productos_a_mostrar[:self._filas_visibles])
+        ]
         
         # Actualizar la página si existe
         if hasattr(self, 'page') and self.page:
             self.page.update()
     
+    def _on_scroll_productos(self, e: ft.OnScrollEvent):
+        """Materializa la siguiente tanda de filas al acercarse al final"""
+        if not e.max_scroll_extent or e.pixels < e.max_scroll_extent - 200:
+            return
+        
+        with self._lock_tabla:
+            if self._filas_visibles >= len(self.productos_filtrados):
+                return
+            inicio = self._filas_visibles
+            self._filas_visibles = min(len(self.productos_filtrados), inicio + self.FILAS_POR_TANDA)
+            self.productos_filas.controls.extend(
+                self._obtener_fila(producto, i)
+                for i, producto in enumerate(self.productos_filtrados[inicio:self._filas_visibles], start=inicio)
+            )
+        self.productos_filas.update()
+    
+    def _parchar_fila(self, posicion, coincide):
+        """
+        Refleja en la lista filtrada y en la tabla el cambio de un producto
+        
+        Args:
+            posicion: Posición del producto en el índice
+            coincide: Si el producto (ya actualizado) cumple los filtros actuales
+        """
+        k = bisect_left(self._posiciones_filtradas, posicion)
+        presente = k < len(self._posiciones_filtradas) and self._posiciones_filtradas[k] == posicion
+        controles = self.productos_filas.controls
+        
+        if presente and coincide:
+            # Sigue en la lista: solo cambia su fila
+            producto = self._indice.productos[posicion]
+            self.productos_filtrados[k] = producto
+            if k < self._filas_visibles:
+                controles[k] = self._obtener_fila(producto, k)
+        elif presente:
+            # Ya no cumple los filtros o se eliminó
+            del self._posiciones_filtradas[k]
+            del self.productos_filtrados[k]
+            if k < self._filas_visibles:
+                del controles[k]
+                self._filas_visibles -= 1
+                self._recolorear_filas(k)
+        elif coincide:
+            # Entra a la lista; se muestra si cae dentro de las filas ya creadas
+            producto = self._indice.productos[posicion]
+            materializada = k < self._filas_visibles or self._filas_visibles == len(self.productos_filtrados)
+            self._posiciones_filtradas.insert(k, posicion)
+            self.productos_filtrados.insert(k, producto)
+            if materializada:
+                controles.insert(k, self._obtener_fila(producto, k))
+                self._filas_visibles += 1
+                self._recolorear_filas(k + 1)
+    
+    def _recolorear_filas(self, desde):
+        """Ajusta el color alternado de las filas creadas a partir de una posición"""
+        controles = self.productos_filas.controls
+        for i in range(desde, self._filas_visibles):
+            controles[i].bgcolor = DarkTheme.TABLE_ROW_EVEN if i % 2 == 0 else DarkTheme.TABLE_ROW_ODD
+    
+    def _obtener_fila(self, producto, i):
+        """Devuelve la fila del producto desde la caché o la crea si el producto cambió"""
+        # Color alternado para filas (se ajusta aunque la fila venga de la caché)
+        row_color = DarkTheme.TABLE_ROW_EVEN if i % 2 == 0 else DarkTheme.TABLE_ROW_ODD
+        
+        clave = clave_producto(producto)
+        en_cache = self._filas_cache.get(clave)
+        if en_cache and en_cache[0] == producto:
+            fila = en_cache[1]
+            fila.bgcolor = row_color
+            return fila
+        
+        necesita_restock = self._necesita_reabastecimiento(producto)
+        valor_total = self._calcular_valor_total(producto)
+        
+        # Estado del producto
+        estado_color = DarkTheme.ERROR if necesita_restock else DarkTheme.SUCCESS
+        estado_texto = "⚠️ Stock Bajo" if necesita_restock else "✅ OK"
+        
+        # Generar fila según el tipo de producto (detectado por su estructura)
+        if 'capacidad_ml' in producto:
+            fila = self._crear_fila_frasco(producto, estado_color, estado_texto, valor_total, row_color)
+        else:
+            fila = self._crear_fila_esencia(producto, estado_color, estado_texto, valor_total, row_color)
+        
+        # Los registros del catálogo son inmutables; un diccionario se copia
+        instantanea = producto if isinstance(producto, Registro) else dict(producto)
+        self._filas_cache[clave] = (instantanea, fila)
+        return fila
+    
     def _crear_fila_frasco(self, producto, estado_color, estado_texto, valor_total, row_color):
         """Crea una fila específica para frascos"""
         return ft.Container(
@@ -937,7 +1124,7 @@ class MainWindow:
         # Buscar el nombre del producto para mostrar en la confirmación
         producto_nombre = None
         for producto in self.productos:
-            if producto['id_producto'] == producto_id:
+            if producto and producto['id_producto'] == producto_id:
                 producto_nombre = producto['nombre']
                 break
         
@@ -954,21 +1141,99 @@ class MainWindow:
     
     # Métodos públicos para ser llamados por el controlador
     def mostrar_productos(self, productos: List[dict]):
-        """Muestra la lista de productos en la tabla"""
-        self.productos = productos
-        self.productos_filtrados = productos.copy()
+        """Muestra la lista de productos en la tabla (reemplaza la lista completa)"""
+        with self._lock_tabla:
+            self._indice = IndiceProductos(productos, self._necesita_reabastecimiento)
+            self._version_indice += 1
+            self.productos = self._indice.productos
+            self._posiciones = {clave_producto(producto): i for i, producto in enumerate(self.productos)}
+            
+            self._totales = self._totales_vacios()
+            for producto in self.productos:
+                self._acumular_totales(producto, 1)
+            
+            # Descartar de la caché las filas de productos que ya no existen
+            for clave in list(self._filas_cache):
+                if clave not in self._posiciones:
+                    del self._filas_cache[clave]
+            
+            # Actualizar estadísticas con los nuevos productos
+            self.stats_container.content = self._crear_estadisticas()
+            if self.panel_consultas:
+                self.panel_consultas.actualizar(refrescar=False)
+            
+            # Aplicar filtros después de cargar los productos
+            self._filtrar_productos()
+    
+    def aplicar_cambios(self, cambios):
+        """
+        Aplica cambios puntuales del inventario sin recargar la lista
         
-        # Actualizar estadísticas con los nuevos productos
-        self.stats_container.content = self._crear_estadisticas()
+        Solo se tocan las filas de los productos cambiados y los totales de
+        las tarjetas; una venta cuesta lo mismo sin importar el tamaño del catálogo.
         
-        # Aplicar filtros después de cargar los productos
-        self._filtrar_productos()
+        Args:
+            cambios: Lista de (accion, clave, producto) de InventarioEnMemoria
+        """
+        with self._lock_tabla:
+            self._version_indice += 1
+            filtros = self._valores_filtro()
+            for accion, clave, producto in cambios:
+                posicion = self._posiciones.get(clave)
+                if posicion is not None:
+                    self._acumular_totales(self._indice.productos[posicion], -1)
+                
+                if accion == ELIMINADO:
+                    if posicion is None:
+                        continue
+                    self._indice.quitar(posicion)
+                    del self._posiciones[clave]
+                    self._filas_cache.pop(clave, None)
+                else:
+                    if posicion is None:
+                        posicion = self._indice.agregar(producto)
+                        self._posiciones[clave] = posicion
+                    else:
+                        self._indice.actualizar(posicion, producto)
+                    self._acumular_totales(producto, 1)
+                
+                self._parchar_fila(posicion, self._indice.coincide(posicion, **filtros))
+            
+            self.stats_container.content = self._crear_estadisticas()
+        
+        # Una búsqueda que se estaba calculando pudo ver el índice anterior
+        self._filtro_busqueda.reprogramar()
+        if self.page:
+            self.page.update()
+    
+    def mostrar_cargando(self, cargando: bool):
+        """Muestra u oculta la barra de carga sobre la tabla"""
+        self.indicador_carga.visible = cargando
+        if self.page:
+            self.page.update()
+    
+    def conectar_inventario(self, inventario):
+        """Escucha los cambios del inventario en memoria"""
+        self.inventario = inventario
+        inventario.suscribir(self._on_inventario_cambiado)
+    
+    def _on_inventario_cambiado(self, cambios):
+        if cambios and cambios[0][0] == CARGADO:
+            self.mostrar_productos(self.inventario.productos())
+            return
+        try:
+            self.aplicar_cambios(cambios)
+        except Exception:
+            # Un cambio a medio aplicar deja el índice, la caché de filas y los
+            # totales desalineados: se reconstruye todo desde el inventario
+            logger.exception("Error al aplicar cambios del inventario; se recarga la tabla")
+            self.mostrar_productos(self.inventario.productos())
     
     def actualizar_tabla(self, productos: List[dict]):
         """Actualiza la tabla con nueva lista de productos"""
         self.mostrar_productos(productos)
     
-    def set_callbacks(self, agregar_callback, actualizar_callback, eliminar_callback, cargar_callback, salidas_callback, historial_callback, agregar_frasco_callback=None, actualizar_frasco_callback=None):
+    def set_callbacks(self, agregar_callback, actualizar_callback, eliminar_callback, cargar_callback, salidas_callback, historial_callback, agregar_frasco_callback=None, actualizar_frasco_callback=None, importar_callback=None):
         """Establece los callbacks para las operaciones"""
         self.on_agregar_producto = agregar_callback
         self.on_actualizar_producto = actualizar_callback
@@ -978,6 +1243,7 @@ class MainWindow:
         self.on_mostrar_historial = historial_callback
         self.on_agregar_frasco = agregar_frasco_callback
         self.on_actualizar_frasco = actualizar_frasco_callback
+        self.on_importar_catalogo = importar_callback
     
     def _get_icono_genero(self, genero):
         """Obtiene el ícono correspondiente al género"""
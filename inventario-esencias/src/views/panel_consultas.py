@@ -0,0 +1,115 @@
+import flet as ft
+from utils.instrumentacion import estadisticas_consultas, reiniciar_estadisticas, resumen_consultas
+
+
+class PanelConsultas:
+    """
+    Panel de depuración con las consultas SQL más costosas
+
+    Solo se muestra cuando la instrumentación está activa
+    (INVENTARIO_PERFIL_SQL=1). Resalta en naranja las consultas que un método
+    ejecutó muchas veces en una sola llamada (posible N+1).
+    """
+
+    # Filas de la tabla y ejecuciones por llamada a partir de las que se resalta
+    LIMITE_FILAS = 12
+    UMBRAL_N_MAS_1 = 10
+
+    def __init__(self, page: ft.Page):
+        self.page = page
+
+        self.texto_resumen = ft.Text("", size=13, color=ft.Colors.GREY_300)
+        self.agrupar = ft.Dropdown(
+            options=[
+                ft.dropdown.Option("huella", "Por consulta y método"),
+                ft.dropdown.Option("llamador", "Por método"),
+                ft.dropdown.Option("consulta", "Por consulta"),
+            ],
+            value="huella",
+            on_change=lambda e: self.actualizar(),
+            width=220,
+            dense=True,
+            text_style=ft.TextStyle(color=ft.Colors.WHITE, size=13),
+            bgcolor=ft.Colors.GREY_600,
+            border_color=ft.Colors.GREY_600,
+        )
+        self.tabla = ft.DataTable(
+            columns=[
+                ft.DataColumn(ft.Text("Método")),
+                ft.DataColumn(ft.Text("Consulta")),
+                ft.DataColumn(ft.Text("Veces"), numeric=True),
+                ft.DataColumn(ft.Text("Total ms"), numeric=True),
+                ft.DataColumn(ft.Text("p50 ms"), numeric=True),
+                ft.DataColumn(ft.Text("p95 ms"), numeric=True),
+                ft.DataColumn(ft.Text("Filas"), numeric=True),
+                ft.DataColumn(ft.Text("Máx/llamada"), numeric=True),
+            ],
+            rows=[],
+            column_spacing=18,
+            data_row_min_height=32,
+            data_row_max_height=48,
+            heading_text_style=ft.TextStyle(size=12, weight=ft.FontWeight.BOLD, color=ft.Colors.BLUE_300),
+            data_text_style=ft.TextStyle(size=12, color=ft.Colors.WHITE),
+        )
+        self.cuerpo = ft.Column([self.tabla], scroll=ft.ScrollMode.AUTO, height=260, visible=False)
+
+        self.contenedor = ft.Container(
+            content=ft.Column([
+                ft.Row([
+                    ft.Icon(ft.Icons.BUG_REPORT_OUTLINED, size=20, color=ft.Colors.ORANGE_400),
+                    ft.Text("Consultas SQL", size=16, weight=ft.FontWeight.BOLD, color=ft.Colors.WHITE),
+                    self.texto_resumen,
+                    ft.Container(expand=True),
+                    self.agrupar,
+                    ft.IconButton(ft.Icons.REFRESH_ROUNDED, tooltip="Actualizar", on_click=lambda e: self.actualizar()),
+                    ft.IconButton(ft.Icons.DELETE_SWEEP_OUTLINED, tooltip="Reiniciar contadores", on_click=self._reiniciar),
+                    ft.IconButton(ft.Icons.EXPAND_MORE_ROUNDED, tooltip="Mostrar u ocultar", on_click=self._alternar),
+                ], spacing=10, vertical_alignment=ft.CrossAxisAlignment.CENTER),
+                self.cuerpo,
+            ], spacing=8),
+            padding=ft.Padding(16, 8, 16, 8),
+            margin=ft.margin.only(left=20, right=20, bottom=10),
+            border=ft.border.all(1, ft.Colors.ORANGE_400),
+            border_radius=10,
+            bgcolor=ft.Colors.GREY_800,
+        )
+        self.actualizar(refrescar=False)
+
+    def _alternar(self, e):
+        self.cuerpo.visible = not self.cuerpo.visible
+        self.actualizar()
+
+    def _reiniciar(self, e):
+        reiniciar_estadisticas()
+        self.actualizar()
+
+    def actualizar(self, refrescar: bool = True):
+        """Vuelve a leer las estadísticas de la instrumentación"""
+        resumen = resumen_consultas()
+        self.texto_resumen.value = (
+            f"{resumen['llamadas']} ejecuciones · {resumen['distintas']} distintas · "
+            f"{resumen['tiempo_total_ms']:.1f} ms"
+        )
+        if self.cuerpo.visible:
+            self.tabla.rows = [self._crear_fila(estadistica) for estadistica in
+                               estadisticas_consultas(self.agrupar.value, limite=self.LIMITE_FILAS)]
+        if refrescar and self.page:
+            self.page.update()
+
+    def _crear_fila(self, estadistica):
+        huella = estadistica['huella'] or "(todas)"
+        sospechosa = estadistica['max_por_llamada'] >= self.UMBRAL_N_MAS_1
+        return ft.DataRow(
+            cells=[
+                ft.DataCell(ft.Text(estadistica['llamador'] or "(todos)")),
+                ft.DataCell(ft.Text(huella[:90], tooltip=huella, width=420, no_wrap=True)),
+                ft.DataCell(ft.Text(str(estadistica['llamadas']))),
+                ft.DataCell(ft.Text(f"{estadistica['tiempo_total_ms']:.1f}")),
+                ft.DataCell(ft.Text(f"{estadistica['p50_ms']:.2f}")),
+                ft.DataCell(ft.Text(f"{estadistica['p95_ms']:.2f}")),
+                ft.DataCell(ft.Text(str(estadistica['filas']))),
+                ft.DataCell(ft.Text(str(estadistica['max_por_llamada']),
+                                    color=ft.Colors.ORANGE_400 if sospechosa else None)),
+            ],
+            color=ft.Colors.ORANGE_900 if sospechosa else None,
+        )
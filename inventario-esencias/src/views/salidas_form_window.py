@@ -1,6 +1,7 @@
 import flet as ft
 from datetime import datetime
 from utils.alerts import AlertManager
+from utils.database import UMBRAL_STOCK_BAJO_ESENCIA
 
 class DarkTheme:
     # Colores de fondo
@@ -32,17 +33,25 @@ class DarkTheme:
     DIVIDER_COLOR = ft.Colors.GREY_600
 
 class SalidasFormWindow:
-    def __init__(self, page, productos_disponibles=None, frascos_disponibles=None):
+    def __init__(self, page, productos_disponibles=None, frascos_disponibles=None, ejecutor=None):
         self.page = page
         self.productos_disponibles = productos_disponibles or []
         self.frascos_disponibles = frascos_disponibles or []
         
+        # Las ventas se registran en el EjecutorFondo para no congelar la ventana
+        self.ejecutor = ejecutor
+        self._guardando = False
+        
         # Sistema de alertas
         self.alert_manager = AlertManager(page)
         
         # Callbacks
         self.on_save = None
         self.on_cancel = None
+        self.on_save_lote = None
+        
+        # Carrito de ventas (modo de varias líneas)
+        self.carrito = []
         
         # Guardar el contenido original de la página
         self.original_content = None
@@ -173,9 +182,23 @@ class SalidasFormWindow:
             size=12,
             color=DarkTheme.SECONDARY_TEXT
         )
+        
+        # Líneas del carrito y total acumulado
+        self.carrito_filas = ft.Column([], spacing=8)
+        self.carrito_total_text = ft.Text(
+            "Carrito vacío",
+            size=16,
+            weight=ft.FontWeight.BOLD,
+            color=DarkTheme.MUTED_TEXT
+        )
     
     def _crear_formulario(self):
         """Crea el contenido del formulario para ventana completa"""
+        self.indicador_guardado = ft.Row([
+            ft.ProgressRing(width=20, height=20, stroke_width=2, color=DarkTheme.ACCENT),
+            ft.Text("Registrando venta...", color=DarkTheme.SECONDARY_TEXT, size=14)
+        ], spacing=12, alignment=ft.MainAxisAlignment.CENTER, visible=False)
+        
         # Encabezado principal
         header = ft.Container(
             content=ft.Row([
@@ -282,9 +305,30 @@ class SalidasFormWindow:
                     border=ft.border.all(1, DarkTheme.BORDER_COLOR),
                     border_radius=12,
                     bgcolor=DarkTheme.CARD_BG,
+                    margin=ft.margin.only(bottom=20)
+                ),
+                
+                # Carrito (varias ventas en una sola transacción)
+                ft.Container(
+                    content=ft.Column([
+                        ft.Row([
+                            ft.Icon(ft.Icons.SHOPPING_BASKET, color=DarkTheme.ACCENT, size=24),
+                            ft.Text("Carrito", size=20, weight=ft.FontWeight.BOLD, color=DarkTheme.PRIMARY_TEXT)
+                        ], spacing=10),
+                        ft.Divider(color=DarkTheme.DIVIDER_COLOR, height=20),
+                        self.carrito_filas,
+                        self.carrito_total_text,
+                    ], spacing=15),
+                    padding=ft.Padding(25, 20, 25, 20),
+                    border=ft.border.all(1, DarkTheme.BORDER_COLOR),
+                    border_radius=12,
+                    bgcolor=DarkTheme.CARD_BG,
                     margin=ft.margin.only(bottom=30)
                 ),
                 
+                # Indicador mientras se registra la venta
+                self.indicador_guardado,
+                
                 # Botones de acción
                 ft.Container(
                     content=ft.Row([
@@ -322,7 +366,41 @@ class SalidasFormWindow:
                             width=200,
                             height=50
                         ),
-                    ], spacing=20, alignment=ft.MainAxisAlignment.CENTER),
+                        ft.ElevatedButton(
+                            content=ft.Row([
+                                ft.Icon(ft.Icons.ADD_SHOPPING_CART, size=20),
+                                ft.Text("Agregar al Carrito", weight=ft.FontWeight.W_600)
+                            ], spacing=8, alignment=ft.MainAxisAlignment.CENTER),
+                            on_click=self._agregar_al_carrito,
+                            style=ft.ButtonStyle(
+                                bgcolor=DarkTheme.BUTTON_PRIMARY,
+                                color=DarkTheme.PRIMARY_TEXT,
+                                elevation={"": 4, "hovered": 8},
+                                shadow_color=ft.Colors.BLACK26,
+                                shape=ft.RoundedRectangleBorder(radius=12),
+                                padding=ft.Padding(25, 15, 25, 15)
+                            ),
+                            width=220,
+                            height=50
+                        ),
+                        ft.ElevatedButton(
+                            content=ft.Row([
+                                ft.Icon(ft.Icons.POINT_OF_SALE, size=20),
+                                ft.Text("Cobrar Carrito", weight=ft.FontWeight.W_600)
+                            ], spacing=8, alignment=ft.MainAxisAlignment.CENTER),
+                            on_click=self._on_save_carrito,
+                            style=ft.ButtonStyle(
+                                bgcolor=DarkTheme.BUTTON_SUCCESS,
+                                color=DarkTheme.PRIMARY_TEXT,
+                                elevation={"": 4, "hovered": 8},
+                                shadow_color=ft.Colors.BLACK26,
+                                shape=ft.RoundedRectangleBorder(radius=12),
+                                padding=ft.Padding(25, 15, 25, 15)
+                            ),
+                            width=200,
+                            height=50
+                        ),
+                    ], spacing=20, alignment=ft.MainAxisAlignment.CENTER, wrap=True),
                     padding=ft.Padding(0, 20, 0, 20)
                 ),
             ], spacing=0, scroll=ft.ScrollMode.AUTO),
@@ -369,7 +447,7 @@ Proveedor: {producto_seleccionado['proveedor']}
             )
             
             # Verificar y alertar si el stock es bajo
-            if producto_seleccionado['stock_actual'] < 50:
+            if producto_seleccionado['stock_actual'] < UMBRAL_STOCK_BAJO_ESENCIA:
                 self.alert_manager.show_warning(
                     f"⚠️ Stock bajo detectado\n\n"
                     f"Producto: {producto_seleccionado['nombre']}\n"
@@ -630,14 +708,170 @@ Costo por frasco: Q{frasco_seleccionado['costo']:.2f}
             }
             
             if self.on_save:
-                result = self.on_save(data)
-                if result:
-                    self._cerrar_formulario()
+                self._guardar_en_fondo(self.on_save, data, self._cerrar_formulario)
             
         except Exception as ex:
             if self.alert_manager:
                 self.alert_manager.show_error(f"Error inesperado al procesar la venta: {str(ex)}")
     
+    def _agregar_al_carrito(self, e):
+        """Agrega la venta del formulario como una línea del carrito"""
+        if not self._validar_formulario():
+            return
+        
+        try:
+            cantidad = float(self.cantidad_field.value)
+            precio_unitario = float(self.precio_unitario_field.value)
+            precio_venta_total = float(self.precio_venta_total_field.value or 0)
+            precio_total = precio_venta_total if precio_venta_total > 0 else cantidad * precio_unitario
+            
+            producto_seleccionado = next(
+                (p for p in self.productos_disponibles if p['id_producto'] == self.producto_dropdown.value), None
+            )
+            frasco_seleccionado = next(
+                (f for f in self.frascos_disponibles if f['id_frasco'] == self.frasco_dropdown.value), None
+            )
+            
+            # Verificar el stock contando lo que ya está en el carrito
+            ml_en_carrito = sum(l['cantidad'] for l in self.carrito if l['producto_id'] == self.producto_dropdown.value)
+            frascos_en_carrito = sum(1 for l in self.carrito if l['frasco_id'] == self.frasco_dropdown.value)
+            
+            if producto_seleccionado and ml_en_carrito + cantidad > producto_seleccionado['stock_actual']:
+                self.alert_manager.show_error(
+                    f"❌ Stock insuficiente\n\n"
+                    f"Producto: {producto_seleccionado['nombre']}\n"
+                    f"Stock disponible: {producto_seleccionado['stock_actual']:.1f} ml\n"
+                    f"En el carrito: {ml_en_carrito:.1f} ml"
+                )
+                return
+            
+            if frasco_seleccionado and frascos_en_carrito + 1 > frasco_seleccionado['stock_actual']:
+                self.alert_manager.show_error(
+                    f"❌ Stock insuficiente de frascos\n\n"
+                    f"Frasco: {frasco_seleccionado['nombre']}\n"
+                    f"Stock disponible: {frasco_seleccionado['stock_actual']} unidades\n"
+                    f"En el carrito: {frascos_en_carrito}"
+                )
+                return
+            
+            self.carrito.append({
+                'producto_id': self.producto_dropdown.value,
+                'frasco_id': self.frasco_dropdown.value,
+                'cantidad': cantidad,
+                'precio_venta': precio_total,
+                'cliente': self.cliente_field.value.strip() or None,
+                'producto_nombre': producto_seleccionado['nombre'] if producto_seleccionado else "Desconocido",
+                'frasco_nombre': frasco_seleccionado['nombre'] if frasco_seleccionado else "Sin frasco"
+            })
+            
+            # Dejar el formulario listo para la siguiente línea (se conserva el cliente)
+            self.producto_dropdown.value = None
+            self.frasco_dropdown.value = None
+            self.cantidad_field.value = "0"
+            self.precio_venta_total_field.value = "0.00"
+            
+            self._actualizar_carrito()
+            self.alert_manager.show_toast("Agregado al carrito", "success")
+            
+        except Exception as ex:
+            self.alert_manager.show_error(f"Error al agregar al carrito: {str(ex)}")
+    
+    def _quitar_del_carrito(self, indice):
+        """Quita una línea del carrito"""
+        if 0 <= indice < len(self.carrito):
+            self.carrito.pop(indice)
+            self._actualizar_carrito()
+    
+    def _actualizar_carrito(self):
+        """Redibuja las líneas del carrito y el total"""
+        self.carrito_filas.controls = [
+            ft.Container(
+                content=ft.Row([
+                    ft.Text(
+                        f"{linea['producto_nombre']} ({linea['cantidad']:.1f} ml) + {linea['frasco_nombre']}",
+                        color=DarkTheme.PRIMARY_TEXT, size=14, expand=True
+                    ),
+                    ft.Text(f"Q{linea['precio_venta']:.2f}", color=DarkTheme.SUCCESS, size=14, weight=ft.FontWeight.BOLD),
+                    ft.IconButton(
+                        ft.Icons.DELETE_ROUNDED,
+                        icon_color=DarkTheme.ERROR,
+                        icon_size=18,
+                        tooltip="Quitar del carrito",
+                        on_click=lambda e, i=i: self._quitar_del_carrito(i)
+                    ),
+                ], spacing=10),
+                padding=ft.Padding(12, 6, 12, 6),
+                bgcolor=DarkTheme.SURFACE_BG,
+                border_radius=8
+            )
+            for i, linea in enumerate(self.carrito)
+        ]
+        
+        if self.carrito:
+            total = sum(linea['precio_venta'] for linea in self.carrito)
+            self.carrito_total_text.value = f"{len(self.carrito)} venta(s) - Total: Q{total:.2f}"
+            self.carrito_total_text.color = DarkTheme.SUCCESS
+        else:
+            self.carrito_total_text.value = "Carrito vacío"
+            self.carrito_total_text.color = DarkTheme.MUTED_TEXT
+        
+        self.page.update()
+    
+    def _on_save_carrito(self, e):
+        """Registra todas las líneas del carrito en una sola transacción"""
+        if not self.carrito:
+            self.alert_manager.show_warning("⚠️ Carrito vacío\nAgregue al menos una venta al carrito")
+            return
+        
+        try:
+            if self.on_save_lote:
+                self._guardar_en_fondo(self.on_save_lote, list(self.carrito), self._carrito_cobrado)
+            
+        except Exception as ex:
+            self.alert_manager.show_error(f"Error inesperado al procesar el carrito: {str(ex)}")
+    
+    def _carrito_cobrado(self):
+        self.carrito = []
+        self._cerrar_formulario()
+    
+    def _guardar_en_fondo(self, guardar, datos, al_guardar):
+        """
+        Llama al callback de guardado fuera del evento y muestra el indicador
+        
+        Args:
+            guardar: on_save u on_save_lote (devuelve True si se registró)
+            datos: Venta o líneas del carrito
+            al_guardar: Se llama si el registro tuvo éxito
+        """
+        # Un segundo clic mientras se registra no duplica la venta
+        if self._guardando:
+            return
+        self._guardando = True
+        self.indicador_guardado.visible = True
+        self.page.update()
+        
+        def terminar(resultado):
+            self._guardando = False
+            self.indicador_guardado.visible = False
+            if resultado:
+                al_guardar()
+            else:
+                self.page.update()
+        
+        def fallar(error):
+            terminar(False)
+            self.alert_manager.show_error(f"Error inesperado al registrar la venta: {str(error)}")
+        
+        if self.ejecutor is None:
+            try:
+                resultado = guardar(datos)
+            except Exception as ex:
+                fallar(ex)
+                return
+            terminar(resultado)
+        else:
+            self.ejecutor.enviar(guardar, datos, al_terminar=terminar, al_fallar=fallar)
+    
     def _on_cancel(self, e):
         """Maneja el evento de cancelar"""
         if self.on_cancel:
@@ -732,9 +966,11 @@ Costo por frasco: Q{frasco_seleccionado['costo']:.2f}
         """Alias para show - compatibilidad"""
         self.show()
     
-    def set_callbacks(self, on_save=None, on_cancel=None):
+    def set_callbacks(self, on_save=None, on_cancel=None, on_save_lote=None):
         """Establece los callbacks del formulario"""
         if on_save:
             self.on_save = on_save
         if on_cancel:
-            self.on_cancel = on_cancel
\ No newline at end of file
+            self.on_cancel = on_cancel
+        if on_save_lote:
+            self.on_save_lote = on_save_lote
\ No newline at end of file